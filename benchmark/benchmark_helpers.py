@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from dots_infrastructure.DataClasses import SimulatorConfiguration
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+
+
+def simulator_configuration():
+    return SimulatorConfiguration("EConnection", [], "benchmark", "127.0.0.1", 0, "benchmark", 900, None, "", "", "", "", "", None, [])
+
+def random_params(service : CalculationServiceLVNetwork, rng : np.random.Generator) -> dict:
+    params = {}
+    for e_connection_id in service.ems_list:
+        params[f"EConnection/aggregated_active_power/{e_connection_id}"] = rng.uniform(0, 3000, 3).tolist()
+        params[f"EConnection/aggregated_reactive_power/{e_connection_id}"] = rng.uniform(0, 300, 3).tolist()
+    return params
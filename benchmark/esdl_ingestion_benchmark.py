@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Measures the ingestion of a large ESDL energy system: indexing the assets, building the DSS model from the
+index and the complete init_calculation_service, each with its time and peak memory.
+
+A synthetic network is generated with MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER; every house adds a joint, two
+cables and a building, so the default size has about 100k assets. Every measurement runs in a fresh process,
+so its peak memory is not inflated by the measurements before it. Run from a directory that contains
+LineCode.dss and XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/esdl_ingestion_benchmark.py --size 50:250:100 --output results.json
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import resource
+import time
+import tracemalloc
+
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.esdl_index import EsdlIndex
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from benchmark_helpers import simulator_configuration
+
+STAGES = ["index", "build_dss_model", "init_calculation_service"]
+
+
+def new_service() -> CalculationServiceLVNetwork:
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    return service
+
+def measure_stage(stage : str, size : str) -> dict:
+    energy_system = generate_energy_system(*(int(value) for value in size.split(":")))
+    assets = energy_system.instance[0].area.asset
+    service = new_service() if stage != "index" else None
+    if stage == "build_dss_model":
+        service.network_name = energy_system.name
+    stages = {
+        "index" : lambda : EsdlIndex.from_assets(assets),
+        "build_dss_model" : lambda : service.build_dss_model(assets),
+        "init_calculation_service" : lambda : service.init_calculation_service(energy_system),
+    }
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    stages[stage]()
+    seconds = time.perf_counter() - start
+    _, peak_python_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "assets" : len(assets),
+        "seconds" : seconds,
+        "peak_python_bytes" : peak_python_bytes,
+        # Includes the generated energy system and OpenDSS, which tracemalloc does not see. Linux reports kilobytes.
+        "peak_resident_bytes" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="50:250:100", help="MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER of the synthetic network")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    stages = {}
+    for stage in STAGES:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            stages[stage] = executor.submit(measure_stage, stage, arguments.size).result()
+
+    report = {
+        "size" : arguments.size,
+        "assets" : stages[STAGES[0]]["assets"],
+        "stages" : {stage : {key : value for key, value in result.items() if key != "assets"} for stage, result in stages.items()},
+    }
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Compares the monolithic load flow with the feeder-decomposed load flow for an increasing number of workers.
+
+Run from a directory that contains LineCode.dss and XFMRCode.dss with the MV line codes, e.g.:
+
+    cd test && python ../benchmark/feeder_decomposition_benchmark.py --transformers 200 --houses 40 --workers 1 2 4 8
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from esdl import esdl
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from benchmark_helpers import random_params, simulator_configuration
+
+
+def run(energy_system : esdl.EnergySystem, workers : int, steps : int) -> tuple[dict, list[np.ndarray]]:
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    service.feeder_decomposition = workers > 0
+    service.feeder_decomposition_workers = workers
+    start = time.perf_counter()
+    service.init_calculation_service(energy_system)
+    init_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    results = []
+    step_seconds = []
+    for _ in range(steps):
+        params = random_params(service, rng)
+        start = time.perf_counter()
+        service.set_load_flow_parameters(params)
+        if service.decomposed_solver is not None:
+            result = service.do_decomposed_load_flow()
+        else:
+            service.do_load_flow()
+            result = service.process_results()
+        step_seconds.append(time.perf_counter() - start)
+        results.append(result.all_values())
+    if service.decomposed_solver is not None:
+        service.decomposed_solver.close()
+    return {"workers" : workers, "init_seconds" : init_seconds, "mean_step_seconds" : float(np.mean(step_seconds))}, results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transformers", type=int, default=50)
+    parser.add_argument("--houses", type=int, default=40, help="Houses per feeder")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+
+    # One transformer per MV ring joint
+    energy_system = generate_energy_system(arguments.transformers, arguments.transformers, arguments.houses)
+    monolithic_run, monolithic_results = run(energy_system, 0, arguments.steps)
+    runs = [dict(monolithic_run, mode="monolithic")]
+    for workers in arguments.workers:
+        decomposed_run, results = run(energy_system, workers, arguments.steps)
+        # Volts for node voltages, amperes for line currents and kVA for transformer powers
+        deviations = [np.max(np.abs(result - expected)) for result, expected in zip(results, monolithic_results)]
+        decomposed_run.update(mode="decomposed", max_absolute_deviation=float(np.max(deviations)),
+                              speedup=monolithic_run["mean_step_seconds"] / decomposed_run["mean_step_seconds"])
+        runs.append(decomposed_run)
+
+    report = {"transformers" : arguments.transformers, "houses_per_feeder" : arguments.houses, "steps" : arguments.steps, "runs" : runs}
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Compares the linearized load flow estimate with the exact OpenDSS solve on synthetic networks.
+
+A size is given as MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER. Every step is solved exactly and estimated with
+the same random loads; the report holds the time per step of both, the share of steps that fall back to an
+exact solve with the given limits and the error of the raw estimate (without fallback) against the exact
+solve. The random loads overload the house connections of the larger networks, so every step falls back
+with the default --max-loading; raise it to time the estimate itself. Run from a directory that contains
+LineCode.dss and XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/linear_estimate_benchmark.py --sizes 10:20:20 --steps 50 --max-loading 10
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import multiprocessing
+import platform
+import time
+
+import numpy as np
+import dss
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork, SOLVE_MODE_ESTIMATED
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from benchmark_helpers import random_params, simulator_configuration
+from load_flow_benchmark import parse_size, summarize
+
+
+def error_statistics(exact : list[np.ndarray], estimate : list[np.ndarray]) -> dict:
+    errors = np.abs(np.concatenate(estimate) - np.concatenate(exact))
+    return {"max" : float(errors.max(initial=0.0)), "mean" : float(errors.mean()) if len(errors) > 0 else 0.0}
+
+def benchmark_size(size : str, steps : int, voltage_band_pu : tuple[float, float], max_loading : float) -> dict:
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+    mv_joints, transformers, houses_per_feeder = parse_size(size)
+    energy_system = generate_energy_system(mv_joints, transformers, houses_per_feeder)
+
+    rng = np.random.default_rng(0)
+    exact_service = CalculationServiceLVNetwork()
+    exact_service.influx_connector = InfluxDBMock()
+    start = time.perf_counter()
+    exact_service.init_calculation_service(energy_system)
+    exact_init_seconds = time.perf_counter() - start
+    step_params = [random_params(exact_service, rng) for _ in range(steps)]
+    # Services share the OpenDSS engine, so all exact steps are solved before the estimating service compiles
+    exact_seconds, exact_results = [], []
+    for params in step_params:
+        start = time.perf_counter()
+        exact_results.append(exact_service.solve_current_step(params))
+        exact_seconds.append(time.perf_counter() - start)
+
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    service.linear_estimate = True
+    service.linear_estimate_voltage_band_pu = voltage_band_pu
+    service.linear_estimate_max_loading = max_loading
+    start = time.perf_counter()
+    service.init_calculation_service(energy_system)
+    init_seconds = time.perf_counter() - start
+
+    service_seconds, estimated = [], []
+    errors = {"bus_voltage_mag" : ([], []), "total_line_current_mag" : ([], []), "transformer_power" : ([], [])}
+    for params, exact_result in zip(step_params, exact_results):
+        start = time.perf_counter()
+        service.solve_current_step(params)
+        service_seconds.append(time.perf_counter() - start)
+        estimated.append(service.last_step_report.mode == SOLVE_MODE_ESTIMATED)
+        # The raw estimate, also for the steps that fell back to an exact solve
+        estimate = service.linear_estimator.estimate(service.load_kw, service.load_kvar)
+        for quantity, (exact_values, estimate_values) in errors.items():
+            exact_values.append(getattr(exact_result, quantity))
+            estimate_values.append(getattr(estimate, quantity))
+    estimated = np.array(estimated, dtype=bool)
+    estimated_seconds = np.array(service_seconds)[estimated]
+
+    return {
+        "size" : size,
+        "nodes" : len(exact_service.all_node_names),
+        "lines" : len(exact_service.all_line_names),
+        "loads" : len(exact_service.load_injection_index.load_indices),
+        "exact_init_seconds" : exact_init_seconds,
+        # Includes building the estimator and the solve of its base point
+        "estimate_init_seconds" : init_seconds,
+        "exact_step_seconds" : summarize(exact_seconds),
+        "estimated_step_seconds" : summarize(estimated_seconds) if len(estimated_seconds) > 0 else None,
+        "speedup" : float(np.mean(exact_seconds) / np.mean(estimated_seconds)) if len(estimated_seconds) > 0 else None,
+        "fallback_fraction" : float(1.0 - estimated.mean()),
+        # Absolute errors of the raw estimate in V, A and kVA
+        "errors" : {quantity : error_statistics(exact_values, estimate_values)
+                    for quantity, (exact_values, estimate_values) in errors.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["5:5:10", "10:20:20"])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--voltage-band", type=float, nargs=2, default=[0.92, 1.08])
+    parser.add_argument("--max-loading", type=float, default=0.9)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    runs = []
+    for size in arguments.sizes:
+        parse_size(size)
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            runs.append(executor.submit(benchmark_size, size, arguments.steps, tuple(arguments.voltage_band), arguments.max_loading).result())
+
+    report = {
+        "created" : datetime.now().isoformat(timespec="seconds"),
+        "python" : platform.python_version(),
+        "opendss" : dss.DSS.Version,
+        "steps" : arguments.steps,
+        "voltage_band_pu" : arguments.voltage_band,
+        "max_loading" : arguments.max_loading,
+        "runs" : runs,
+    }
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
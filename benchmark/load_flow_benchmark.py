@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Times every phase of the load-flow pipeline on synthetic networks of increasing size.
+
+A size is given as MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER. Every size runs in a fresh process, so the peak
+resident memory reported for it is not inflated by the sizes before it. Results are written to InfluxDBMock,
+so no database is needed. Run from a directory that contains LineCode.dss and XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/load_flow_benchmark.py --sizes 10:10:20 50:50:40 --output results.json
+
+Pass --baseline with the output of an earlier run to list the phases that got slower than --regression-factor.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import dss
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.synthetic_network import generate_energy_system, write_energy_system
+
+from benchmark_helpers import random_params, simulator_configuration
+
+PHASES = ["init_calculation_service", "set_load_flow_parameters", "do_load_flow", "process_results", "write_results_to_influx"]
+
+
+def parse_size(size : str) -> tuple[int, int, int]:
+    mv_joints, transformers, houses_per_feeder = (int(value) for value in size.split(":"))
+    return mv_joints, transformers, houses_per_feeder
+
+def summarize(seconds : list[float]) -> dict:
+    return {"mean" : float(np.mean(seconds)), "p50" : float(np.percentile(seconds, 50)),
+            "p95" : float(np.percentile(seconds, 95)), "max" : float(np.max(seconds))}
+
+def timed(phase_seconds : dict[str, list[float]], phase : str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    phase_seconds[phase].append(time.perf_counter() - start)
+    return result
+
+def benchmark_size(size : str, steps : int, esdl_directory : str) -> dict:
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+    mv_joints, transformers, houses_per_feeder = parse_size(size)
+    if esdl_directory is None:
+        energy_system = generate_energy_system(mv_joints, transformers, houses_per_feeder)
+    else:
+        energy_system = write_energy_system(os.path.join(esdl_directory, f"synthetic_{size.replace(':', '_')}.esdl"),
+                                            mv_joints, transformers, houses_per_feeder)
+
+    tracemalloc.start()
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    phase_seconds = {phase : [] for phase in PHASES}
+    timed(phase_seconds, "init_calculation_service", service.init_calculation_service, energy_system)
+
+    rng = np.random.default_rng(0)
+    simulation_time = datetime(2024, 1, 1)
+    for _ in range(steps):
+        params = random_params(service, rng)
+        simulation_time += timedelta(seconds=900)
+        timed(phase_seconds, "set_load_flow_parameters", service.set_load_flow_parameters, params)
+        timed(phase_seconds, "do_load_flow", service.do_load_flow)
+        results = timed(phase_seconds, "process_results", service.process_results)
+        timed(phase_seconds, "write_results_to_influx", service.write_results_to_influx, "benchmark", simulation_time, results)
+        # Keep the mock from growing over the steps, like the real connector that flushes its points
+        service.influx_connector.data_points.clear()
+    _, peak_python_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "size" : size,
+        "mv_joints" : mv_joints,
+        "transformers" : transformers,
+        "houses_per_feeder" : houses_per_feeder,
+        "nodes" : len(service.all_node_names),
+        "lines" : len(service.all_line_names),
+        "loads" : len(service.load_injection_index.load_indices),
+        "phases" : {phase : summarize(seconds) for phase, seconds in phase_seconds.items()},
+        "peak_python_bytes" : peak_python_bytes,
+        # Includes the memory of OpenDSS, which tracemalloc does not see. Linux reports kilobytes.
+        "peak_resident_bytes" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+def find_regressions(report : dict, baseline : dict, regression_factor : float) -> list[dict]:
+    baseline_runs = {run["size"] : run for run in baseline["runs"]}
+    regressions = []
+    for run in report["runs"]:
+        baseline_run = baseline_runs.get(run["size"])
+        if baseline_run is None:
+            continue
+        for phase, statistics in run["phases"].items():
+            baseline_mean = baseline_run["phases"].get(phase, {}).get("mean")
+            if baseline_mean and statistics["mean"] > regression_factor * baseline_mean:
+                regressions.append({"size" : run["size"], "phase" : phase, "baseline_mean" : baseline_mean, "mean" : statistics["mean"]})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["5:5:10", "20:20:20", "50:50:40"])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--esdl-directory", help="Also write the generated networks as ESDL files to this directory")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--regression-factor", type=float, default=1.2)
+    arguments = parser.parse_args()
+
+    runs = []
+    for size in arguments.sizes:
+        parse_size(size)
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            runs.append(executor.submit(benchmark_size, size, arguments.steps, arguments.esdl_directory).result())
+
+    report = {
+        "created" : datetime.now().isoformat(timespec="seconds"),
+        "python" : platform.python_version(),
+        "opendss" : dss.DSS.Version,
+        "machine" : platform.machine(),
+        "cpu_count" : os.cpu_count(),
+        "steps" : arguments.steps,
+        "runs" : runs,
+    }
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as f:
+            report["regressions"] = find_regressions(report, json.load(f), arguments.regression_factor)
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Compares the solve of a reduced network with that of the unreduced network on synthetic networks.
+
+A size is given as MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER:LV_CABLE_SEGMENTS; every feeder cable between two
+houses is made of LV_CABLE_SEGMENTS cables joined by joints without a house. Both networks run in a fresh
+process with the same random load steps. Per network the nodes, lines, solve time and process time are
+reported, with the speedup of the reduced network and the largest difference of its expanded bus voltages
+and line currents with the unreduced network. Run from a directory that contains LineCode.dss and
+XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/network_reduction_benchmark.py --sizes 20:20:20:1 20:20:20:4 --output results.json
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import time
+
+import numpy as np
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from benchmark_helpers import random_params, simulator_configuration
+from load_flow_benchmark import summarize
+
+
+def parse_size(size : str) -> tuple[int, int, int, int]:
+    mv_joints, transformers, houses_per_feeder, lv_cable_segments = (int(value) for value in size.split(":"))
+    return mv_joints, transformers, houses_per_feeder, lv_cable_segments
+
+def benchmark_network(size : str, network_reduction : bool, steps : int) -> dict:
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+    mv_joints, transformers, houses_per_feeder, lv_cable_segments = parse_size(size)
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    service.network_reduction = network_reduction
+    service.init_calculation_service(generate_energy_system(mv_joints, transformers, houses_per_feeder, lv_cable_segments=lv_cable_segments))
+
+    rng = np.random.default_rng(0)
+    solve_seconds, process_seconds, voltages, currents = [], [], [], []
+    converged = True
+    for _ in range(steps):
+        service.set_load_flow_parameters(random_params(service, rng))
+        start = time.perf_counter()
+        service.do_load_flow()
+        solve_seconds.append(time.perf_counter() - start)
+        converged = converged and service.last_step_report.converged
+        start = time.perf_counter()
+        results = service.process_results()
+        process_seconds.append(time.perf_counter() - start)
+        names, expanded_results = service.expand_reduced_results(results)
+        voltages.append(dict(zip(names.node_names, expanded_results.bus_voltage_mag.tolist())))
+        currents.append(dict(zip(names.line_names, expanded_results.total_line_current_mag.tolist())))
+    return {
+        "nodes" : len(service.all_node_names),
+        "lines" : len(service.all_line_names),
+        "solve_seconds" : summarize(solve_seconds),
+        "process_seconds" : summarize(process_seconds),
+        "converged" : converged,
+        "bus_voltage_mag" : voltages,
+        "total_line_current_mag" : currents,
+    }
+
+def max_difference(values : list[dict[str, float]], reference_values : list[dict[str, float]]) -> float:
+    return max(max(abs(value - reference[name]) for name, value in step.items()) for step, reference in zip(values, reference_values))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["20:20:20:1", "20:20:20:4"])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    runs = []
+    for size in arguments.sizes:
+        results = {}
+        for name, network_reduction in (("unreduced", False), ("reduced", True)):
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results[name] = executor.submit(benchmark_network, size, network_reduction, arguments.steps).result()
+        unreduced, reduced = results["unreduced"], results["reduced"]
+        reduced["solve_speedup"] = unreduced["solve_seconds"]["mean"] / reduced["solve_seconds"]["mean"]
+        reduced["max_voltage_difference"] = max_difference(reduced["bus_voltage_mag"], unreduced["bus_voltage_mag"])
+        reduced["max_current_difference"] = max_difference(reduced["total_line_current_mag"], unreduced["total_line_current_mag"])
+        for result in results.values():
+            del result["bus_voltage_mag"], result["total_line_current_mag"]
+        runs.append({"size" : size, "networks" : results})
+
+    report = {"steps" : arguments.steps, "runs" : runs}
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Compares solver profiles with the default OpenDSS snapshot solve on synthetic networks.
+
+A size is given as MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER. Every size and profile runs in a fresh process with
+the same random load steps; "default" solves without a profile. Per profile the solve time, the iterations, the
+steps for which the system matrix was rebuilt and the largest bus voltage difference with the default solve are
+reported. Run from a directory that contains LineCode.dss and XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/solver_profile_benchmark.py --sizes 20:20:20 50:100:40 --output results.json
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import time
+
+import numpy as np
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.solver_profile import SolverProfile
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from benchmark_helpers import random_params, simulator_configuration
+from load_flow_benchmark import parse_size, summarize
+
+DEFAULT_PROFILE = "default"
+PROFILES = {
+    DEFAULT_PROFILE : None,
+    "controls_off" : SolverProfile(control_mode="off"),
+    "tolerance_1e-3" : SolverProfile(tolerance=1e-3, control_mode="off"),
+    "newton" : SolverProfile(algorithm="newton", control_mode="off"),
+}
+
+
+def benchmark_profile(size : str, profile_name : str, steps : int) -> dict:
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    service.solver_profile = PROFILES[profile_name]
+    service.init_calculation_service(generate_energy_system(*parse_size(size)))
+
+    rng = np.random.default_rng(0)
+    solve_seconds, iterations, voltages = [], [], []
+    rebuilds = 0
+    converged = True
+    for _ in range(steps):
+        service.set_load_flow_parameters(random_params(service, rng))
+        start = time.perf_counter()
+        service.do_load_flow()
+        solve_seconds.append(time.perf_counter() - start)
+        report = service.last_step_report
+        iterations.append(report.iterations)
+        rebuilds += report.system_matrix_rebuilt
+        converged = converged and report.converged
+        voltages.append(service.process_results().bus_voltage_mag)
+    return {
+        "solve_seconds" : summarize(solve_seconds),
+        "iterations" : summarize(iterations),
+        "system_matrix_rebuilds" : rebuilds,
+        "converged" : converged,
+        "bus_voltage_mag" : np.array(voltages),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["20:20:20", "50:100:40"])
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    runs = []
+    for size in arguments.sizes:
+        results = {}
+        for profile_name in PROFILES:
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results[profile_name] = executor.submit(benchmark_profile, size, profile_name, arguments.steps).result()
+        default_voltages = results[DEFAULT_PROFILE]["bus_voltage_mag"]
+        for result in results.values():
+            result["max_voltage_difference"] = float(np.max(np.abs(result.pop("bus_voltage_mag") - default_voltages)))
+        runs.append({"size" : size, "profiles" : results})
+
+    report = {"steps" : arguments.steps, "runs" : runs}
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
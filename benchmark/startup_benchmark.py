@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Measures the time from process start until the service is ready, i.e. until init_calculation_service returned.
+
+Every run starts a fresh interpreter that imports the service, loads the ESDL file and initialises the network.
+The milestones are reported as the median over the runs. With --import-profile the modules whose import takes
+longest are listed as well (python -X importtime). Run from a directory that contains LineCode.dss and
+XFMRCode.dss, e.g.:
+
+    cd test && python ../benchmark/startup_benchmark.py --esdl test.esdl --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Runs in the measured process. Wall clock time is used because the milestones are compared with the
+# moment the parent process started the child.
+CHILD_SCRIPT = """
+import json, sys, time
+milestones = {}
+milestones["interpreter"] = time.time()
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+milestones["imports"] = time.time()
+from esdl.esdl_handler import EnergySystemHandler
+from dots_infrastructure import CalculationServiceHelperFunctions
+from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
+sys.path.insert(0, sys.argv[2])
+from benchmark_helpers import simulator_configuration
+CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_configuration
+energy_system = EnergySystemHandler().load_file(sys.argv[1])
+milestones["esdl_loaded"] = time.time()
+service = CalculationServiceLVNetwork()
+service.influx_connector = InfluxDBMock()
+service.init_calculation_service(energy_system)
+milestones["ready"] = time.time()
+print(json.dumps(milestones))
+"""
+MILESTONES = ["interpreter", "imports", "esdl_loaded", "ready"]
+SERVICE_MODULE = "lvnetworkservice.lvnetworkservice"
+
+
+def measure_startup(esdl_file : str) -> dict[str, float]:
+    start = time.time()
+    output = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, esdl_file, os.path.dirname(os.path.abspath(__file__))],
+                            check=True, capture_output=True, text=True).stdout
+    milestones = json.loads(output.strip().splitlines()[-1])
+    return {milestone : milestones[milestone] - start for milestone in MILESTONES}
+
+def profile_imports(top : int) -> list[dict]:
+    # -X importtime writes "import time: self [us] | cumulative | imported package" to stderr
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {SERVICE_MODULE}"],
+                            check=True, capture_output=True, text=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append({"module" : module.strip(), "self_seconds" : int(self_us) * 1e-6, "cumulative_seconds" : int(cumulative_us) * 1e-6})
+    # Only packages, not their submodules, so the cumulative times do not count a submodule twice
+    top_level = [entry for entry in imports if "." not in entry["module"] or entry["module"] == SERVICE_MODULE]
+    return sorted(top_level, key=lambda entry : entry["cumulative_seconds"], reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--esdl", help="ESDL file to initialise; a synthetic network is generated when omitted")
+    parser.add_argument("--size", default="10:10:20", help="MV_JOINTS:TRANSFORMERS:HOUSES_PER_FEEDER of the synthetic network")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-profile", type=int, default=0, metavar="TOP", help="Also list the TOP slowest top level imports")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        esdl_file = arguments.esdl
+        if esdl_file is None:
+            from lvnetworkservice.synthetic_network import write_energy_system
+            esdl_file = os.path.join(directory, "synthetic.esdl")
+            write_energy_system(esdl_file, *(int(value) for value in arguments.size.split(":")))
+        runs = [measure_startup(esdl_file) for _ in range(arguments.runs)]
+
+    report = {
+        "esdl" : arguments.esdl if arguments.esdl is not None else f"synthetic {arguments.size}",
+        "runs" : arguments.runs,
+        "median_seconds_since_process_start" : {milestone : float(np.median([run[milestone] for run in runs])) for milestone in MILESTONES},
+    }
+    if arguments.import_profile > 0:
+        report["slowest_imports"] = profile_imports(arguments.import_profile)
+    print(json.dumps(report, indent=2))
+    if arguments.output is not None:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
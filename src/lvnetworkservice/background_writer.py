@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+from typing import Callable
+
+# Put on the queue by close, the writer thread stops when it takes it
+STOP = object()
+
+class BackgroundResultWriter:
+    """Runs the result writes of the steps on a background thread, in the order they were submitted, so a
+    step can return while the results of the previous step are still being written. At most max_pending
+    writes wait in the queue; submitting another one blocks until the thread took one. A write that raised
+    is reported by the next call of submit, drain or close in the calling thread, which makes it an error of
+    that step. Writes submitted after a failed write are still carried out."""
+
+    def __init__(self, max_pending : int = 2, name : str = "result-writer"):
+        if max_pending < 1:
+            raise ValueError("The background result writer needs room for at least one pending write")
+        self.queue : queue.Queue = queue.Queue(max_pending)
+        self.error : BaseException = None
+        self.error_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            write = self.queue.get()
+            try:
+                if write is STOP:
+                    return
+                write()
+            except BaseException as error:
+                with self.error_lock:
+                    if self.error is None:
+                        self.error = error
+            finally:
+                self.queue.task_done()
+
+    def submit(self, write : Callable[[], None]):
+        self.raise_error()
+        if not self.thread.is_alive():
+            raise RuntimeError("The background result writer is closed")
+        self.queue.put(write)
+
+    def drain(self):
+        """Waits until every submitted write was carried out."""
+        self.queue.join()
+        self.raise_error()
+
+    def close(self):
+        """Carries out the pending writes and stops the thread."""
+        if self.thread.is_alive():
+            self.queue.put(STOP)
+            self.thread.join()
+        self.raise_error()
+
+    def raise_error(self):
+        with self.error_lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass, field
+from typing import List
+from esdl import esdl
+from lvnetworkservice.mv_network import dss_bus_name
+
+MV_CABLE_MARKER = "mv_cable"
+IMPORT_KIND = "import"
+TRANSFORMER_KIND = "transformer"
+CABLE_KIND = "cable"
+BUILDING_KIND = "building"
+UNKNOWN_KIND = object()
+# Classes are matched in this order, like the isinstance checks of the builders
+ASSET_KINDS = [(esdl.Import, IMPORT_KIND), (esdl.Transformer, TRANSFORMER_KIND), (esdl.ElectricityCable, CABLE_KIND), (esdl.Building, BUILDING_KIND)]
+
+@dataclass
+class ConnectedAsset:
+    """An asset with the DSS bus names of the assets connected to its in port (bus_from) and to its other
+    ports (bus_to). An asset with several ports of a kind is connected through the last of them."""
+    asset : esdl.Asset
+    bus_from : str = None
+    bus_to : str = None
+
+@dataclass
+class BuildingConnection:
+    """The EConnection of a building and the amount of ElectricityDemands in the building; every demand
+    becomes one load per phase at the bus of the EConnection."""
+    e_connection_id : str
+    e_connection_name : str
+    amount_of_demands : int
+
+@dataclass
+class EsdlIndex:
+    """The assets of an ESDL area that the DSS model is built from, collected in one pass over the area in
+    the order of the area: the imports, transformers and MV/LV cables with the buses they connect, and the
+    EConnection of every building with its demands."""
+    imports : List[ConnectedAsset] = field(default_factory=list)
+    transformers : List[ConnectedAsset] = field(default_factory=list)
+    mv_cables : List[ConnectedAsset] = field(default_factory=list)
+    lv_cables : List[ConnectedAsset] = field(default_factory=list)
+    buildings : List[BuildingConnection] = field(default_factory=list)
+
+    @staticmethod
+    def from_assets(assets : List[esdl.Asset]) -> 'EsdlIndex':
+        index = EsdlIndex()
+        # Most joints are connected to several assets, so their bus name is only derived once
+        bus_names : dict[esdl.Asset, str] = {}
+        asset_kinds : dict[type, str] = {}
+
+        def bus_name(asset : esdl.Asset) -> str:
+            name = bus_names.get(asset)
+            if name is None:
+                name = bus_names[asset] = dss_bus_name(asset)
+            return name
+
+        for asset in assets:
+            asset_class = type(asset)
+            kind = asset_kinds.get(asset_class, UNKNOWN_KIND)
+            if kind is UNKNOWN_KIND:
+                kind = asset_kinds[asset_class] = next((kind for kind_class, kind in ASSET_KINDS if issubclass(asset_class, kind_class)), None)
+            if kind is None:
+                continue
+            if kind == BUILDING_KIND:
+                index.buildings.append(building_connection(asset))
+                continue
+            connected_asset = ConnectedAsset(asset)
+            for port in asset.port:
+                if isinstance(port, esdl.InPort):
+                    connected_asset.bus_from = bus_name(port.connectedTo[0].energyasset)
+                else:
+                    connected_asset.bus_to = bus_name(port.connectedTo[0].energyasset)
+            if kind == IMPORT_KIND:
+                index.imports.append(connected_asset)
+            elif kind == TRANSFORMER_KIND:
+                index.transformers.append(connected_asset)
+            elif MV_CABLE_MARKER in asset.name.lower():
+                index.mv_cables.append(connected_asset)
+            else:
+                index.lv_cables.append(connected_asset)
+        return index
+
+def building_connection(building : esdl.Building) -> BuildingConnection:
+    e_connection = None
+    amount_of_demands = 0
+    for asset in building.asset:
+        if isinstance(asset, esdl.EConnection):
+            if e_connection is None:
+                e_connection = asset
+        elif isinstance(asset, esdl.ElectricityDemand):
+            amount_of_demands += 1
+    if e_connection is None:
+        raise ValueError(f"Building '{building.name}' has no EConnection")
+    return BuildingConnection(e_connection.id, e_connection.name, amount_of_demands)
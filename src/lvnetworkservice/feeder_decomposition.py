@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass, field
+import multiprocessing
+import traceback
+from typing import List
+import dss
+import numpy as np
+from dots_infrastructure.Logger import LOGGER
+
+# The MV bus voltage of every phase is imposed on a feeder through a practically ideal source
+FEEDER_SOURCE_SHORT_CIRCUIT_MVA = 1e9
+FEEDER_SOURCE_NAMES = ["source", "source_ph2", "source_ph3"]
+
+def bus_of(connection : str) -> str:
+    return connection.split('.')[0].lower()
+
+@dataclass
+class FeederDefinition:
+    """The secondary transformer and the LV network behind it, compiled as a circuit of its own."""
+    transformer_name : str
+    primary_bus : str
+    primary_kv : float
+    script : str
+    load_names : List[str]
+    load_positions : np.ndarray
+
+@dataclass
+class FeederLayout:
+    node_names : List[str]
+    line_names : List[str]
+
+@dataclass
+class FeederSolution:
+    bus_voltage_mag : np.ndarray
+    line_current_mag : np.ndarray
+    transformer_power : float
+    # Complex power in kVA per phase flowing into the transformer at the MV side
+    primary_phase_powers : np.ndarray
+    converged : bool
+
+@dataclass
+class DecomposedSolution:
+    bus_voltage_mag : np.ndarray
+    total_line_current_mag : np.ndarray
+    transformer_power : np.ndarray
+    iterations : int
+    converged : bool
+
+@dataclass
+class NetworkDecomposition:
+    feeders : List[FeederDefinition] = field(default_factory=list)
+    mv_script : str = ""
+    mv_load_names : List[str] = field(default_factory=list)
+
+def element_buses(active_circuit, elements) -> dict[str, List[str]]:
+    # The buses of the terminals of every element of a collection of the circuit, like its Lines or Loads
+    buses = {}
+    element_index = elements.First
+    while element_index > 0:
+        buses[elements.Name.lower()] = [bus_of(bus) for bus in active_circuit.ActiveCktElement.BusNames]
+        element_index = elements.Next
+    return buses
+
+def element_definitions(elements : dict[str, List[str]], definitions : List[str], kind : str) -> dict[str, str]:
+    # OpenDSS keeps the elements of a kind in the order in which the script defines them
+    if len(elements) != len(definitions):
+        raise ValueError(f"The circuit has {len(elements)} {kind} where the network model defines {len(definitions)}")
+    return dict(zip(elements, definitions))
+
+def decompose_network(dss_model, active_circuit, load_names : List[str]) -> NetworkDecomposition:
+    """Splits the network of a DssModel into an MV circuit, in which every secondary transformer is replaced by
+    one load per phase at its primary bus, and one circuit per transformer with the LV lines and loads behind it.
+    The feeders follow from the topology of active_circuit, the compiled circuit of the model, and take the
+    definitions of their elements from the model. load_names are the lower case names of the loads in the order
+    of the load arrays of the service."""
+    parent : dict[str, str] = {}
+
+    def find(bus : str) -> str:
+        parent.setdefault(bus, bus)
+        while parent[bus] != bus:
+            parent[bus] = parent[parent[bus]]
+            bus = parent[bus]
+        return bus
+
+    line_buses = element_buses(active_circuit, active_circuit.Lines)
+    for bus1, bus2 in line_buses.values():
+        parent[find(bus1)] = find(bus2)
+
+    transformers = []
+    feeder_of_root : dict[str, int] = {}
+    transformer_elements = active_circuit.Transformers
+    transformer_buses = element_buses(active_circuit, transformer_elements)
+    transformer_definitions = element_definitions(transformer_buses, dss_model.transformers, "transformers")
+    for name, (primary, secondary) in transformer_buses.items():
+        transformer_elements.Name = name
+        transformer_elements.Wdg = 1
+        primary_kv = transformer_elements.kV
+        transformer_elements.Wdg = 2
+        secondary_kv = transformer_elements.kV
+        root = find(secondary)
+        if root in feeder_of_root:
+            raise ValueError(f"Transformer {name} feeds the same LV network as transformer {transformers[feeder_of_root[root]][0]}")
+        if root == find(primary):
+            raise ValueError(f"Transformer {name} is bypassed by lines between its primary and secondary bus")
+        feeder_of_root[root] = len(transformers)
+        transformers.append((name, primary, secondary, primary_kv, secondary_kv))
+    mv_roots = {find(primary) for _, primary, _, _, _ in transformers}
+    mv_roots.update(find(buses[0]) for buses in element_buses(active_circuit, active_circuit.Vsources).values())
+
+    mv_line_definitions = [line for name, line in dss_model.mv_lines.items() if name not in dss_model.mv_cut_cables]
+    line_definitions = element_definitions(line_buses, dss_model.lv_lines + mv_line_definitions, "lines")
+    mv_lines = []
+    feeder_lines = [[] for _ in transformers]
+    for name, (bus1, _) in line_buses.items():
+        root = find(bus1)
+        if root in feeder_of_root:
+            feeder_lines[feeder_of_root[root]].append(line_definitions[name])
+        elif root in mv_roots:
+            mv_lines.append(line_definitions[name])
+        else:
+            LOGGER.warning(f"Line {name} is not connected to a transformer or source and is left out of the decomposed solve")
+
+    load_buses = element_buses(active_circuit, active_circuit.Loads)
+    load_definitions = element_definitions(load_buses, dss_model.loads, "loads")
+    load_positions = {name : position for position, name in enumerate(load_names)}
+    feeder_loads = [[] for _ in transformers]
+    for name, (bus, *_) in load_buses.items():
+        feeder = feeder_of_root.get(find(bus))
+        if feeder is None:
+            LOGGER.warning(f"Load {name} is not connected to a transformer and is left out of the decomposed solve")
+        else:
+            feeder_loads[feeder].append(name)
+
+    decomposition = NetworkDecomposition()
+    for i, (name, primary, secondary, primary_kv, secondary_kv) in enumerate(transformers):
+        lines = list(dss_model.header)
+        # One single phase source per phase, so the MV bus voltages can be imposed with their unbalance
+        phase_kv = primary_kv / np.sqrt(3)
+        for phase, (source_name, angle) in enumerate(zip(FEEDER_SOURCE_NAMES, (0.0, -120.0, 120.0)), start=1):
+            element = f'circuit.feeder_{name}' if phase == 1 else f'Vsource.{source_name}'
+            lines.append(f'New {element} phases=1 pu=1.0 angle={angle} basekv={phase_kv} bus1={primary}.{phase} '
+                         f'MVAsc3={FEEDER_SOURCE_SHORT_CIRCUIT_MVA} MVAsc1={FEEDER_SOURCE_SHORT_CIRCUIT_MVA} \n')
+        lines.append('Redirect XFMRCode.dss \n')
+        lines.append(transformer_definitions[name])
+        lines.append('Redirect LineCode.dss \n')
+        lines.extend(feeder_lines[i])
+        lines.extend(load_definitions[load_name] for load_name in feeder_loads[i])
+        lines.append(f'Set VoltageBases = {[primary_kv, secondary_kv]} \n')
+        lines.append('CalcVoltageBases \n')
+        lines.append(f'SetkVBase Bus={primary} kVLL={primary_kv}\n')
+        lines.append(f'SetkVBase Bus={secondary} kVLL={secondary_kv}\n')
+        lines.append('Set mode=snapshot\n')
+        decomposition.feeders.append(FeederDefinition(
+            transformer_name=name,
+            primary_bus=primary,
+            primary_kv=primary_kv,
+            script=''.join(lines),
+            load_names=feeder_loads[i],
+            load_positions=np.array([load_positions[load_name] for load_name in feeder_loads[i]], dtype=np.int64)
+        ))
+
+    lines = list(dss_model.header)
+    lines.extend(dss_model.source)
+    lines.append('Redirect LineCode.dss \n')
+    lines.extend(mv_lines)
+    for feeder in decomposition.feeders:
+        for phase in range(1, 4):
+            load_name = f"feeder_{feeder.transformer_name}_ph{phase}".lower()
+            decomposition.mv_load_names.append(load_name)
+            lines.append(f'New Load.{load_name} Bus1={feeder.primary_bus}.{phase} Phases=1 Conn=wye Model=1 '
+                         f'kV={feeder.primary_kv / np.sqrt(3)} kW=0.0 kvar=0.0 \n')
+    primary_voltage_bases = sorted({feeder.primary_kv for feeder in decomposition.feeders}, reverse=True)
+    lines.append(f'Set VoltageBases = {primary_voltage_bases} \n')
+    lines.append('CalcVoltageBases \n')
+    for feeder in decomposition.feeders:
+        lines.append(f'SetkVBase Bus={feeder.primary_bus} kVLL={feeder.primary_kv}\n')
+    lines.append('Set mode=snapshot\n')
+    decomposition.mv_script = ''.join(lines)
+    return decomposition
+
+def first_terminal_value_offsets(active_circuit) -> dict[str, tuple[int, int]]:
+    # Position of the values of the first terminal of every power delivery element in the flat
+    # PDElements arrays, together with the number of conductors of that terminal.
+    pd_elements = active_circuit.PDElements
+    conductors = np.array(pd_elements.AllNumConductors)
+    amount_of_values = conductors * np.array(pd_elements.AllNumTerminals) * 2
+    element_offsets = np.concatenate(([0], np.cumsum(amount_of_values)[:-1]))
+    return {name.lower() : (int(offset), int(amount)) for name, offset, amount in zip(pd_elements.AllNames, element_offsets, conductors)}
+
+class FeederSolver:
+    """Solves a group of feeders, each compiled in a DSS context of its own."""
+
+    def __init__(self, feeders : List[FeederDefinition]):
+        self.feeders = feeders
+        self.contexts = []
+        self.load_indices = []
+        self.line_current_positions = []
+        self.transformer_power_positions = []
+        self.layouts = []
+        for feeder in feeders:
+            context = dss.DSS.NewContext()
+            context.Text.Commands(feeder.script)
+            active_circuit = context.ActiveCircuit
+            load_name_to_index = {name : i + 1 for i, name in enumerate(active_circuit.Loads.AllNames)}
+            offsets = first_terminal_value_offsets(active_circuit)
+            line_names = list(active_circuit.Lines.AllNames)
+            transformer_offset, transformer_conductors = offsets[f"transformer.{feeder.transformer_name.lower()}"]
+            self.contexts.append(context)
+            self.load_indices.append([load_name_to_index[name] for name in feeder.load_names])
+            self.line_current_positions.append(np.array([offsets[f"line.{name}"][0] + 2 * phase for name in line_names for phase in range(3)], dtype=np.int64))
+            # Every conductor of the primary terminal, including the fourth conductor of the winding
+            self.transformer_power_positions.append(transformer_offset + 2 * np.arange(transformer_conductors))
+            self.layouts.append(FeederLayout(list(active_circuit.AllNodeNames), line_names))
+
+    def solve(self, source_pu : np.ndarray, load_kw : List[np.ndarray], load_kvar : List[np.ndarray]) -> List[FeederSolution]:
+        # source_pu holds the complex voltage per phase of the MV bus of every feeder
+        solutions = []
+        for i, context in enumerate(self.contexts):
+            active_circuit = context.ActiveCircuit
+            vsources = active_circuit.Vsources
+            for source_name, voltage in zip(FEEDER_SOURCE_NAMES, source_pu[i].tolist()):
+                vsources.Name = source_name
+                vsources.pu = abs(voltage)
+                vsources.AngleDeg = float(np.degrees(np.angle(voltage)))
+            loads = active_circuit.Loads
+            for load_index, kw, kvar in zip(self.load_indices[i], load_kw[i].tolist(), load_kvar[i].tolist()):
+                loads.idx = load_index
+                loads.kW = kw
+                loads.kvar = kvar
+            active_circuit.Solution.Solve()
+
+            currents_mag_ang = np.asarray(active_circuit.PDElements.AllCurrentsMagAng)
+            powers = np.asarray(active_circuit.PDElements.AllPowers)
+            conductor_powers = powers[self.transformer_power_positions[i]] + 1j * powers[self.transformer_power_positions[i] + 1]
+            # The power of the conductors beyond the phases is spread over the phase loads in the MV circuit
+            primary_phase_powers = conductor_powers[:3] + conductor_powers[3:].sum() / 3
+            solutions.append(FeederSolution(
+                bus_voltage_mag=np.array(active_circuit.AllBusVmag, dtype=np.float64),
+                line_current_mag=currents_mag_ang[self.line_current_positions[i]].reshape(-1, 3).sum(axis=1),
+                transformer_power=float(abs(conductor_powers.sum())),
+                primary_phase_powers=primary_phase_powers,
+                converged=bool(active_circuit.Solution.Converged)
+            ))
+        return solutions
+
+def feeder_worker(connection, feeders : List[FeederDefinition]):
+    try:
+        solver = FeederSolver(feeders)
+        connection.send(("ready", solver.layouts))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+    while True:
+        message = connection.recv()
+        if message[0] == "close":
+            break
+        try:
+            connection.send(("solved", solver.solve(*message[1:])))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+
+class FeederWorker:
+    """A process that keeps a group of compiled feeders for the lifetime of the solver."""
+
+    def __init__(self, feeders : List[FeederDefinition]):
+        context = multiprocessing.get_context("spawn")
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=feeder_worker, args=(worker_connection, feeders), daemon=True)
+        self.process.start()
+
+    def receive(self):
+        try:
+            status, payload = self.connection.recv()
+        except EOFError as e:
+            raise RuntimeError(f"Feeder worker exited with code {self.process.exitcode}") from e
+        if status == "error":
+            raise RuntimeError(f"Feeder worker failed:\n{payload}")
+        return payload
+
+    def send_solve(self, source_pu : np.ndarray, load_kw : List[np.ndarray], load_kvar : List[np.ndarray]):
+        self.connection.send(("solve", source_pu, load_kw, load_kvar))
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(("close",))
+            self.process.join(timeout=10)
+        self.connection.close()
+
+class DecomposedNetworkSolver:
+    """Solves the network feeder by feeder. The MV circuit is solved with the power drawn by every transformer
+    per phase, after which every feeder is solved with the complex voltage of every phase of its MV bus. Both are
+    repeated until the MV bus voltages change less than tolerance_pu. With more than one worker the feeders are divided over worker
+    processes that are solved in parallel."""
+
+    def __init__(self, decomposition : NetworkDecomposition, node_names : List[str], line_names : List[str], transformer_names : List[str],
+                 amount_of_workers : int, max_iterations : int, tolerance_pu : float):
+        self.feeders = decomposition.feeders
+        self.max_iterations = max_iterations
+        self.tolerance_pu = tolerance_pu
+        self.amount_of_nodes = len(node_names)
+        self.amount_of_lines = len(line_names)
+        self.amount_of_transformers = len(transformer_names)
+        self.previous_primary_phase_powers : np.ndarray = None
+        self.previous_feeder_load = None
+
+        self.mv_engine = dss.DSS.NewContext()
+        self.mv_engine.Text.Commands(decomposition.mv_script)
+        mv_circuit = self.mv_engine.ActiveCircuit
+        mv_load_name_to_index = {name : i + 1 for i, name in enumerate(mv_circuit.Loads.AllNames)}
+        self.mv_load_indices = [mv_load_name_to_index[name] for name in decomposition.mv_load_names]
+        mv_node_names = [name.lower() for name in mv_circuit.AllNodeNames]
+        mv_node_positions = {name : i for i, name in enumerate(mv_node_names)}
+        self.primary_node_positions = np.array([[mv_node_positions[f"{feeder.primary_bus}.{phase}"] for phase in range(1, 4)] for feeder in self.feeders], dtype=np.int64).reshape(-1, 3)
+        self.primary_voltage_bases = np.array([feeder.primary_kv * 1000 / np.sqrt(3) for feeder in self.feeders])
+        mv_line_names = [name.lower() for name in mv_circuit.Lines.AllNames] if mv_circuit.Lines.Count > 0 else []
+        mv_offsets = first_terminal_value_offsets(mv_circuit)
+        self.mv_line_current_positions = np.array([mv_offsets[f"line.{name}"][0] + 2 * phase for name in mv_line_names for phase in range(3)], dtype=np.int64)
+
+        self.groups = self.divide_feeders(max(amount_of_workers, 1))
+        if amount_of_workers > 1 and len(self.groups) > 0:
+            self.workers = [FeederWorker([self.feeders[i] for i in group]) for group in self.groups]
+            self.local_solver = None
+            layouts = []
+            for worker in self.workers:
+                layouts.extend(worker.receive())
+        else:
+            self.groups = [list(range(len(self.feeders)))]
+            self.workers = []
+            self.local_solver = FeederSolver(self.feeders)
+            layouts = self.local_solver.layouts
+        feeder_order = [i for group in self.groups for i in group]
+
+        node_positions = {name.lower() : i for i, name in enumerate(node_names)}
+        line_positions = {name.lower() : i for i, name in enumerate(line_names)}
+        transformer_positions = {name.lower() : i for i, name in enumerate(transformer_names)}
+        self.mv_node_source = np.array([i for i, name in enumerate(mv_node_names) if name in node_positions], dtype=np.int64)
+        self.mv_node_target = np.array([node_positions[name] for name in mv_node_names if name in node_positions], dtype=np.int64)
+        self.mv_line_target = np.array([line_positions[name] for name in mv_line_names], dtype=np.int64)
+        self.feeder_node_source, self.feeder_node_target, self.feeder_line_target, self.feeder_transformer_target = {}, {}, {}, {}
+        for feeder_index, layout in zip(feeder_order, layouts):
+            primary_bus = self.feeders[feeder_index].primary_bus
+            nodes = [(i, node_positions[name.lower()]) for i, name in enumerate(layout.node_names)
+                     if bus_of(name) != primary_bus and name.lower() in node_positions]
+            self.feeder_node_source[feeder_index] = np.array([source for source, _ in nodes], dtype=np.int64)
+            self.feeder_node_target[feeder_index] = np.array([target for _, target in nodes], dtype=np.int64)
+            self.feeder_line_target[feeder_index] = np.array([line_positions[name.lower()] for name in layout.line_names], dtype=np.int64)
+            self.feeder_transformer_target[feeder_index] = transformer_positions[self.feeders[feeder_index].transformer_name.lower()]
+
+    def divide_feeders(self, amount_of_workers : int) -> List[List[int]]:
+        # Largest feeders first, each to the worker with the fewest loads so far
+        groups = [[] for _ in range(min(amount_of_workers, len(self.feeders)))]
+        group_sizes = [0] * len(groups)
+        for i in sorted(range(len(self.feeders)), key=lambda i: len(self.feeders[i].load_names), reverse=True):
+            smallest_group = group_sizes.index(min(group_sizes))
+            groups[smallest_group].append(i)
+            group_sizes[smallest_group] += len(self.feeders[i].load_names) + 1
+        return [group for group in groups if len(group) > 0]
+
+    def solve(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> DecomposedSolution:
+        feeder_load = np.array([complex(load_kw[feeder.load_positions].sum(), load_kvar[feeder.load_positions].sum()) for feeder in self.feeders], dtype=np.complex128)
+        if self.previous_primary_phase_powers is None:
+            primary_phase_powers = np.repeat(feeder_load[:, np.newaxis] / 3, 3, axis=1)
+        else:
+            primary_phase_powers = self.previous_primary_phase_powers + (feeder_load - self.previous_feeder_load)[:, np.newaxis] / 3
+
+        feeder_solutions : dict[int, FeederSolution] = {}
+        previous_source_pu = None
+        converged = False
+        iterations = 0
+        mv_circuit = self.mv_engine.ActiveCircuit
+        while iterations < self.max_iterations:
+            iterations += 1
+            self.set_mv_loads(primary_phase_powers)
+            mv_circuit.Solution.Solve()
+            source_pu = self.source_voltages_pu()
+            if previous_source_pu is not None and np.all(np.abs(source_pu - previous_source_pu) <= self.tolerance_pu):
+                converged = True
+                break
+            feeder_solutions = self.solve_feeders(source_pu, load_kw, load_kvar)
+            primary_phase_powers = np.array([feeder_solutions[i].primary_phase_powers for i in range(len(self.feeders))], dtype=np.complex128).reshape(-1, 3)
+            previous_source_pu = source_pu
+        if not converged:
+            LOGGER.warning(f"Decomposed load flow did not converge within {self.max_iterations} iterations")
+        self.previous_primary_phase_powers = primary_phase_powers
+        self.previous_feeder_load = feeder_load
+        return self.merge(feeder_solutions, iterations, converged and mv_circuit.Solution.Converged)
+
+    def set_mv_loads(self, primary_phase_powers : np.ndarray):
+        loads = self.mv_engine.ActiveCircuit.Loads
+        for load_index, power in zip(self.mv_load_indices, primary_phase_powers.ravel().tolist()):
+            loads.idx = load_index
+            loads.kW = power.real
+            loads.kvar = power.imag
+
+    def source_voltages_pu(self) -> np.ndarray:
+        # The complex phase to ground voltage of every phase of the MV bus of every feeder
+        bus_volts = np.asarray(self.mv_engine.ActiveCircuit.AllBusVolts)
+        node_voltages = bus_volts[0::2] + 1j * bus_volts[1::2]
+        return node_voltages[self.primary_node_positions] / self.primary_voltage_bases[:, np.newaxis]
+
+    def solve_feeders(self, source_pu : np.ndarray, load_kw : np.ndarray, load_kvar : np.ndarray) -> dict[int, FeederSolution]:
+        def arguments(group):
+            return (source_pu[group], [load_kw[self.feeders[i].load_positions] for i in group], [load_kvar[self.feeders[i].load_positions] for i in group])
+
+        if self.local_solver is not None:
+            solutions = self.local_solver.solve(*arguments(self.groups[0]))
+            return dict(zip(self.groups[0], solutions))
+        for worker, group in zip(self.workers, self.groups):
+            worker.send_solve(*arguments(group))
+        feeder_solutions = {}
+        for worker, group in zip(self.workers, self.groups):
+            feeder_solutions.update(zip(group, worker.receive()))
+        return feeder_solutions
+
+    def merge(self, feeder_solutions : dict[int, FeederSolution], iterations : int, converged : bool) -> DecomposedSolution:
+        bus_voltage_mag = np.zeros(self.amount_of_nodes)
+        total_line_current_mag = np.zeros(self.amount_of_lines)
+        transformer_power = np.zeros(self.amount_of_transformers)
+        mv_circuit = self.mv_engine.ActiveCircuit
+        bus_voltage_mag[self.mv_node_target] = np.asarray(mv_circuit.AllBusVmag)[self.mv_node_source]
+        if len(self.mv_line_target) > 0:
+            currents_mag_ang = np.asarray(mv_circuit.PDElements.AllCurrentsMagAng)
+            total_line_current_mag[self.mv_line_target] = currents_mag_ang[self.mv_line_current_positions].reshape(-1, 3).sum(axis=1)
+        for i, solution in feeder_solutions.items():
+            bus_voltage_mag[self.feeder_node_target[i]] = solution.bus_voltage_mag[self.feeder_node_source[i]]
+            total_line_current_mag[self.feeder_line_target[i]] = solution.line_current_mag
+            transformer_power[self.feeder_transformer_target[i]] = solution.transformer_power
+            converged = converged and solution.converged
+        return DecomposedSolution(bus_voltage_mag, total_line_current_mag, transformer_power, iterations, converged)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
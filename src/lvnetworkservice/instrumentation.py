@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager, nullcontext
+import json
+import time
+import numpy as np
+
+METRIC_PREFIX = "lvnetwork"
+QUANTILES = [0.5, 0.95]
+# Returned by Instrumentation.phase when disabled, so a disabled phase costs one attribute check
+DISABLED_PHASE = nullcontext()
+
+def summarize(samples : list[float]) -> dict:
+    if len(samples) == 0:
+        return {"count" : 0, "sum" : 0.0, "p50" : 0.0, "p95" : 0.0, "max" : 0.0}
+    values = np.asarray(samples, dtype=np.float64)
+    p50, p95 = np.quantile(values, QUANTILES).tolist()
+    return {"count" : len(samples), "sum" : float(values.sum()), "p50" : p50, "p95" : p95, "max" : float(values.max())}
+
+class Instrumentation:
+    """Collects the durations of the phases of the service, measured with a monotonic clock, together with the
+    solver iterations, convergence, element counts of the network and the amount of output values written. The
+    samples of a run are summarized into p50/p95/max per metric and exported as JSON or in the Prometheus text
+    format. When disabled nothing is recorded."""
+
+    def __init__(self, enabled : bool = False):
+        self.enabled = enabled
+        self.phase_seconds : dict[str, list[float]] = {}
+        self.solver_iterations : dict[str, list[float]] = {}
+        self.opendss_solve_seconds : list[float] = []
+        self.solve_modes : dict[str, int] = {}
+        self.not_converged_steps = 0
+        self.system_matrix_rebuilds = 0
+        self.element_counts : dict[str, int] = {}
+        self.total_output_values = 0
+        self.written_output_values = 0
+
+    def phase(self, name : str):
+        if not self.enabled:
+            return DISABLED_PHASE
+        return self.timed_phase(name)
+
+    @contextmanager
+    def timed_phase(self, name : str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds.setdefault(name, []).append(time.perf_counter() - start)
+
+    def record_solve(self, mode : str, iterations : int, converged : bool, opendss_solve_seconds : float = None):
+        if not self.enabled:
+            return
+        self.solver_iterations.setdefault(mode, []).append(iterations)
+        self.solve_modes[mode] = self.solve_modes.get(mode, 0) + 1
+        if not converged:
+            self.not_converged_steps += 1
+        if opendss_solve_seconds is not None:
+            self.opendss_solve_seconds.append(opendss_solve_seconds)
+
+    def record_system_matrix_rebuild(self):
+        if not self.enabled:
+            return
+        self.system_matrix_rebuilds += 1
+
+    def record_element_counts(self, element_counts : dict[str, int]):
+        if not self.enabled:
+            return
+        self.element_counts.update(element_counts)
+
+    def record_output_values(self, total_values : int, written_values : int):
+        if not self.enabled:
+            return
+        self.total_output_values += total_values
+        self.written_output_values += written_values
+
+    def merge(self, other : 'Instrumentation'):
+        # Adds the samples and counts of another instrumentation, like that of another network of the service
+        for name, samples in other.phase_seconds.items():
+            self.phase_seconds.setdefault(name, []).extend(samples)
+        for mode, samples in other.solver_iterations.items():
+            self.solver_iterations.setdefault(mode, []).extend(samples)
+        self.opendss_solve_seconds.extend(other.opendss_solve_seconds)
+        for mode, count in other.solve_modes.items():
+            self.solve_modes[mode] = self.solve_modes.get(mode, 0) + count
+        self.not_converged_steps += other.not_converged_steps
+        self.system_matrix_rebuilds += other.system_matrix_rebuilds
+        for element, count in other.element_counts.items():
+            self.element_counts[element] = self.element_counts.get(element, 0) + count
+        self.total_output_values += other.total_output_values
+        self.written_output_values += other.written_output_values
+
+    def summary(self) -> dict:
+        return {
+            "phase_seconds" : {name : summarize(samples) for name, samples in self.phase_seconds.items()},
+            "solver_iterations" : {mode : summarize(samples) for mode, samples in self.solver_iterations.items()},
+            "opendss_solve_seconds" : summarize(self.opendss_solve_seconds),
+            "solve_modes" : dict(self.solve_modes),
+            "not_converged_steps" : self.not_converged_steps,
+            "system_matrix_rebuilds" : self.system_matrix_rebuilds,
+            "element_counts" : dict(self.element_counts),
+            "output_values" : {
+                "total" : self.total_output_values,
+                "written" : self.written_output_values,
+                "compression_ratio" : self.total_output_values / self.written_output_values if self.written_output_values > 0 else 1.0,
+            },
+        }
+
+    def to_prometheus_text(self) -> str:
+        summary = self.summary()
+        lines = []
+        self.add_prometheus_summary(lines, "phase_seconds", "Duration of a phase of the service in seconds", "phase", summary["phase_seconds"])
+        self.add_prometheus_summary(lines, "solver_iterations", "Solver iterations of a load flow", "mode", summary["solver_iterations"])
+        self.add_prometheus_summary(lines, "opendss_solve_seconds", "Solve time reported by OpenDSS in seconds", None, {None : summary["opendss_solve_seconds"]})
+        lines.append(f"# HELP {METRIC_PREFIX}_solves_total Load flow steps per solve mode")
+        lines.append(f"# TYPE {METRIC_PREFIX}_solves_total counter")
+        lines.extend(f'{METRIC_PREFIX}_solves_total{{mode="{mode}"}} {count}' for mode, count in summary["solve_modes"].items())
+        lines.append(f"# HELP {METRIC_PREFIX}_not_converged_steps_total Load flow steps that did not converge")
+        lines.append(f"# TYPE {METRIC_PREFIX}_not_converged_steps_total counter")
+        lines.append(f"{METRIC_PREFIX}_not_converged_steps_total {summary['not_converged_steps']}")
+        lines.append(f"# HELP {METRIC_PREFIX}_system_matrix_rebuilds_total Load flow steps for which the system matrix was rebuilt")
+        lines.append(f"# TYPE {METRIC_PREFIX}_system_matrix_rebuilds_total counter")
+        lines.append(f"{METRIC_PREFIX}_system_matrix_rebuilds_total {summary['system_matrix_rebuilds']}")
+        lines.append(f"# HELP {METRIC_PREFIX}_elements Elements in the network")
+        lines.append(f"# TYPE {METRIC_PREFIX}_elements gauge")
+        lines.extend(f'{METRIC_PREFIX}_elements{{element="{element}"}} {count}' for element, count in summary["element_counts"].items())
+        lines.append(f"# HELP {METRIC_PREFIX}_output_values_total Output values produced and written to InfluxDB")
+        lines.append(f"# TYPE {METRIC_PREFIX}_output_values_total counter")
+        lines.append(f'{METRIC_PREFIX}_output_values_total{{state="produced"}} {summary["output_values"]["total"]}')
+        lines.append(f'{METRIC_PREFIX}_output_values_total{{state="written"}} {summary["output_values"]["written"]}')
+        return "\n".join(lines) + "\n"
+
+    def add_prometheus_summary(self, lines : list[str], metric : str, description : str, label : str, summaries : dict[str, dict]):
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} summary")
+        for label_value, statistics in summaries.items():
+            labels = [] if label is None else [f'{label}="{label_value}"']
+            for quantile, key in zip(QUANTILES, ["p50", "p95"]):
+                quantile_labels = ",".join(labels + [f'quantile="{quantile}"'])
+                lines.append(f"{name}{{{quantile_labels}}} {statistics[key]}")
+            label_text = f"{{{labels[0]}}}" if labels else ""
+            lines.append(f"{name}_sum{label_text} {statistics['sum']}")
+            lines.append(f"{name}_count{label_text} {statistics['count']}")
+        # Prometheus summaries have no maximum, so it is exported as a separate gauge
+        lines.append(f"# TYPE {name}_max gauge")
+        for label_value, statistics in summaries.items():
+            label_text = "" if label is None else f'{{{label}="{label_value}"}}'
+            lines.append(f"{name}_max{label_text} {statistics['max']}")
+
+    def export(self, file_name : str):
+        # The format follows the extension: JSON for .json, the Prometheus text format otherwise
+        with open(file_name, "w") as f:
+            if file_name.lower().endswith(".json"):
+                json.dump(self.summary(), f, indent=2)
+            else:
+                f.write(self.to_prometheus_text())
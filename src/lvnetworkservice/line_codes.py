@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from functools import lru_cache
+import os
+import re
+from typing import Optional
+import numpy as np
+
+METERS_PER_UNIT = {
+    "none" : 1.0,
+    "m" : 1.0,
+    "cm" : 0.01,
+    "km" : 1000.0,
+    "ft" : 0.3048,
+    "in" : 0.0254,
+    "kft" : 304.8,
+    "mi" : 1609.344,
+}
+
+PROPERTY_PATTERN = re.compile(r"(\w+)\s*=\s*(\[[^\]]*\]|\([^)]*\)|\"[^\"]*\"|\S+)")
+
+@dataclass
+class LineCode:
+    name : str
+    phases : int
+    meters_per_unit : float
+    normal_amps : float
+    r1 : Optional[float] = None
+    x1 : Optional[float] = None
+    r0 : Optional[float] = None
+    x0 : Optional[float] = None
+    rmatrix : Optional[np.ndarray] = None
+    xmatrix : Optional[np.ndarray] = None
+
+    def impedance_matrix_per_meter(self) -> np.ndarray:
+        if self.rmatrix is not None and self.xmatrix is not None:
+            return (self.rmatrix + 1j * self.xmatrix) / self.meters_per_unit
+        z1 = complex(self.r1 or 0.0, self.x1 or 0.0)
+        z0 = complex(self.r0 if self.r0 is not None else self.r1 or 0.0, self.x0 if self.x0 is not None else self.x1 or 0.0)
+        z_self = (2 * z1 + z0) / 3
+        z_mutual = (z0 - z1) / 3
+        z = np.full((self.phases, self.phases), z_mutual, dtype=np.complex128)
+        np.fill_diagonal(z, z_self)
+        return z / self.meters_per_unit
+
+    def positive_sequence_impedance_per_meter(self) -> complex:
+        if self.r1 is not None or self.x1 is not None:
+            return complex(self.r1 or 0.0, self.x1 or 0.0) / self.meters_per_unit
+        z = self.impedance_matrix_per_meter()[:3, :3]
+        z_self = np.mean(np.diag(z))
+        z_mutual = (z.sum() - np.trace(z)) / 6
+        return complex(z_self - z_mutual)
+
+def parse_triangular_matrix(value : str, phases : int) -> np.ndarray:
+    rows = [row.split() for row in value.strip("[]() ").split("|")]
+    matrix = np.zeros((phases, phases))
+    for i, row in enumerate(rows):
+        for j, element in enumerate(row):
+            matrix[i, j] = float(element)
+            matrix[j, i] = float(element)
+    return matrix
+
+def parse_line_codes(dss_text : str) -> dict[str, LineCode]:
+    definitions : dict[str, dict[str, str]] = {}
+    current_definition = None
+    for raw_line in dss_text.splitlines():
+        line = raw_line.split("!")[0].strip()
+        if not line:
+            continue
+        if line.startswith("~"):
+            if current_definition is not None:
+                current_definition.update(parse_properties(line[1:]))
+            continue
+        parts = line.split(None, 2)
+        current_definition = None
+        if len(parts) >= 2 and parts[0].lower() == "new" and parts[1].lower().startswith("linecode."):
+            current_definition = parse_properties(parts[2] if len(parts) > 2 else "")
+            definitions[parts[1].split(".", 1)[1].lower()] = current_definition
+
+    line_codes = {}
+    for name, properties in definitions.items():
+        phases = int(properties.get("nphases", 3))
+        line_codes[name] = LineCode(
+            name=name,
+            phases=phases,
+            meters_per_unit=METERS_PER_UNIT[properties.get("units", "none").lower()],
+            normal_amps=float(properties.get("normamps", 400.0)),
+            r1=float(properties["r1"]) if "r1" in properties else None,
+            x1=float(properties["x1"]) if "x1" in properties else None,
+            r0=float(properties["r0"]) if "r0" in properties else None,
+            x0=float(properties["x0"]) if "x0" in properties else None,
+            rmatrix=parse_triangular_matrix(properties["rmatrix"], phases) if "rmatrix" in properties else None,
+            xmatrix=parse_triangular_matrix(properties["xmatrix"], phases) if "xmatrix" in properties else None,
+        )
+    return line_codes
+
+def parse_properties(text : str) -> dict[str, str]:
+    return {key.lower() : value for key, value in PROPERTY_PATTERN.findall(text)}
+
+@lru_cache(maxsize=8)
+def _load_line_codes(file_name : str, modification_time : int, size : int) -> dict[str, LineCode]:
+    with open(file_name, "r") as f:
+        return parse_line_codes(f.read())
+
+def load_line_codes(file_name : str) -> dict[str, LineCode]:
+    file_stat = os.stat(file_name)
+    return _load_line_codes(os.path.abspath(file_name), file_stat.st_mtime_ns, file_stat.st_size)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+from lvnetworkservice.violation_summary import NO_FEEDER, PHASE_CONDUCTORS, group_by_secondary_transformer
+
+@dataclass
+class LinearEstimate:
+    bus_voltage_mag : np.ndarray
+    total_line_current_mag : np.ndarray
+    transformer_power : np.ndarray
+
+def system_y_entries(dss_engine) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # OpenDSS returns the system Y matrix in compressed sparse column form, in the node order of YNodeOrder
+    data, row_indices, column_pointers = dss_engine.YMatrix.GetCompressedYMatrix(True)
+    columns = np.repeat(np.arange(len(column_pointers) - 1), np.diff(column_pointers))
+    return row_indices.astype(np.int64), columns, data
+
+def dense_block(rows : np.ndarray, columns : np.ndarray, data : np.ndarray, row_positions : np.ndarray, column_positions : np.ndarray,
+                shape : tuple[int, int]) -> np.ndarray:
+    # row_positions and column_positions map a node to its position in the block, -1 for nodes outside of it
+    block = np.zeros(shape, dtype=np.complex128)
+    inside = (row_positions[rows] >= 0) & (column_positions[columns] >= 0)
+    np.add.at(block, (row_positions[rows[inside]], column_positions[columns[inside]]), data[inside])
+    return block
+
+def terminal_rows(active_circuit, element_name : str, conductors : int) -> tuple[np.ndarray, np.ndarray]:
+    # Rows of the primitive admittance matrix that give the currents of the first conductors of the first
+    # terminal from the voltages of the nodes of the element, with the node of every column (-1 for ground)
+    active_circuit.SetActiveElement(element_name)
+    element = active_circuit.ActiveCktElement
+    node_refs = np.asarray(element.NodeRef, dtype=np.int64) - 1
+    y_prim = np.asarray(element.Yprim, dtype=np.float64).view(np.complex128).reshape(len(node_refs), len(node_refs))
+    return y_prim[:conductors], node_refs
+
+def stack_rows(rows : List[tuple[np.ndarray, np.ndarray]], ground : int) -> tuple[np.ndarray, np.ndarray]:
+    # Pads the rows of all elements to the same width; padded columns have a zero admittance to the ground
+    width = max((coefficients.shape[1] for coefficients, _ in rows), default=0)
+    amount_of_rows = sum(coefficients.shape[0] for coefficients, _ in rows)
+    stacked_coefficients = np.zeros((amount_of_rows, width), dtype=np.complex128)
+    stacked_nodes = np.full((amount_of_rows, width), ground, dtype=np.int64)
+    row = 0
+    for coefficients, nodes in rows:
+        stacked_coefficients[row:row + coefficients.shape[0], :coefficients.shape[1]] = coefficients
+        stacked_nodes[row:row + coefficients.shape[0], :coefficients.shape[1]] = np.where(nodes < 0, ground, nodes)
+        row += coefficients.shape[0]
+    return stacked_coefficients, stacked_nodes
+
+class LinearPowerFlowEstimator:
+    """Estimates the results of a load flow from the loads around a base operating point instead of solving it.
+    A change of the power of a load changes its current by -conj(dS / V) at the base voltage V across it, and
+    the node voltages by Y^-1 times those currents. Line currents and transformer powers follow from the node
+    voltages through the primitive admittances of the elements.
+
+    Y^-1 is dense, so it is not formed for the whole network. Every LV network behind a secondary transformer
+    (a feeder) gets its own dense block: the voltage change inside the feeder with its MV boundary nodes held
+    fixed, plus how its currents reach the MV network and how MV voltage changes reach back into the feeder.
+    The MV network is solved with the feeders reduced onto it (Kron reduction). A step then takes a batched
+    matrix-vector product over the feeders and one over the MV nodes, instead of the iterative solve.
+
+    Every estimate is refined with `corrections` fixed point iterations that evaluate the load currents at the
+    estimated instead of the base voltages. The error still grows with the distance to the base point, so
+    estimates that come near a voltage or thermal limit should be checked with an exact solve, see
+    EstimateLimits."""
+
+    def __init__(self, dss_engine, node_names : List[str], line_names : List[str], transformer_names : List[str], load_indices : np.ndarray,
+                 line_buses : List[tuple[str, str]], transformer_buses : List[tuple[str, str]], base_load_kw : np.ndarray, base_load_kvar : np.ndarray,
+                 corrections : int = 2):
+        # The base point is the last solution of the circuit, which has to be solved with the base loads
+        active_circuit = dss_engine.ActiveCircuit
+        self.base_load_kw = base_load_kw.copy()
+        self.base_load_kvar = base_load_kvar.copy()
+        self.corrections = corrections
+        y_node_names = list(active_circuit.YNodeOrder)
+        self.amount_of_nodes = len(y_node_names)
+        # One extra node at the end stands for the ground and for the padding of the feeder blocks
+        self.ground = self.amount_of_nodes
+        self.base_voltages = np.append(np.asarray(active_circuit.YNodeVarray, dtype=np.float64).view(np.complex128), 0.0)
+        y_node_positions = {name.lower() : i for i, name in enumerate(y_node_names)}
+        self.node_positions = np.array([y_node_positions[name.lower()] for name in node_names], dtype=np.int64)
+
+        # OpenDSS includes the nominal admittance of every load in the system Y matrix and compensates for it
+        # in the injection currents, so it is removed again: here a load is only its power
+        rows, columns, data = system_y_entries(dss_engine)
+        loads = active_circuit.Loads
+        load_nodes, load_y_entries, constant_power_ranges = [], [], []
+        for load_index in load_indices.tolist():
+            loads.idx = load_index
+            constant_power_ranges.append((loads.Vminpu * loads.kV * 1e3, loads.Vmaxpu * loads.kV * 1e3))
+            element = active_circuit.ActiveCktElement
+            node_refs = np.asarray(element.NodeRef, dtype=np.int64) - 1
+            load_nodes.append(node_refs[:2])
+            y_prim = np.asarray(element.Yprim, dtype=np.float64).view(np.complex128).reshape(len(node_refs), len(node_refs))
+            connected = np.flatnonzero(node_refs >= 0)
+            load_y_entries.append((np.repeat(node_refs[connected], len(connected)), np.tile(node_refs[connected], len(connected)),
+                                   -y_prim[np.ix_(connected, connected)].ravel()))
+        if load_y_entries:
+            rows = np.concatenate([rows] + [entries[0] for entries in load_y_entries])
+            columns = np.concatenate([columns] + [entries[1] for entries in load_y_entries])
+            data = np.concatenate([data] + [entries[2] for entries in load_y_entries])
+        load_nodes = np.array(load_nodes, dtype=np.int64).reshape(-1, 2)
+        # Outside of this voltage range OpenDSS turns a constant power load into a constant impedance
+        self.constant_power_ranges = np.array(constant_power_ranges, dtype=np.float64).reshape(-1, 2)
+        self.load_phase_nodes = load_nodes[:, 0]
+        self.load_neutral_nodes = np.where(load_nodes[:, 1] < 0, self.ground, load_nodes[:, 1])
+        # Current into the phase node per kVA of load at the base voltage: a kW draws -1e3 / conj(V) and the
+        # current returns through the neutral node
+        self.base_load_voltages = self.load_voltages(self.base_voltages)
+        self.current_per_kva = -1e3 / np.conj(self.base_load_voltages)
+
+        self.build_blocks(rows, columns, data, y_node_names, line_buses, transformer_names, transformer_buses)
+
+        # Like process_results: the sum of the current magnitudes of the three phases at the first terminal of
+        # every line and the apparent power over all conductors at the first terminal of every transformer
+        self.amount_of_lines = len(line_names)
+        self.line_coefficients, self.line_nodes = stack_rows([terminal_rows(active_circuit, f"Line.{name}", 3) for name in line_names], self.ground)
+        transformer_rows = []
+        for name in transformer_names:
+            active_circuit.SetActiveElement(f"Transformer.{name}")
+            transformer_rows.append(terminal_rows(active_circuit, f"Transformer.{name}", active_circuit.ActiveCktElement.NumConductors))
+        conductors = [len(coefficients) for coefficients, _ in transformer_rows]
+        self.transformer_starts = np.concatenate(([0], np.cumsum(conductors)[:-1])).astype(np.int64) if conductors else np.zeros(0, dtype=np.int64)
+        # Row c of a transformer is conductor c of its first terminal, connected to the node of column c
+        self.transformer_conductor_nodes = np.concatenate([np.where(nodes[:len(coefficients)] < 0, self.ground, nodes[:len(coefficients)])
+                                                           for coefficients, nodes in transformer_rows]) if transformer_rows else np.zeros(0, dtype=np.int64)
+        self.transformer_coefficients, self.transformer_nodes = stack_rows(transformer_rows, self.ground)
+
+    def build_blocks(self, rows : np.ndarray, columns : np.ndarray, data : np.ndarray, y_node_names : List[str], line_buses : List[tuple[str, str]],
+                     transformer_names : List[str], transformer_buses : List[tuple[str, str]]):
+        node_feeders = group_by_secondary_transformer(y_node_names, line_buses, transformer_names, transformer_buses).node_feeders
+        amount_of_feeders = int(node_feeders.max()) + 1 if len(node_feeders) > 0 else 0
+        self.mv_nodes = np.flatnonzero(node_feeders == NO_FEEDER)
+        mv_positions = np.full(self.amount_of_nodes + 1, -1, dtype=np.int64)
+        mv_positions[self.mv_nodes] = np.arange(len(self.mv_nodes))
+        feeder_nodes = [np.flatnonzero(node_feeders == feeder) for feeder in range(amount_of_feeders)]
+        # The MV nodes every feeder is coupled to, normally the primary bus of its transformer
+        coupled = (node_feeders[rows] >= 0) & (node_feeders[columns] == NO_FEEDER)
+        boundary_nodes = [np.unique(columns[coupled & (node_feeders[rows] == feeder)]) for feeder in range(amount_of_feeders)]
+        block_size = max((len(nodes) for nodes in feeder_nodes), default=0)
+        boundary_size = max((len(nodes) for nodes in boundary_nodes), default=0)
+
+        # Per feeder, with its interior nodes i and boundary nodes b: the interior voltages with the boundary
+        # held fixed (Y_ii^-1), the equivalent current at the boundary (-Y_bi Y_ii^-1) and the interior
+        # voltages per boundary voltage (-Y_ii^-1 Y_ib), padded to the largest feeder
+        self.feeder_nodes = np.full((amount_of_feeders, block_size), self.ground, dtype=np.int64)
+        self.feeder_boundary = np.full((amount_of_feeders, boundary_size), len(self.mv_nodes), dtype=np.int64)
+        self.feeder_impedances = np.zeros((amount_of_feeders, block_size, block_size), dtype=np.complex128)
+        self.feeder_boundary_currents = np.zeros((amount_of_feeders, boundary_size, block_size), dtype=np.complex128)
+        self.feeder_boundary_voltages = np.zeros((amount_of_feeders, block_size, boundary_size), dtype=np.complex128)
+        reduced_y = dense_block(rows, columns, data, mv_positions, mv_positions, (len(self.mv_nodes), len(self.mv_nodes)))
+        for feeder, (nodes, boundary) in enumerate(zip(feeder_nodes, boundary_nodes)):
+            positions = np.full(self.amount_of_nodes + 1, -1, dtype=np.int64)
+            positions[nodes] = np.arange(len(nodes))
+            boundary_positions = np.full(self.amount_of_nodes + 1, -1, dtype=np.int64)
+            boundary_positions[boundary] = np.arange(len(boundary))
+            impedances = np.linalg.inv(dense_block(rows, columns, data, positions, positions, (len(nodes), len(nodes))))
+            y_interior_boundary = dense_block(rows, columns, data, positions, boundary_positions, (len(nodes), len(boundary)))
+            y_boundary_interior = dense_block(rows, columns, data, boundary_positions, positions, (len(boundary), len(nodes)))
+            boundary_currents = -y_boundary_interior @ impedances
+            reduced_y[np.ix_(mv_positions[boundary], mv_positions[boundary])] += boundary_currents @ y_interior_boundary
+            self.feeder_nodes[feeder, :len(nodes)] = nodes
+            self.feeder_boundary[feeder, :len(boundary)] = mv_positions[boundary]
+            self.feeder_impedances[feeder, :len(nodes), :len(nodes)] = impedances
+            self.feeder_boundary_currents[feeder, :len(boundary), :len(nodes)] = boundary_currents
+            self.feeder_boundary_voltages[feeder, :len(nodes), :len(boundary)] = -impedances @ y_interior_boundary
+        self.mv_impedances = np.linalg.inv(reduced_y) if len(self.mv_nodes) > 0 else np.zeros((0, 0), dtype=np.complex128)
+
+    def load_voltages(self, voltages : np.ndarray) -> np.ndarray:
+        return voltages[self.load_phase_nodes] - voltages[self.load_neutral_nodes]
+
+    def voltage_change(self, load_change : np.ndarray) -> np.ndarray:
+        currents = np.zeros(self.amount_of_nodes + 1, dtype=np.complex128)
+        load_currents = np.conj(load_change) * self.current_per_kva
+        np.add.at(currents, self.load_phase_nodes, load_currents)
+        np.add.at(currents, self.load_neutral_nodes, -load_currents)
+        currents[self.ground] = 0.0
+
+        # The MV currents are the loads at MV nodes plus the equivalent currents of the feeders; the extra
+        # position at the end collects the padding of the boundaries
+        feeder_currents = currents[self.feeder_nodes][..., None]
+        mv_currents = np.append(currents[self.mv_nodes], 0.0)
+        np.add.at(mv_currents, self.feeder_boundary, (self.feeder_boundary_currents @ feeder_currents)[..., 0])
+        mv_voltages = np.append(self.mv_impedances @ mv_currents[:-1], 0.0)
+
+        voltage_change = np.zeros(self.amount_of_nodes + 1, dtype=np.complex128)
+        voltage_change[self.mv_nodes] = mv_voltages[:-1]
+        voltage_change[self.feeder_nodes] = (self.feeder_impedances @ feeder_currents
+                                             + self.feeder_boundary_voltages @ mv_voltages[self.feeder_boundary][..., None])[..., 0]
+        voltage_change[self.ground] = 0.0
+        return voltage_change
+
+    def constant_impedance_factors(self, voltage_magnitudes : np.ndarray) -> np.ndarray:
+        # The share of the nominal power a load draws, (V / V_limit)^2 outside of its constant power range
+        limits = np.clip(voltage_magnitudes, self.constant_power_ranges[:, 0], self.constant_power_ranges[:, 1])
+        return (voltage_magnitudes / limits) ** 2
+
+    def estimate(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> LinearEstimate:
+        power = load_kw + 1j * load_kvar
+        base_power = self.base_load_kw + 1j * self.base_load_kvar
+        voltages = self.base_voltages + self.voltage_change(power - base_power)
+        for _ in range(self.corrections):
+            # A load draws conj(S / V) at the estimated voltage V across it, which is the current that a power
+            # of S * V_base / V draws at the base voltage
+            load_voltages = self.load_voltages(voltages)
+            effective_power = power * self.constant_impedance_factors(np.abs(load_voltages)) * self.base_load_voltages / load_voltages
+            voltages = self.base_voltages + self.voltage_change(effective_power - base_power)
+
+        line_currents = (self.line_coefficients * voltages[self.line_nodes]).sum(axis=1)
+        transformer_currents = (self.transformer_coefficients * voltages[self.transformer_nodes]).sum(axis=1)
+        # Apparent power in kVA, summed over the conductors before taking the magnitude like process_results
+        conductor_powers = voltages[self.transformer_conductor_nodes] * np.conj(transformer_currents) * 1e-3
+        transformer_power = np.abs(np.add.reduceat(conductor_powers, self.transformer_starts)) if len(self.transformer_starts) > 0 else np.zeros(0)
+        return LinearEstimate(
+            bus_voltage_mag=np.abs(voltages[self.node_positions]),
+            total_line_current_mag=np.abs(line_currents).reshape(self.amount_of_lines, 3).sum(axis=1),
+            transformer_power=transformer_power
+        )
+
+class EstimateLimits:
+    """Decides whether an estimate is far enough from the voltage band and the thermal limits of the network
+    to be used instead of an exact solve."""
+
+    def __init__(self, node_names : List[str], node_voltage_bases : np.ndarray, line_current_limits : np.ndarray, transformer_power_limits : np.ndarray,
+                 voltage_min_pu : float, voltage_max_pu : float, max_loading : float):
+        phase_nodes = np.array([name.rsplit('.', 1)[-1] in PHASE_CONDUCTORS for name in node_names], dtype=bool) & (node_voltage_bases > 0)
+        self.phase_nodes = np.flatnonzero(phase_nodes)
+        self.voltage_min = voltage_min_pu * node_voltage_bases[self.phase_nodes]
+        self.voltage_max = voltage_max_pu * node_voltage_bases[self.phase_nodes]
+        # Elements without a limit are never near it
+        self.line_current_max = np.where(line_current_limits > 0, max_loading * line_current_limits, np.inf)
+        self.transformer_power_max = np.where(transformer_power_limits > 0, max_loading * transformer_power_limits, np.inf)
+
+    def within_limits(self, estimate : LinearEstimate) -> bool:
+        voltages = estimate.bus_voltage_mag[self.phase_nodes]
+        return bool(np.all(voltages >= self.voltage_min) and np.all(voltages <= self.voltage_max)
+                    and np.all(estimate.total_line_current_mag <= self.line_current_max)
+                    and np.all(estimate.transformer_power <= self.transformer_power_max))
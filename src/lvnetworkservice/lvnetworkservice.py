@@ -1,18 +1,38 @@
 # -*- coding: utf-8 -*-
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from pathlib import Path
+import os
+import threading
 import time
-from typing import List
+from typing import List, TYPE_CHECKING
 from esdl import esdl
 import helics as h
 from dots_infrastructure.DataClasses import EsdlId, HelicsCalculationInformation, SubscriptionDescription, TimeStepInformation
 from dots_infrastructure.HelicsFederateHelpers import HelicsSimulationExecutor
 from dots_infrastructure.Logger import LOGGER
+from dots_infrastructure.influxdb_connector import InfluxDBConnector
 from esdl import EnergySystem
-import networkx as nx
 import dss
-import math
-from dataclasses import dataclass
+import numpy as np
+from dataclasses import dataclass, field, asdict, replace
+from lvnetworkservice.line_codes import load_line_codes
+from lvnetworkservice.mv_network import MV_SOURCE_BUS, MvNetworkGraph
+from lvnetworkservice.esdl_index import EsdlIndex
+from lvnetworkservice.instrumentation import Instrumentation
+from lvnetworkservice.output_deadband import OutputDeadband
+from lvnetworkservice.background_writer import BackgroundResultWriter
+
+# Only some configurations need these modules, so they are imported where they are used to keep startup fast
+if TYPE_CHECKING:
+    from lvnetworkservice.network_cache import CompiledNetworkCache
+    from lvnetworkservice.replay import LoadProfiles
+    from lvnetworkservice.feeder_decomposition import DecomposedNetworkSolver
+    from lvnetworkservice.result_archive import ResultArchiveWriter
+    from lvnetworkservice.violation_summary import ViolationSummary
+    from lvnetworkservice.linear_estimate import EstimateLimits, LinearPowerFlowEstimator
+    from lvnetworkservice.solver_profile import SolverProfile
+    from lvnetworkservice.scenarios import ScenarioEvaluator, ScenarioSettings
+    from lvnetworkservice.network_reduction import NetworkReduction, ReducedResultExpansion
 
 @dataclass
 class DssCircuitProperties:
@@ -21,207 +41,564 @@ class DssCircuitProperties:
     secondary_trafo_busses : List[str]
     secondary_voltage_bases: List[float]
 
+INITIAL_LOAD_KW = 1.0
+INITIAL_LOAD_KVAR = 0.0
+SOLVE_MODE_SKIPPED = "skipped"
+# A full OpenDSS solve, and the first of those after the network is compiled
+SOLVE_MODE_FULL = "full"
+SOLVE_MODE_INITIAL = "initial"
+SOLVE_MODE_DECOMPOSED = "decomposed"
+SOLVE_MODE_ESTIMATED = "estimated"
+# Write every value of every step, or only per feeder summaries and the elements that violate their band or limit
+OUTPUT_MODE_FULL = "full"
+OUTPUT_MODE_SUMMARY = "summary"
+# OpenDSS starts a new year, and wraps yearly load shapes, after 8760 hours
+REPLAY_HOURS_PER_RUN = 8760
+# The amount of points at which the influx connector writes the points it holds, each holding one value
+INFLUX_MAX_DATA_POINTS = 100000
+# Appended to the measurement of the outputs for the measurement that holds the buses of the lines and transformers
+TOPOLOGY_MEASUREMENT_SUFFIX = "_topology"
+# Settings of a service that networks hosted by it take over
+HOSTED_NETWORK_SETTINGS = [
+    "bulk_write_results", "bulk_write_max_values", "incremental_solve", "incremental_solve_tolerance",
+    "network_cache_directory", "network_cache_max_size_bytes", "feeder_decomposition", "feeder_decomposition_workers",
+    "feeder_decomposition_max_iterations", "feeder_decomposition_tolerance_pu", "output_deadband",
+    "output_deadband_absolute", "output_deadband_relative", "output_deadband_full_write_interval", "influx_output",
+    "result_archive_directory", "result_archive_format", "result_archive_flush_steps", "output_mode", "summary_voltage_band_pu",
+    "summary_max_loading", "linear_estimate", "linear_estimate_voltage_band_pu", "linear_estimate_max_loading", "background_write",
+    "solver_profile", "scenario_settings", "scenario_workers", "network_reduction"
+]
+# Output quantities in the order of OutputNameTable.all_names and PowerFlowResult.all_values
+OUTPUT_QUANTITIES = ["bus_voltage_mag", "total_line_current_mag", "transformer_power"]
+LINE_CODE_FILE_NAME = 'LineCode.dss'
+XFMR_CODE_FILE_NAME = 'XFMRCode.dss'
+LINES_SECTION_START_MARKER = '! Lines \n'
+TRANSFORMER_SECTION_START_MARKER = '! Trafo \n'
+LOAD_DEFINITION_SECTION_START_MARKER = '! Load Definitions \n'
+
 @dataclass
-class PowerFlowResult:
-    bus_voltage_mag : List[float]
-    total_line_current_mag : List[float]
-    transformer_power : List[float]
-    total_line_current_lim : List[float]
-    transformer_power_lim : List[float]
+class DssModel:
+    header : List[str] = field(default_factory=list)
+    source : List[str] = field(default_factory=list)
+    transformers : List[str] = field(default_factory=list)
+    mv_lines : dict[str, str] = field(default_factory=dict)
+    lv_lines : List[str] = field(default_factory=list)
+    loads : List[str] = field(default_factory=list)
+    final_configuration : List[str] = field(default_factory=list)
+    mv_cut_cables : set[str] = field(default_factory=set)
+    # The buses and cables that were reduced away, when the network is reduced
+    reduction : 'NetworkReduction' = None
+
+    def to_lines(self) -> List[str]:
+        lines = list(self.header)
+        lines.append('\n! Swing or Source Bar \n')
+        lines.extend(self.source)
+        lines.append('\n! Trafo XFMRCodes \n')
+        lines.append(f'Redirect {XFMR_CODE_FILE_NAME} \n')
+        lines.append('\n')
+        lines.append(TRANSFORMER_SECTION_START_MARKER)
+        lines.extend(self.transformers)
+        lines.append('\n! LineCodes \n')
+        lines.append(f'Redirect {LINE_CODE_FILE_NAME} \n')
+        lines.append('\n')
+        lines.append(LINES_SECTION_START_MARKER)
+        lines.extend(self.lv_lines)
+        lines.extend(line for name, line in self.mv_lines.items() if name not in self.mv_cut_cables)
+        lines.append('\n')
+        lines.append(LOAD_DEFINITION_SECTION_START_MARKER)
+        lines.extend(self.loads)
+        lines.extend(self.final_configuration)
+        return lines
+
+    def to_script(self) -> str:
+        return ''.join(self.to_lines())
+
+    def to_dict(self) -> dict:
+        dss_model_dict = asdict(self)
+        dss_model_dict["mv_cut_cables"] = sorted(self.mv_cut_cables)
+        return dss_model_dict
+
+    @staticmethod
+    def from_dict(dss_model_dict : dict) -> 'DssModel':
+        dss_model = DssModel(**dss_model_dict)
+        dss_model.mv_cut_cables = set(dss_model.mv_cut_cables)
+        if dss_model.reduction is not None:
+            from lvnetworkservice.network_reduction import NetworkReduction
+            dss_model.reduction = NetworkReduction.from_dict(dss_model.reduction)
+        return dss_model
 
-class CalculationServiceLVNetwork(HelicsSimulationExecutor):
+@dataclass
+class LoadInjectionIndex:
+    active_power_keys : List[str]
+    reactive_power_keys : List[str]
+    e_connection_rows : np.ndarray
+    phase_columns : np.ndarray
+    load_indices : np.ndarray
 
-    def __init__(self):
-        super().__init__()
+@dataclass
+class ResultExtractionIndex:
+    line_current_positions : np.ndarray
+    line_current_starts : np.ndarray
+    transformer_power_positions : np.ndarray
+    transformer_power_starts : np.ndarray
 
-        subscriptions_values = [
-            SubscriptionDescription(esdl_type="EConnection",
-                                    input_name="aggregated_active_power",
-                                    input_unit="W", 
-                                    input_type=h.HelicsDataType.VECTOR),
-            SubscriptionDescription(esdl_type="EConnection",
-                                    input_name="aggregated_reactive_power",
-                                    input_unit="VAr",
-                                    input_type=h.HelicsDataType.VECTOR)
-        ]
+@dataclass
+class OutputNameTable:
+    node_names : List[str]
+    line_names : List[str]
+    transformer_names : List[str]
 
-        e_connection_period_in_seconds = 900
+    def all_names(self) -> List[str]:
+        return self.node_names + self.line_names + self.transformer_names
 
-        calculation_information = HelicsCalculationInformation(
-            time_period_in_seconds=e_connection_period_in_seconds,
-            offset=0, 
-            uninterruptible=False, 
-            wait_for_current_time_update=False, 
-            terminate_on_error=True, 
-            calculation_name="load_flow_current_step",
-            inputs=subscriptions_values,
-            outputs=[],
-            calculation_function=self.load_flow_current_step
-        )
-        self.dss_engine = dss.DSS
-        self.lines_section_start_marker = '! Lines \n'
-        self.transformer_section_start_marker = '! Trafo \n'
-        self.load_definition_section_start_marker = '! Load Definitions \n'
-        self.add_calculation(calculation_information)
+    def quantity_sizes(self) -> List[int]:
+        return [len(self.node_names), len(self.line_names), len(self.transformer_names)]
+
+@dataclass
+class StaticNetworkData:
+    """Outputs that are fixed once the network is compiled. They are written once per simulation instead of
+    with every step: the current limit of every line (A), the power limit of every transformer (kVA), the
+    phase to neutral voltage base of every node (V) and the buses every line and transformer connects. The
+    buses are text and are kept apart from the numeric outputs."""
+    line_limit_names : List[str]
+    line_current_limits : np.ndarray
+    transformer_limit_names : List[str]
+    transformer_power_limits : np.ndarray
+    node_voltage_base_names : List[str]
+    node_voltage_bases : np.ndarray
+    line_buses : List[tuple[str, str]]
+    transformer_buses : List[tuple[str, str]]
+    line_names : List[str]
+    transformer_names : List[str]
+
+    def outputs(self) -> List[tuple[str, float]]:
+        outputs = list(zip(self.line_limit_names, self.line_current_limits.tolist()))
+        outputs.extend(zip(self.transformer_limit_names, self.transformer_power_limits.tolist()))
+        outputs.extend(zip(self.node_voltage_base_names, self.node_voltage_bases.tolist()))
+        return outputs
+
+    def topology_outputs(self) -> List[tuple[str, str]]:
+        outputs = []
+        for names, buses in ((self.line_names, self.line_buses), (self.transformer_names, self.transformer_buses)):
+            for name, (bus_from, bus_to) in zip(names, buses):
+                outputs.append((f"{name}_bus_from", bus_from))
+                outputs.append((f"{name}_bus_to", bus_to))
+        return outputs
+
+@dataclass
+class LoadFlowStepReport:
+    mode : str
+    iterations : int
+    converged : bool
+    system_matrix_rebuilt : bool = False
+
+@dataclass
+class PowerFlowResult:
+    bus_voltage_mag : np.ndarray
+    total_line_current_mag : np.ndarray
+    transformer_power : np.ndarray
+    # Percentiles and violation probabilities over the load scenarios of the step, when scenarios are evaluated
+    scenario_outputs : List[tuple[str, float]] = field(default_factory=list)
+
+    def all_values(self) -> np.ndarray:
+        return np.concatenate((self.bus_voltage_mag, self.total_line_current_mag, self.transformer_power))
+
+class LVNetwork:
+    """The OpenDSS model of one network with the indices, static data and solvers built for it, solved and
+    written per step. The service is the network of its first esdl_id and holds one of these for every other
+    network it serves."""
+
+    def __init__(self, dss_engine, influx_connector : InfluxDBConnector):
+        self.dss_engine = dss_engine
+        self.influx_connector = influx_connector
+        self.lines_section_start_marker = LINES_SECTION_START_MARKER
+        self.transformer_section_start_marker = TRANSFORMER_SECTION_START_MARKER
+        self.load_definition_section_start_marker = LOAD_DEFINITION_SECTION_START_MARKER
         self.ems_list : dict[str, List[str]] = {}
         self.all_node_names : List[str] = []
         self.all_line_names : List[str] = []
         self.all_transformer_names : List[str] = []
-        self.dss_file_name = "main.dss"
-
-    def get_assets_of_type(self, assets : List[esdl.Asset], type):
-        return [a for a in assets if isinstance(a, type)]
-
-    def init_calculation_service(self, energy_system : esdl.EnergySystem):
-        assets = energy_system.instance[0].area.asset
-        self.network_name = energy_system.name.replace(" ", '_')
-        lines_to_write = []
-        dss_circuit_properties = self.build_base_dss_file(assets, lines_to_write)
-        self.add_mv_network_to_main_dss(assets, lines_to_write)
-        self.add_lv_networks_to_main_dss(assets, dss_circuit_properties)
+        self.load_injection_index : LoadInjectionIndex = None
+        self.result_extraction_index : ResultExtractionIndex = None
+        self.output_name_table : OutputNameTable = None
+        self.static_network_data : StaticNetworkData = None
+        self.static_outputs_written : set[EsdlId] = set()
+        self.bulk_write_results = False
+        # Bulk points hold a value per field, so the buffered points are written once they hold this many values
+        self.bulk_write_max_values = INFLUX_MAX_DATA_POINTS
+        self.bulk_buffered_values = 0
+        self.load_kw : np.ndarray = None
+        self.load_kvar : np.ndarray = None
+        # The loads as set in OpenDSS, which lag behind load_kw and load_kvar after estimated steps
+        self.dss_load_kw : np.ndarray = None
+        self.dss_load_kvar : np.ndarray = None
+        self.incremental_solve = False
+        # Largest kW or kvar change of any load for which a step is considered unchanged
+        self.incremental_solve_tolerance = 1e-3
+        self.solved_since_compile = False
+        self.previous_power_flow_result : PowerFlowResult = None
+        self.last_step_report : LoadFlowStepReport = None
+        self.dss_model : DssModel = None
+        self.dss_export_path : str = None
+        self.network_cache_directory : str = None
+        self.network_cache_max_size_bytes = 512 * 1024 * 1024
+        self.network_cache : 'CompiledNetworkCache' = None
+        self.feeder_decomposition = False
+        self.feeder_decomposition_workers = os.cpu_count() or 1
+        self.feeder_decomposition_max_iterations = 10
+        # Largest change of the MV bus voltages between two iterations for which the decomposed solve has converged
+        self.feeder_decomposition_tolerance_pu = 1e-6
+        self.decomposed_solver : 'DecomposedNetworkSolver' = None
+        self.instrumentation = Instrumentation()
+        # Written at stop_simulation when set: JSON for a .json file, the Prometheus text format otherwise
+        self.instrumentation_export_path : str = None
+        self.output_deadband = False
+        # Per output quantity: a value is written when it changed more than max(absolute, relative * |last written value|)
+        # since it was written last. Volts for bus voltages, amperes for line currents and kVA for transformer powers.
+        self.output_deadband_absolute = {"bus_voltage_mag" : 0.1, "total_line_current_mag" : 0.1, "transformer_power" : 0.1}
+        self.output_deadband_relative = {quantity : 0.0 for quantity in OUTPUT_QUANTITIES}
+        # Steps after which all values are written again
+        self.output_deadband_full_write_interval = 96
+        self.deadband : OutputDeadband = None
+        # Results are written to InfluxDB, to a result archive per network in result_archive_directory, or both
+        self.influx_output = True
+        self.result_archive_directory : str = None
+        # "arrow" (Arrow IPC, memory-mapped when read) or "parquet"
+        self.result_archive_format = "arrow"
+        self.result_archive_flush_steps = 96
+        self.result_archives : dict[EsdlId, 'ResultArchiveWriter'] = {}
+        # In summary mode InfluxDB only receives the summaries; a result archive still holds every value
+        self.output_mode = OUTPUT_MODE_FULL
+        # Band of the phase voltages in pu of the node voltage base
+        self.summary_voltage_band_pu = (0.9, 1.1)
+        # Line current or transformer power as a fraction of its limit above which the element is overloaded
+        self.summary_max_loading = 1.0
+        self.violation_summary : 'ViolationSummary' = None
+        # Estimate steps with sensitivities around the initial operating point instead of solving them, unless
+        # the estimate leaves the voltage band (pu of the node voltage base) or loads a line or transformer
+        # above the given fraction of its limit; those steps are solved exactly
+        self.linear_estimate = False
+        self.linear_estimate_voltage_band_pu = (0.92, 1.08)
+        self.linear_estimate_max_loading = 0.9
+        self.linear_estimator : 'LinearPowerFlowEstimator' = None
+        self.linear_estimate_limits : 'EstimateLimits' = None
+        # Write the results of a step on a background thread while the next step is computed. At most
+        # background_write_max_pending steps wait to be written, a step waits for room before returning.
+        self.background_write = False
+        self.background_write_max_pending = 2
+        # Shared by the networks of a service, which write through the influx connector of the service
+        self.result_writer : BackgroundResultWriter = None
+        self.result_write_lock = threading.Lock()
+        # Algorithm, tolerance, iteration limits and system matrix reuse of the snapshot solve; OpenDSS defaults when None.
+        # Does not apply to the feeder decomposition, which solves its feeders in contexts of its own.
+        self.solver_profile : 'SolverProfile' = None
+        # Perturbed load scenarios evaluated around the received loads every step, reduced to percentiles and
+        # violation probabilities (using the summary voltage band and maximum loading) that are written to
+        # InfluxDB with the results of the step. The scenarios are divided over scenario_workers processes.
+        self.scenario_settings : 'ScenarioSettings' = None
+        self.scenario_workers = os.cpu_count() or 1
+        self.scenario_evaluator : 'ScenarioEvaluator' = None
+        # Remove passive dead ends and merge cables in series through passive buses before compiling. Every output
+        # then follows the reduced network: InfluxDB, the result archives, the static outputs, the output deadband,
+        # the summaries and the scenario outputs name a merged line after its first and last cable ("cablea__cableb")
+        # and leave out the removed buses and cables. expand_reduced_results maps a result back to the buses and
+        # cables of the ESDL for callers that need them.
+        self.network_reduction = False
+        self.result_expansion : 'ReducedResultExpansion' = None
+
+    def init_network(self, energy_system : esdl.EnergySystem, area : esdl.Area = None):
+        # The network of an area within the energy system, or of the assets of the energy system itself
+        start = time.perf_counter()
+        top_area = energy_system.instance[0].area
+        area = top_area if area is None else area
+        network_name = energy_system.name if area is top_area else f"{energy_system.name}_{area.name or area.id}"
+        self.network_name = network_name.replace(" ", '_')
+
+        cache_key = None
+        cached_network = None
+        if self.network_cache_directory is not None:
+            with self.instrumentation.phase("init.network_cache_load"):
+                if self.network_cache is None:
+                    from lvnetworkservice.network_cache import CompiledNetworkCache
+                    self.network_cache = CompiledNetworkCache(self.network_cache_directory, self.network_cache_max_size_bytes)
+                cache_key = self.network_cache.compute_key(energy_system, [LINE_CODE_FILE_NAME, XFMR_CODE_FILE_NAME],
+                                                           "network_reduction" if self.network_reduction else None,
+                                                           None if area is top_area else area)
+                cached_network = self.network_cache.load(cache_key)
+
+        if cached_network is None:
+            with self.instrumentation.phase("init.build_dss_model"):
+                self.dss_model = self.build_dss_model(area.asset)
+        else:
+            self.dss_model = DssModel.from_dict(cached_network.dss_model)
+            self.ems_list = cached_network.ems_list
+
+        if self.dss_export_path is not None:
+            self.export_dss_model(self.dss_export_path)
         LOGGER.debug('OpenDSS compile network')
-        self.dss_engine.Text.Command = f"compile {self.dss_file_name}"   
-        self.all_node_names = self.dss_engine.ActiveCircuit.AllNodeNames
-        self.all_line_names = self.dss_engine.ActiveCircuit.Lines.AllNames
-        self.all_transformer_names = self.dss_engine.ActiveCircuit.Transformers.AllNames
-
-    def generate_dss_electricity_cable(self, cable : esdl.ElectricityCable, bus_from : esdl.Joint, bus_to : esdl.Joint, include_ground = True):
-        phases_specifications = '.1.2.3.4' if include_ground else '.1.2.3'
-        phases = 4 if include_ground else 3
-        dss_cable = 'New Line.' + cable.name + f' Phases={phases} Bus1=' + bus_from.name.split('Bus')[
-                        0] + phases_specifications + ' Bus2=' + bus_to.name.split('Bus')[
-                                     0] + phases_specifications + ' LineCode=' + cable.assetType + ' Length=' + str(
-                        cable.length) + ' Units=m \n'
-        return dss_cable
-
-    def add_mv_network_to_main_dss(self, assets : List[esdl.Asset], lines_to_write : List[str]) -> DssCircuitProperties:
-
-        self.add_mv_lines(assets, lines_to_write)
-
-        with open(self.dss_file_name, "w") as f:
-            f.writelines(lines_to_write)
+        with self.instrumentation.phase("init.compile"):
+            self.dss_engine.Text.Commands(self.dss_model.to_script())
+        # Compiling clears the circuit and its solution settings
+        if self.solver_profile is not None:
+            self.solver_profile.apply(self.dss_engine.ActiveCircuit.Solution)
+
+        if cached_network is None:
+            self.all_node_names = self.dss_engine.ActiveCircuit.AllNodeNames
+            self.all_line_names = self.dss_engine.ActiveCircuit.Lines.AllNames
+            self.all_transformer_names = self.dss_engine.ActiveCircuit.Transformers.AllNames
+            if cache_key is not None:
+                from lvnetworkservice.network_cache import CachedNetwork
+                self.network_cache.store(cache_key, CachedNetwork(self.dss_model.to_dict(), self.ems_list, self.all_node_names,
+                                                                  self.all_line_names, self.all_transformer_names))
+        else:
+            self.all_node_names = cached_network.all_node_names
+            self.all_line_names = cached_network.all_line_names
+            self.all_transformer_names = cached_network.all_transformer_names
+
+        with self.instrumentation.phase("init.build_indices"):
+            self.load_injection_index = self.build_load_injection_index()
+            self.load_kw = np.full(len(self.load_injection_index.load_indices), INITIAL_LOAD_KW)
+            self.load_kvar = np.full(len(self.load_injection_index.load_indices), INITIAL_LOAD_KVAR)
+            self.dss_load_kw = self.load_kw
+            self.dss_load_kvar = self.load_kvar
+            self.solved_since_compile = False
+            self.previous_power_flow_result = None
+            self.result_extraction_index = self.build_result_extraction_index()
+            self.output_name_table = self.build_output_name_table()
+            self.static_network_data = self.build_static_network_data()
+            self.result_expansion = self.build_result_expansion() if self.dss_model.reduction is not None else None
+            if self.result_expansion is not None:
+                LOGGER.info(f"The outputs follow the reduced network: {len(self.dss_model.reduction.merged_lines)} merged lines replace "
+                            f"{len(self.dss_model.reduction.reduced_cables)} cables and {len(self.dss_model.reduction.reduced_buses)} buses are left out")
+            self.static_outputs_written = set()
+            # The columns of an archive follow the network, so a re-initialised network starts new archives
+            self.close_result_archives()
+            self.violation_summary = self.build_violation_summary() if self.output_mode == OUTPUT_MODE_SUMMARY else None
+            # Summaries are written every step, the deadband only applies to the full output
+            self.deadband = self.build_output_deadband() if self.output_deadband and self.violation_summary is None else None
+        if self.decomposed_solver is not None:
+            self.decomposed_solver.close()
+            self.decomposed_solver = None
+        if self.feeder_decomposition:
+            with self.instrumentation.phase("init.feeder_decomposition"):
+                self.decomposed_solver = self.build_decomposed_solver()
+        if self.scenario_evaluator is not None:
+            self.scenario_evaluator.close()
+            self.scenario_evaluator = None
+        if self.scenario_settings is not None:
+            with self.instrumentation.phase("init.scenario_evaluator"):
+                self.scenario_evaluator = self.build_scenario_evaluator()
+        self.linear_estimator = None
+        if self.linear_estimate:
+            with self.instrumentation.phase("init.linear_estimator"):
+                self.build_linear_estimator()
+        self.instrumentation.record_element_counts(self.element_counts())
+        end = time.perf_counter()
+        cache_status = "disabled" if cache_key is None else ("hit" if cached_network is not None else "miss")
+        LOGGER.info(f"Initialising the network took {end - start} seconds (network cache {cache_status})")
+
+    def element_counts(self) -> dict[str, int]:
+        active_circuit = self.dss_engine.ActiveCircuit
+        return {
+            "buses" : active_circuit.NumBuses,
+            "nodes" : len(self.all_node_names),
+            "lines" : len(self.all_line_names),
+            "transformers" : len(self.all_transformer_names),
+            "loads" : len(self.load_injection_index.load_indices),
+            "e_connections" : len(self.ems_list),
+        }
 
-        lines_to_write.clear()
+    def build_decomposed_solver(self) -> 'DecomposedNetworkSolver':
+        from lvnetworkservice.feeder_decomposition import DecomposedNetworkSolver, decompose_network
+        load_names = self.dss_engine.ActiveCircuit.Loads.AllNames
+        decomposition = decompose_network(self.dss_model, self.dss_engine.ActiveCircuit, [load_names[i - 1].lower() for i in self.load_injection_index.load_indices.tolist()])
+        LOGGER.info(f"Decomposed the network into {len(decomposition.feeders)} feeders solved by {self.feeder_decomposition_workers} workers")
+        return DecomposedNetworkSolver(decomposition, self.all_node_names, self.all_line_names, self.all_transformer_names, self.feeder_decomposition_workers,
+                                       self.feeder_decomposition_max_iterations, self.feeder_decomposition_tolerance_pu)
+
+    def build_output_name_table(self) -> OutputNameTable:
+        return OutputNameTable(
+            node_names=list(self.all_node_names),
+            line_names=list(self.all_line_names),
+            transformer_names=list(self.all_transformer_names)
+        )
 
-        self.dss_engine.Text.Command = f"compile {self.dss_file_name}"
+    def build_result_expansion(self) -> 'ReducedResultExpansion':
+        from lvnetworkservice.network_reduction import ReducedResultExpansion
+        return ReducedResultExpansion(self.dss_model.reduction, self.all_node_names, self.all_line_names)
 
-        self.cut_cable_in_mv_network(self.dss_file_name)
-    
-    def build_base_dss_file(self, assets : List[esdl.Asset], lines_to_write : List[str]) -> DssCircuitProperties:
-        lines_to_write.append('Clear \n')
-        lines_to_write.append('\nSet DefaultBaseFrequency=50 \n')
+    def build_static_network_data(self) -> StaticNetworkData:
+        active_circuit = self.dss_engine.ActiveCircuit
+        line_current_limits, line_buses = [], []
+        for name in self.all_line_names:
+            active_circuit.Lines.Name = name
+            line_current_limits.append(active_circuit.Lines.NormAmps)
+            line_buses.append((active_circuit.Lines.Bus1.split('.')[0], active_circuit.Lines.Bus2.split('.')[0]))
+
+        transformer_power_limits, transformer_buses = [], []
+        for name in self.all_transformer_names:
+            active_circuit.Transformers.Name = name
+            transformer_power_limits.append(active_circuit.Transformers.kVA)
+            bus_names = active_circuit.ActiveCktElement.BusNames
+            transformer_buses.append((bus_names[0].split('.')[0], bus_names[1].split('.')[0]))
+
+        bus_voltage_bases = {}
+        for name in active_circuit.AllBusNames:
+            active_circuit.SetActiveBus(name)
+            bus_voltage_bases[name.lower()] = active_circuit.ActiveBus.kVBase * 1e3
+
+        return StaticNetworkData(
+            line_limit_names=[f"{name}_limit" for name in self.all_line_names],
+            line_current_limits=np.array(line_current_limits, dtype=np.float64),
+            transformer_limit_names=[f"{name}_limit" for name in self.all_transformer_names],
+            transformer_power_limits=np.array(transformer_power_limits, dtype=np.float64),
+            node_voltage_base_names=[f"{name}_voltage_base" for name in self.all_node_names],
+            node_voltage_bases=np.array([bus_voltage_bases[name.split('.')[0].lower()] for name in self.all_node_names], dtype=np.float64),
+            line_buses=line_buses,
+            transformer_buses=transformer_buses,
+            line_names=list(self.all_line_names),
+            transformer_names=list(self.all_transformer_names)
+        )
 
-        self.generate_source(assets, lines_to_write)
-        dss_circuit_properties = self.generate_trafos(assets, lines_to_write)
+    def build_output_deadband(self) -> OutputDeadband:
+        sizes = self.output_name_table.quantity_sizes()
+        absolute_thresholds = np.repeat([self.output_deadband_absolute.get(quantity, 0.0) for quantity in OUTPUT_QUANTITIES], sizes).astype(np.float64)
+        relative_thresholds = np.repeat([self.output_deadband_relative.get(quantity, 0.0) for quantity in OUTPUT_QUANTITIES], sizes).astype(np.float64)
+        return OutputDeadband(absolute_thresholds, relative_thresholds, self.output_deadband_full_write_interval)
 
-        return dss_circuit_properties
+    def build_linear_estimator(self):
+        from lvnetworkservice.linear_estimate import EstimateLimits, LinearPowerFlowEstimator
+        # The initial loads are the base point, solved once so the voltages across the loads are known
+        self.do_load_flow()
+        static_data = self.static_network_data
+        self.linear_estimator = LinearPowerFlowEstimator(self.dss_engine, self.all_node_names, self.all_line_names, self.all_transformer_names,
+                                                         self.load_injection_index.load_indices, static_data.line_buses, static_data.transformer_buses,
+                                                         self.dss_load_kw, self.dss_load_kvar)
+        voltage_min_pu, voltage_max_pu = self.linear_estimate_voltage_band_pu
+        self.linear_estimate_limits = EstimateLimits(self.all_node_names, static_data.node_voltage_bases, static_data.line_current_limits,
+                                                     static_data.transformer_power_limits, voltage_min_pu, voltage_max_pu, self.linear_estimate_max_loading)
+
+    def build_scenario_evaluator(self) -> 'ScenarioEvaluator':
+        from lvnetworkservice.scenarios import ScenarioEvaluator, ScenarioLoads, ScenarioNetwork, ScenarioReduction
+        index = self.result_extraction_index
+        network = ScenarioNetwork(self.dss_model.to_script(), self.load_injection_index.load_indices, index.line_current_positions,
+                                  index.line_current_starts, index.transformer_power_positions, index.transformer_power_starts)
+        static_data = self.static_network_data
+        voltage_min_pu, voltage_max_pu = self.summary_voltage_band_pu
+        reduction = ScenarioReduction(self.all_node_names, static_data.node_voltage_bases, static_data.line_names, static_data.line_current_limits,
+                                      static_data.transformer_names, static_data.transformer_power_limits, self.scenario_settings.percentiles,
+                                      voltage_min_pu, voltage_max_pu, self.summary_max_loading)
+        LOGGER.info(f"Evaluating {self.scenario_settings.amount_of_scenarios} load scenarios per step with {self.scenario_workers} workers")
+        return ScenarioEvaluator(network, ScenarioLoads(self.scenario_settings, self.load_injection_index.e_connection_rows), reduction, self.scenario_workers)
+
+    def build_violation_summary(self) -> 'ViolationSummary':
+        from lvnetworkservice.violation_summary import ViolationSummary, group_by_secondary_transformer
+        static_data = self.static_network_data
+        grouping = group_by_secondary_transformer(self.all_node_names, static_data.line_buses, static_data.transformer_names, static_data.transformer_buses)
+        voltage_min_pu, voltage_max_pu = self.summary_voltage_band_pu
+        return ViolationSummary(grouping, self.all_node_names, static_data.node_voltage_bases, static_data.line_names, static_data.line_current_limits,
+                                static_data.transformer_names, static_data.transformer_power_limits, voltage_min_pu, voltage_max_pu, self.summary_max_loading)
+
+    def build_load_injection_index(self) -> LoadInjectionIndex:
+        load_name_to_index = {name : i + 1 for i, name in enumerate(self.dss_engine.ActiveCircuit.Loads.AllNames)}
+        e_connection_rows = []
+        phase_columns = []
+        load_indices = []
+        for row, id in enumerate(self.ems_list):
+            for phase, name in enumerate(self.ems_list[id]):
+                e_connection_rows.append(row)
+                phase_columns.append(phase)
+                load_indices.append(load_name_to_index[name.split('.', 1)[1].lower()])
+        return LoadInjectionIndex(
+            active_power_keys=[f'EConnection/aggregated_active_power/{id}' for id in self.ems_list],
+            reactive_power_keys=[f'EConnection/aggregated_reactive_power/{id}' for id in self.ems_list],
+            e_connection_rows=np.array(e_connection_rows, dtype=np.int64),
+            phase_columns=np.array(phase_columns, dtype=np.int64),
+            load_indices=np.array(load_indices, dtype=np.int64)
+        )
 
-    def add_mv_lines(self, assets : List[esdl.Asset], lines_to_write : List[str]) -> DssCircuitProperties:
-        lines_to_write.append('\n! LineCodes \n')
-        lines_to_write.append('Redirect LineCode.dss \n')
-        lines_to_write.append('\n')
-        lines_to_write.append(self.lines_section_start_marker)
-
-        for a in self.get_assets_of_type(assets, esdl.ElectricityCable):
-            if "mv_cable" in a.name.lower():
-                for port in a.port:
-                    if isinstance(port, esdl.InPort):
-                        bus_from = port.connectedTo[0].energyasset
-                    else:
-                        bus_to = port.connectedTo[0].energyasset
-                dss_cable = self.generate_dss_electricity_cable(a, bus_from, bus_to, False)
-                lines_to_write.append(dss_cable)
-
-
-    def remove_cable_from_dss_file(self, joint_name1 : str, joint_name2 : str, file_name : str):
-        with open(file_name, "r") as file:
-            lines = file.readlines()
-
-        line_sub_string_opt1 = f"Bus1={joint_name1} Bus2={joint_name2}"
-        line_sub_string_opt2 = f"Bus1={joint_name2} Bus2={joint_name1}"
-        found_line = next(line for line in lines if line_sub_string_opt1 in line or line_sub_string_opt2 in line)
-        LOGGER.info(f"Removing line: {found_line}")
-        lines.remove(found_line)
-
-        with open(self.dss_file_name, "w") as file:
-            file.writelines(lines)
-
-    def cut_cable_in_mv_network(self, file_name : str):
-        graph = self.build_mv_network_graph()
-
-        if len(graph.nodes) > 0:
-            source_bus = "jointhighvoltagetrafo.1.2.3"
-
-            impedance_distances = nx.single_source_dijkstra_path_length(graph, source_bus, weight="weight")
-            joint_max_impedence_distance = max(impedance_distances, key = impedance_distances.get)
-    
-            edges_max_distance = graph.edges([joint_max_impedence_distance])
-            max_impedence_distance = 0
-            to_node_with_max_distance = None
-            for edge in edges_max_distance:
-                to_node = edge[1] if edge[0] == joint_max_impedence_distance else edge[0]
-                impedence_distance = impedance_distances[to_node]
-                if impedence_distance > max_impedence_distance:
-                    max_impedence_distance = impedence_distance
-                    to_node_with_max_distance = to_node
-            cable_to_remove = (joint_max_impedence_distance, to_node_with_max_distance)
-            self.remove_cable_from_dss_file(cable_to_remove[0], cable_to_remove[1], file_name)
-
-    def build_mv_network_graph(self) -> nx.Graph:
-        graph = nx.Graph()
-        if self.dss_engine.ActiveCircuit.Lines.AllNames != ['NONE']:
-            self.dss_engine.ActiveCircuit.SetActiveElement(f"Line.{self.dss_engine.ActiveCircuit.Lines.AllNames[0]}")
-            property_mapping = {
-                "Bus1" : "",
-                "Bus2" : "",
-                "R1" : 0,
-                "X1" : 0,
-                "Length" : 0
-            }
-            for i, prop_name in enumerate(self.dss_engine.ActiveCircuit.ActiveCktElement.AllPropertyNames):
-                if prop_name in property_mapping:
-                    property_mapping[prop_name] = i
-
-            for l in range(len(self.dss_engine.ActiveCircuit.Lines.AllNames)):
-                LOGGER.info(f"Setting active element: {'Line.{0}'.format(self.dss_engine.ActiveCircuit.Lines.AllNames[l])}")
-    
-                self.dss_engine.ActiveCircuit.SetActiveElement(
-                    'Line.{0}'.format(self.dss_engine.ActiveCircuit.Lines.AllNames[l]))
-                active_ckt_element = self.dss_engine.ActiveCircuit.ActiveCktElement
-    
-                property_values = {}
-                for key, index in property_mapping.items():
-                    property_values[key] = active_ckt_element.Properties[index].Val
-                bus1 = active_ckt_element.BusNames[0]
-                bus2 = active_ckt_element.BusNames[1]
-                LOGGER.info(f"Processing line between bus {bus1} and bus {bus2} with length {property_values["Length"]}")
-                length = float(property_values["Length"])
-                r1 = float(property_values["R1"]) * length
-                x1 = float(property_values["X1"]) * length
-                LOGGER.info(f"Line R1 value: {r1}, Line X1 value {x1}")
-                impedance = (r1**2 + x1**2)**0.5
-                graph.add_edge(bus1, bus2, weight=impedance)
-                LOGGER.info(f"Added edge {bus1} - {bus2} with impedance {impedance}")
-
-            assert len(graph.edges) == len(self.dss_engine.ActiveCircuit.Lines.AllNames)
-        return graph
-
-    def add_lv_networks_to_main_dss(self, assets : List[esdl.Asset], dss_circuit_properties : DssCircuitProperties):
-        lines = []
-        with open(Path(self.dss_file_name), "r") as f:
-            lines = f.readlines()
-
-        new_lines_descriptions = []
-
-        self.add_lv_lines_to_network(assets, dss_circuit_properties, new_lines_descriptions)
-
-        lines_index_start = lines.index(self.lines_section_start_marker)
-        lines = lines[:lines_index_start+1] + new_lines_descriptions + lines[lines_index_start+1:]
+    def build_result_extraction_index(self) -> ResultExtractionIndex:
+        # PDElements returns the values of all power delivery elements in one flat array with
+        # (magnitude, angle) or (P, Q) pairs per conductor per terminal. Precompute where the values
+        # of the first terminal of every line and transformer are located in that array.
+        active_circuit = self.dss_engine.ActiveCircuit
+        pd_elements = active_circuit.PDElements
+        amount_of_values = np.array(pd_elements.AllNumConductors) * np.array(pd_elements.AllNumTerminals) * 2
+        element_offsets = np.concatenate(([0], np.cumsum(amount_of_values)[:-1]))
+        pd_element_index = {name.lower() : i for i, name in enumerate(pd_elements.AllNames)}
+        conductors = np.array(pd_elements.AllNumConductors)
+
+        line_current_positions, line_current_starts = [], []
+        for name in self.all_line_names:
+            offset = element_offsets[pd_element_index[f"line.{name.lower()}"]]
+            line_current_starts.append(len(line_current_positions))
+            line_current_positions.extend(offset + 2 * phase for phase in range(3))
+
+        transformer_power_positions, transformer_power_starts = [], []
+        for name in self.all_transformer_names:
+            i = pd_element_index[f"transformer.{name.lower()}"]
+            transformer_power_starts.append(len(transformer_power_positions))
+            transformer_power_positions.extend(element_offsets[i] + 2 * conductor for conductor in range(conductors[i]))
+
+        return ResultExtractionIndex(
+            line_current_positions=np.array(line_current_positions, dtype=np.int64),
+            line_current_starts=np.array(line_current_starts, dtype=np.int64),
+            transformer_power_positions=np.array(transformer_power_positions, dtype=np.int64),
+            transformer_power_starts=np.array(transformer_power_starts, dtype=np.int64)
+        )
 
-        lines.append('\n')
-        lines.append(self.load_definition_section_start_marker)
-        self.add_loads_to_network(assets, lines)
+    def generate_dss_electricity_cable(self, cable : esdl.ElectricityCable, bus_from : str, bus_to : str, include_ground = True):
+        phases_specifications = '.1.2.3.4' if include_ground else '.1.2.3'
+        phases = 4 if include_ground else 3
+        dss_cable = 'New Line.' + cable.name + f' Phases={phases} Bus1=' + bus_from + phases_specifications + ' Bus2=' + bus_to + \
+                    phases_specifications + ' LineCode=' + cable.assetType + ' Length=' + str(cable.length) + ' Units=m \n'
+        return dss_cable
 
+    def build_dss_model(self, assets : List[esdl.Asset]) -> DssModel:
+        dss_model = DssModel()
+        dss_model.header.append('Clear \n')
+        dss_model.header.append('\nSet DefaultBaseFrequency=50 \n')
+
+        esdl_index = EsdlIndex.from_assets(assets)
+        self.generate_source(esdl_index, dss_model.source)
+        dss_circuit_properties = self.generate_trafos(esdl_index, dss_model.transformers)
+        dss_model.mv_cut_cables = self.cut_cables_in_mv_network(esdl_index)
+        if self.network_reduction:
+            esdl_index, dss_model.reduction = self.reduce_network(esdl_index, dss_model.mv_cut_cables)
+        self.add_mv_lines(esdl_index, dss_model.mv_lines)
+        self.add_lv_lines_to_network(esdl_index, dss_circuit_properties, dss_model.lv_lines)
+        self.add_loads_to_network(esdl_index, dss_model.loads)
+        self.generate_final_configuration(dss_circuit_properties, dss_model.final_configuration)
+        return dss_model
+
+    def export_dss_model(self, file_name : str):
+        with open(file_name, "w") as f:
+            f.writelines(self.dss_model.to_lines())
+
+    def add_mv_lines(self, esdl_index : EsdlIndex, mv_lines : dict[str, str]):
+        for cable in esdl_index.mv_cables:
+            mv_lines[cable.asset.name] = self.generate_dss_electricity_cable(cable.asset, cable.bus_from, cable.bus_to, False)
+
+    def cut_cables_in_mv_network(self, esdl_index : EsdlIndex) -> set[str]:
+        if len(esdl_index.mv_cables) == 0:
+            return set()
+
+        graph = MvNetworkGraph.from_cable_buses([(cable.asset, cable.bus_from, cable.bus_to) for cable in esdl_index.mv_cables],
+                                                load_line_codes(LINE_CODE_FILE_NAME))
+        # One normally open cable per loop of the MV network, so the solved MV network is radial
+        cables_to_remove = {graph.edge_names[edge_id] for edge_id in graph.open_points(graph.bus_indices[MV_SOURCE_BUS])}
+        if len(cables_to_remove) > 0:
+            LOGGER.info(f"Removing {len(cables_to_remove)} lines to open the MV loops: {', '.join(sorted(cables_to_remove))}")
+        return cables_to_remove
+
+    def reduce_network(self, esdl_index : EsdlIndex, open_cables : set[str]) -> tuple[EsdlIndex, 'NetworkReduction']:
+        from lvnetworkservice.network_reduction import reduce_network
+        reduced_index, reduction = reduce_network(esdl_index, open_cables)
+        LOGGER.info(f"Network reduction removed {len(reduction.reduced_buses)} passive buses and {len(reduction.reduced_cables)} cables, "
+                    f"{len(reduction.merged_lines)} merged lines replace cables in series")
+        return reduced_index, reduction
+
+    def generate_final_configuration(self, dss_circuit_properties : DssCircuitProperties, lines : List[str]):
         all_voltage_bases = set(dss_circuit_properties.primary_voltage_bases).union(set(dss_circuit_properties.secondary_voltage_bases))
         all_voltage_bases = sorted(all_voltage_bases, reverse=True)
         lines.append('\n! Final Configurations \n')
@@ -232,227 +609,604 @@ class CalculationServiceLVNetwork(HelicsSimulationExecutor):
         for i, voltage_base in enumerate(dss_circuit_properties.secondary_voltage_bases):
             lines.append(f'SetkVBase Bus={dss_circuit_properties.secondary_trafo_busses[i]} kVLL={voltage_base}\n')
 
-        # lines.append('CalcVoltageBases\n')
-
         lines.append('\n! Solve\n')
 
         lines.append('Set mode=snapshot\n')
         lines.append('! Solve\n')
 
-        with open(self.dss_file_name, "w") as f:
-            f.writelines(lines)
-
-    def add_lv_lines_to_network(self, assets, dss_circuit_properties, new_lines_descriptions):
-        for a in self.get_assets_of_type(assets, esdl.ElectricityCable):
-            if "mv_cable" not in a.name.lower():
-                for port in a.port:
-                    if isinstance(port, esdl.InPort):
-                        busFrom = port.connectedTo[0].energyasset
-                    else:
-                        busTo = port.connectedTo[0].energyasset
-                length = a.length
-                linecode = a.assetType
-                if busFrom.name.split('Bus')[0] in dss_circuit_properties.secondary_trafo_busses:
-                    new_lines_descriptions.append('New Line.' + a.name + ' Phases=4 Bus1=' + busFrom.name.split('Bus')[
-                        0] + '.1.2.3.0' + ' Bus2=' + busTo.name.split('Bus')[
-                                     0] + '.1.2.3.4 LineCode=' + linecode + ' Length=' + str(
-                        length) + ' Units=m \n')
-                else:
-                    new_lines_descriptions.append('New Line.' + a.name + ' Phases=4 Bus1=' + busFrom.name.split('Bus')[
-                        0] + '.1.2.3.4' + ' Bus2=' + busTo.name.split('Bus')[
-                                     0] + '.1.2.3.4 LineCode=' + linecode + ' Length=' + str(
-                        length) + ' Units=m \n')
-
-    def add_loads_to_network(self, assets, lines):
-        for a in self.get_assets_of_type(assets, esdl.Building):
-            name = ""
-            e_connection = self.get_assets_of_type(a.asset, esdl.EConnection)[0]
-            self.ems_list[e_connection.id] = []
-            name = e_connection.name
-            for electricity_demand in self.get_assets_of_type(a.asset, esdl.ElectricityDemand):
+    def add_lv_lines_to_network(self, esdl_index : EsdlIndex, dss_circuit_properties : DssCircuitProperties, new_lines_descriptions : List[str]):
+        secondary_trafo_busses = set(dss_circuit_properties.secondary_trafo_busses)
+        for cable in esdl_index.lv_cables:
+            # The neutral of a cable that leaves a transformer is grounded at the transformer
+            bus_from_conductors = '.1.2.3.0' if cable.bus_from in secondary_trafo_busses else '.1.2.3.4'
+            new_lines_descriptions.append('New Line.' + cable.asset.name + ' Phases=4 Bus1=' + cable.bus_from + bus_from_conductors + ' Bus2=' +
+                                          cable.bus_to + '.1.2.3.4 LineCode=' + cable.asset.assetType + ' Length=' + str(cable.asset.length) + ' Units=m \n')
+
+    def add_loads_to_network(self, esdl_index : EsdlIndex, lines : List[str]):
+        for building in esdl_index.buildings:
+            name = building.e_connection_name
+            load_names = self.ems_list[building.e_connection_id] = []
+            for _ in range(building.amount_of_demands):
                 # van 10 kv naar 0.4 kv basen
-                lines.append(
-                    'New Load.{name}_Ph1 Bus1={bus}.1.4 Phases=1 Conn=wye Model=1 kV=0.23 kW=1 kvar=0.0 \n'.format(
-                        name=name, bus=name))
-                lines.append(
-                    'New Load.{name}_Ph2 Bus1={bus}.2.4 Phases=1 Conn=wye Model=1 kV=0.23 kW=1 kvar=0.0 \n'.format(
-                        name=name, bus=name))
-                lines.append(
-                    'New Load.{name}_Ph3 Bus1={bus}.3.4 Phases=1 Conn=wye Model=1 kV=0.23 kW=1 kvar=0.0 \n'.format(
-                        name=name, bus=name))
-                self.ems_list[e_connection.id].append(f"Load.{name}_Ph1")
-                self.ems_list[e_connection.id].append(f"Load.{name}_Ph2")
-                self.ems_list[e_connection.id].append(f"Load.{name}_Ph3")
-
-    def generate_trafos(self, assets : List[esdl.Asset], lines_to_write : List[str]) -> DssCircuitProperties:
-        lines_to_write.append('\n! Trafo XFMRCodes \n')
-        lines_to_write.append('Redirect XFMRCode.dss \n')
-        lines_to_write.append('\n')
-        lines_to_write.append(self.transformer_section_start_marker)
+                for phase in (1, 2, 3):
+                    lines.append(f'New Load.{name}_Ph{phase} Bus1={name}.{phase}.4 Phases=1 Conn=wye Model=1 kV=0.23 kW={INITIAL_LOAD_KW} kvar={INITIAL_LOAD_KVAR} \n')
+                    load_names.append(f"Load.{name}_Ph{phase}")
+
+    def generate_trafos(self, esdl_index : EsdlIndex, lines_to_write : List[str]) -> DssCircuitProperties:
         dss_circuit_properties = DssCircuitProperties([], [], [], [])
 
-        for a in self.get_assets_of_type(assets, esdl.Transformer):
-            for port in a.port:
-                if isinstance(port, esdl.InPort):
-                    busFrom = port.connectedTo[0].energyasset
-                    dss_circuit_properties.primary_voltage_bases.append(a.voltagePrimary)
-                    dss_circuit_properties.primary_trafo_busses.append(busFrom.name.split('Bus')[0])
-                else:
-                    busTo = port.connectedTo[0].energyasset
-                    dss_circuit_properties.secondary_voltage_bases.append(a.voltageSecundary)
-                    dss_circuit_properties.secondary_trafo_busses.append(busTo.name.split('Bus')[0])
+        for transformer in esdl_index.transformers:
+            a = transformer.asset
+            dss_circuit_properties.primary_voltage_bases.append(a.voltagePrimary)
+            dss_circuit_properties.primary_trafo_busses.append(transformer.bus_from)
+            dss_circuit_properties.secondary_voltage_bases.append(a.voltageSecundary)
+            dss_circuit_properties.secondary_trafo_busses.append(transformer.bus_to)
             lines_to_write.append(
                 'New Transformer.{name} Xfmrcode={type} Buses=[{bus1}  {bus2}.1.2.3] kVs=[{Uprim} {Usecund}] \n'.format(
-                    name=a.name, type=a.assetType, bus1=busFrom.name.split('Bus')[0],
-                    bus2=busTo.name.split('Bus')[0], Uprim=a.voltagePrimary, Usecund=a.voltageSecundary))
+                    name=a.name, type=a.assetType, bus1=transformer.bus_from,
+                    bus2=transformer.bus_to, Uprim=a.voltagePrimary, Usecund=a.voltageSecundary))
         return dss_circuit_properties
 
-    def generate_source(self, assets : List[esdl.Asset], lines_to_write : List[str]) -> DssCircuitProperties:
+    def generate_source(self, esdl_index : EsdlIndex, lines_to_write : List[str]) -> DssCircuitProperties:
         LOGGER.debug(self.network_name)
-        lines_to_write.append('\n! Swing or Source Bar \n')
-
-        import_count = 0
-
-        for a in self.get_assets_of_type(assets, esdl.Import):
-            import_count += 1
-            for port in a.port:
-                busTo = port.connectedTo[0].energyasset
-            if import_count == 1:
-                lines_to_write.append(
-                    'New circuit.{network} phases=3 pu=1.0 basekv={Uref} bus1={bus1} \n'.format(
-                        network='{0}_{1}'.format(self.network_name,import_count),
-                        Uref=a.assetType, bus1=
-                        busTo.name.split('Bus')[
-                            0]))
-            else:
-                lines_to_write.append(
-                    'New Vsource.{network} phases=3 pu=1.0 basekv={Uref} bus1={bus1} \n'.format(
-                        network='{0}_{1}'.format(self.network_name, import_count),
-                        Uref=a.assetType, bus1=
-                        busTo.name.split('Bus')[
-                            0]))
 
+        for import_count, source in enumerate(esdl_index.imports, start=1):
+            # An import only has an out port, so it is connected to the bus of that port
+            bus = source.bus_to if source.bus_to is not None else source.bus_from
+            element = 'circuit' if import_count == 1 else 'Vsource'
+            lines_to_write.append(
+                'New {element}.{network} phases=3 pu=1.0 basekv={Uref} bus1={bus1} \n'.format(
+                    element=element, network='{0}_{1}'.format(self.network_name, import_count), Uref=source.asset.assetType, bus1=bus))
 
-    def load_flow_current_step(self, param_dict : dict, simulation_time : datetime, time_step_number : TimeStepInformation, esdl_id : EsdlId, energy_system : EnergySystem):
-        
-        self.set_load_flow_parameters(param_dict)
 
-        self.do_load_flow()
+    def run_step(self, param_dict : dict, simulation_time : datetime, esdl_id : EsdlId):
+        # START user calc
+        LOGGER.info("calculation 'load_flow_current_step' started")     
 
-        start = time.time()
-        results = self.process_results()
-        end = time.time()
-        LOGGER.info(f"Processing results took {end - start} seconds")
-        start = time.time()
-        self.write_results_to_influx(esdl_id, simulation_time, results)
-        end = time.time()
-        LOGGER.info(f"Writing results took {end - start} seconds")
+        with self.instrumentation.phase("load_flow_current_step"):
+            results = self.solve_current_step(param_dict)
+
+            start = time.perf_counter()
+            self.submit_step_results(esdl_id, simulation_time, results)
+            end = time.perf_counter()
+        LOGGER.info(f"{'Queueing' if self.background_write else 'Writing'} results took {end - start} seconds")
+
+    def solve_current_step(self, param_dict : dict) -> PowerFlowResult:
+        with self.instrumentation.phase("step.gather_injections"):
+            load_kw, load_kvar = self.gather_load_injections(param_dict)
+
+        if self.incremental_solve and self.previous_power_flow_result is not None and self.injections_within_tolerance(load_kw, load_kvar):
+            results = self.previous_power_flow_result
+            self.last_step_report = LoadFlowStepReport(SOLVE_MODE_SKIPPED, 0, True)
+            self.instrumentation.record_solve(SOLVE_MODE_SKIPPED, 0, True)
+        else:
+            results = self.estimate_load_flow(load_kw, load_kvar) if self.linear_estimator is not None else None
+            if results is None:
+                with self.instrumentation.phase("step.apply_injections"):
+                    self.apply_load_injections(load_kw, load_kvar)
+
+                if self.decomposed_solver is not None:
+                    results = self.do_decomposed_load_flow()
+                else:
+                    self.do_load_flow()
+
+                    start = time.perf_counter()
+                    with self.instrumentation.phase("step.process_results"):
+                        results = self.process_results()
+                    end = time.perf_counter()
+                    LOGGER.info(f"Processing results took {end - start} seconds")
+            self.previous_power_flow_result = results
+        if self.scenario_evaluator is not None:
+            with self.instrumentation.phase("step.scenarios"):
+                results = replace(results, scenario_outputs=self.scenario_evaluator.evaluate(self.load_kw, self.load_kvar))
+        LOGGER.info(f"Load flow {self.last_step_report.mode}: {self.last_step_report.iterations} iterations, converged: {self.last_step_report.converged}, "
+                    f"system matrix rebuilt: {self.last_step_report.system_matrix_rebuilt}")
+        return results
+
+
+    def estimate_load_flow(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> PowerFlowResult:
+        # Returns None when the estimate is too close to a limit to be trusted, the step is then solved exactly
+        with self.instrumentation.phase("step.estimate"):
+            estimate = self.linear_estimator.estimate(load_kw, load_kvar)
+        if not self.linear_estimate_limits.within_limits(estimate):
+            LOGGER.debug("Linear estimate is near a limit, solving the step exactly")
+            return None
+        # OpenDSS keeps the loads of the last exact solve, apply_load_injections catches up on the next one
+        self.load_kw = load_kw
+        self.load_kvar = load_kvar
+        self.last_step_report = LoadFlowStepReport(SOLVE_MODE_ESTIMATED, 0, True)
+        self.instrumentation.record_solve(SOLVE_MODE_ESTIMATED, 0, True)
+        return PowerFlowResult(estimate.bus_voltage_mag, estimate.total_line_current_mag, estimate.transformer_power)
 
-        return {}
+    def set_load_flow_parameters(self, param_dict : dict):
+        load_kw, load_kvar = self.gather_load_injections(param_dict)
+        self.apply_load_injections(load_kw, load_kvar)
 
+    def gather_load_injections(self, param_dict : dict) -> tuple[np.ndarray, np.ndarray]:
+        index = self.load_injection_index
+        active_power = self.gather_injections(param_dict, index.active_power_keys)
+        reactive_power = self.gather_injections(param_dict, index.reactive_power_keys)
 
-    def set_load_flow_parameters(self, param_dict : dict):
-        # START user calc
-        LOGGER.info("calculation 'load_flow_current_step' started")     
+        active_load = active_power[index.e_connection_rows, index.phase_columns] * 1e-3
+        reactive_load = reactive_power[index.e_connection_rows, index.phase_columns] * 1e-3
+        # The active and reactive power of a connection may have values for a different amount of phases
+        return (np.where(np.isnan(active_load), self.load_kw, active_load),
+                np.where(np.isnan(reactive_load), self.load_kvar, reactive_load))
 
-        LOGGER.debug('OpenDSS add loads to network')
+    def injections_within_tolerance(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> bool:
+        return bool(np.all(np.abs(load_kw - self.load_kw) <= self.incremental_solve_tolerance)
+                    and np.all(np.abs(load_kvar - self.load_kvar) <= self.incremental_solve_tolerance))
 
-        self.dss_engine.ActiveCircuit.SetActiveElement(f"{self.ems_list[list(self.ems_list.keys())[0]][0]}")
-        property_mapping : dict [str, int] = {
-            "kW" : 0,
-            "kvar" : 0
-        }
-        for i, prop_name in enumerate(self.dss_engine.ActiveCircuit.ActiveCktElement.AllPropertyNames):
-            if prop_name in property_mapping:
-                property_mapping[prop_name] = i
-        for id in self.ems_list:
-            num_phases = len(param_dict[f'EConnection/aggregated_active_power/{id}'])
-            for i, name in enumerate(self.ems_list[id]):
-                if i < num_phases:
-                    self.dss_engine.ActiveCircuit.SetActiveElement(name)
-                    active_ckt_element = self.dss_engine.ActiveCircuit.ActiveCktElement
-                    active_load = param_dict[f'EConnection/aggregated_active_power/{id}'][i] * 1e-3
-                    reactive_load = param_dict[f'EConnection/aggregated_reactive_power/{id}'][i] * 1e-3
-                    if active_ckt_element.AllPropertyNames[property_mapping["kW"]] != "kW" or active_ckt_element.AllPropertyNames[property_mapping["kvar"]] != "kvar":
-                        raise ValueError("Property mapping for kW or kvar is incorrect")
-                    active_ckt_element.Properties[property_mapping["kW"]].Val = active_load
-                    active_ckt_element.Properties[property_mapping["kvar"]].Val = reactive_load
+    def apply_load_injections(self, load_kw : np.ndarray, load_kvar : np.ndarray):
+        LOGGER.debug('OpenDSS add loads to network')
+        changed = (load_kw != self.dss_load_kw) | (load_kvar != self.dss_load_kvar)
+        loads = self.dss_engine.ActiveCircuit.Loads
+        for load_index, kw, kvar in zip(self.load_injection_index.load_indices[changed].tolist(), load_kw[changed].tolist(), load_kvar[changed].tolist()):
+            loads.idx = load_index
+            loads.kW = kw
+            loads.kvar = kvar
+        self.load_kw = load_kw
+        self.load_kvar = load_kvar
+        self.dss_load_kw = load_kw
+        self.dss_load_kvar = load_kvar
+
+    def gather_injections(self, param_dict : dict, keys : List[str]) -> np.ndarray:
+        # One row per EConnection, one column per phase. Phases that were not received stay NaN so
+        # the corresponding loads keep their previous value.
+        amount_of_columns = int(self.load_injection_index.phase_columns.max()) + 1 if len(self.load_injection_index.phase_columns) > 0 else 0
+        injections = np.full((len(keys), amount_of_columns), np.nan)
+        for row, key in enumerate(keys):
+            values = param_dict[key][:amount_of_columns]
+            injections[row, :len(values)] = values
+        return injections
 
 
     def do_load_flow(self):
         LOGGER.debug('OpenDSS solve loadflow calculation')
-        self.dss_engine.ActiveCircuit.Solution.Solve()
+        # OpenDSS starts the snapshot solution from the node voltages it holds, which are not set here. These
+        # are the flat start voltages for the first solve after compiling the network and otherwise those of
+        # the last OpenDSS solve, which can be several steps old after estimated or decomposed steps.
+        solution = self.dss_engine.ActiveCircuit.Solution
+        # OpenDSS rebuilds and refactorizes the system matrix only when an element invalidated it
+        system_matrix_rebuilt = bool(solution.SystemYChanged)
+        with self.instrumentation.phase("step.solve"):
+            solution.Solve()
+        mode = SOLVE_MODE_FULL if self.solved_since_compile else SOLVE_MODE_INITIAL
+        self.solved_since_compile = True
+        self.last_step_report = LoadFlowStepReport(mode, solution.Iterations, solution.Converged, system_matrix_rebuilt)
+        if system_matrix_rebuilt:
+            self.instrumentation.record_system_matrix_rebuild()
+        # OpenDSS reports the duration of the last solve in microseconds
+        self.instrumentation.record_solve(mode, solution.Iterations, solution.Converged, solution.Process_Time * 1e-6)
+
+    def do_decomposed_load_flow(self) -> PowerFlowResult:
+        LOGGER.debug('OpenDSS solve decomposed loadflow calculation')
+        with self.instrumentation.phase("step.solve"):
+            solution = self.decomposed_solver.solve(self.load_kw, self.load_kvar)
+        self.last_step_report = LoadFlowStepReport(SOLVE_MODE_DECOMPOSED, solution.iterations, solution.converged)
+        self.instrumentation.record_solve(SOLVE_MODE_DECOMPOSED, solution.iterations, solution.converged)
+        return PowerFlowResult(solution.bus_voltage_mag, solution.total_line_current_mag, solution.transformer_power)
 
     def process_results(self) -> PowerFlowResult:
-        # Process results
-        BusVoltageMag = []
-        LineCurrentMag = []
-        LineCurrentAng = []
-        TotalLineCurrentMag = []
-        TotalLineCurrentLim = []
-        TransformerPower = []
-        TransformerPowerLim = []
+        index = self.result_extraction_index
+        active_circuit = self.dss_engine.ActiveCircuit
 
         # Phase voltage magnitudes for each bus:
         LOGGER.debug('Extract voltages')
-        for i in range(len(self.dss_engine.ActiveCircuit.AllBusVmag)):
-            BusVoltageMag.append(round(self.dss_engine.ActiveCircuit.AllBusVmag[i], 2))
+        bus_voltage_mag = np.array(active_circuit.AllBusVmag, dtype=np.float64)
 
-        # Phase current magnitudes and angles for each line:
-        LOGGER.debug('Extract current magnitudes and angles')
-        for name in self.all_line_names:
-            self.dss_engine.ActiveCircuit.SetActiveElement(
-                'Line.{0}'.format(name))
-            Total_line_current = 0
-            for i in range(1, 4):
-                LineCurrentMag.append(
-                    round(self.dss_engine.ActiveCircuit.ActiveCktElement.CurrentsMagAng[(i - 1) * 2], 2))
-                LineCurrentAng.append(
-                    round(self.dss_engine.ActiveCircuit.ActiveCktElement.CurrentsMagAng[(i - 1) * 2 + 1], 2))
-                Total_line_current += round(self.dss_engine.ActiveCircuit.ActiveCktElement.CurrentsMagAng[(i - 1) * 2],
-                                            2)
-            TotalLineCurrentMag.append(Total_line_current)
-            TotalLineCurrentLim.append(float(self.dss_engine.ActiveCircuit.ActiveCktElement.NormalAmps))
-
-        # Apparent power for each transformer:
-        LOGGER.debug('Extract apparent power for each transformer')
-        self.dss_engine.ActiveCircuit.Transformers.First
-        for t in range(self.dss_engine.ActiveCircuit.Transformers.Count):
-            self.dss_engine.ActiveCircuit.SetActiveElement(
-                'Transformer.{0}'.format(self.dss_engine.ActiveCircuit.Transformers.AllNames[t]))
-            TransformerPower.append(round(math.sqrt(self.dss_engine.ActiveCircuit.ActiveElement.TotalPowers[0] ** 2 +
-                                                    self.dss_engine.ActiveCircuit.ActiveElement.TotalPowers[1] ** 2), 2))
-            TransformerPowerLim.append((self.dss_engine.ActiveCircuit.Transformers.kVA))
-            self.dss_engine.ActiveCircuit.Transformers.Next
+        # Sum of the phase current magnitudes for each line:
+        LOGGER.debug('Extract current magnitudes')
+        currents_mag_ang = np.asarray(active_circuit.PDElements.AllCurrentsMagAng)
+        total_line_current_mag = self.sum_segments(currents_mag_ang, index.line_current_positions, index.line_current_starts)
 
-        return PowerFlowResult(BusVoltageMag, TotalLineCurrentMag, TransformerPower, TotalLineCurrentLim, TransformerPowerLim)
+        # Apparent power at the primary side of each transformer:
+        LOGGER.debug('Extract apparent power for each transformer')
+        powers = np.asarray(active_circuit.PDElements.AllPowers)
+        transformer_active_power = self.sum_segments(powers, index.transformer_power_positions, index.transformer_power_starts)
+        transformer_reactive_power = self.sum_segments(powers, index.transformer_power_positions + 1, index.transformer_power_starts)
+        transformer_power = np.hypot(transformer_active_power, transformer_reactive_power)
+
+        return PowerFlowResult(bus_voltage_mag, total_line_current_mag, transformer_power)
+
+    def expand_reduced_results(self, power_flow_result : PowerFlowResult) -> tuple[OutputNameTable, PowerFlowResult]:
+        """The results of a step of a reduced network with the buses and cables of the unreduced network: the
+        voltages of removed buses are interpolated along the merged line they were on, removed cables carry the
+        current of their merged line (none for a dead end) and the merged lines themselves are left out."""
+        if self.result_expansion is None:
+            return self.output_name_table, power_flow_result
+        bus_voltage_mag, total_line_current_mag = self.result_expansion.expand(power_flow_result.bus_voltage_mag, power_flow_result.total_line_current_mag)
+        output_name_table = OutputNameTable(self.result_expansion.node_names, self.result_expansion.line_names, list(self.all_transformer_names))
+        return output_name_table, replace(power_flow_result, bus_voltage_mag=bus_voltage_mag, total_line_current_mag=total_line_current_mag)
+
+    def sum_segments(self, values : np.ndarray, positions : np.ndarray, starts : np.ndarray) -> np.ndarray:
+        if len(starts) == 0:
+            return np.zeros(0, dtype=np.float64)
+        return np.add.reduceat(values[positions], starts)
+
+    def submit_step_results(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
+        if not self.background_write:
+            self.write_step_results_timed(esdl_id, simulation_time, power_flow_result)
+            return
+        # Time spent waiting for room in the queue, the write itself is timed on the writer thread
+        with self.instrumentation.phase("step.queue_results"):
+            self.get_result_writer().submit(lambda : self.write_step_results_timed(esdl_id, simulation_time, power_flow_result))
+
+    def write_step_results_timed(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
+        # The networks of a service solve concurrently but share the influx connector
+        with self.instrumentation.phase("step.write_results"), self.result_write_lock:
+            self.write_step_results(esdl_id, simulation_time, power_flow_result)
+
+    def get_result_writer(self) -> BackgroundResultWriter:
+        if self.result_writer is None:
+            self.result_writer = BackgroundResultWriter(self.background_write_max_pending)
+        return self.result_writer
+
+    def write_step_results(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
+        if self.result_archive_directory is not None:
+            self.write_results_to_archive(esdl_id, simulation_time, power_flow_result)
+        if self.influx_output:
+            self.write_results_to_influx(esdl_id, simulation_time, power_flow_result)
+
+    def write_results_to_archive(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
+        archive = self.result_archives.get(esdl_id)
+        if archive is None:
+            from lvnetworkservice.result_archive import ResultArchiveWriter
+            os.makedirs(self.result_archive_directory, exist_ok=True)
+            file_name = os.path.join(self.result_archive_directory, f"{esdl_id}.{self.result_archive_format}")
+            archive = ResultArchiveWriter(file_name, self.output_name_table.all_names(), self.result_archive_flush_steps,
+                                          dict(self.static_network_data.outputs() + self.static_network_data.topology_outputs()))
+            self.result_archives[esdl_id] = archive
+        archive.write(simulation_time, power_flow_result.all_values())
+
+    def close_result_archives(self):
+        for archive in self.result_archives.values():
+            archive.close()
+        self.result_archives = {}
 
     def write_results_to_influx(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
         # Write results to influxdb
         amount_of_node_values = len(power_flow_result.bus_voltage_mag)
-        amount_of_line_values = len(power_flow_result.total_line_current_mag) + len(power_flow_result.total_line_current_lim)
-        amount_of_transformer_values = len(power_flow_result.transformer_power) + len(power_flow_result.transformer_power_lim)
+        amount_of_line_values = len(power_flow_result.total_line_current_mag)
+        amount_of_transformer_values = len(power_flow_result.transformer_power)
         LOGGER.debug(f'Writing {amount_of_node_values} node values to influxdb')
         LOGGER.debug(f'Writing {amount_of_line_values} line values to influxdb')
         LOGGER.debug(f'Writing {amount_of_transformer_values} transformer values to influxdb')
         LOGGER.debug(f'Writing a total of {sum([amount_of_line_values, amount_of_transformer_values, amount_of_node_values])} values to influxdb')
-        line_limit_names = [x + '_limit' for x in self.all_line_names]
-        for d in range(len(self.all_node_names)):
-            voltage_value = power_flow_result.bus_voltage_mag[d]
-            self.influx_connector.set_time_step_data_point(esdl_id, self.all_node_names[d],
-                                                      simulation_time, voltage_value)
-        for d in range(len(self.all_line_names)):
-            self.influx_connector.set_time_step_data_point(esdl_id, self.all_line_names[d],
-                                                          simulation_time, power_flow_result.total_line_current_mag[d])
-            self.influx_connector.set_time_step_data_point(esdl_id, line_limit_names[d], simulation_time,
-                                                          power_flow_result.total_line_current_lim[d])
-        for d in range(len(self.dss_engine.ActiveCircuit.Transformers.AllNames)):
-            name = self.dss_engine.ActiveCircuit.Transformers.AllNames[d]
-            self.influx_connector.set_time_step_data_point(esdl_id,
-                                                          self.dss_engine.ActiveCircuit.Transformers.AllNames[d],
-                                                          simulation_time, power_flow_result.transformer_power[d])
-            self.influx_connector.set_time_step_data_point(esdl_id, f"{name}_limit", simulation_time,
-                                                          power_flow_result.transformer_power_lim[d])
+        if self.bulk_write_results:
+            self.write_results_to_influx_bulk(esdl_id, simulation_time, power_flow_result)
+            return
+        for name, value in self.take_static_outputs(esdl_id, simulation_time) + power_flow_result.scenario_outputs:
+            self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+        if self.violation_summary is not None:
+            for name, value in self.summarize_outputs(power_flow_result):
+                self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+            return
+        if self.deadband is not None:
+            for name, value in self.select_changed_outputs(power_flow_result):
+                self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+            return
+
+        names = self.output_name_table
+        for name, value in zip(names.node_names, power_flow_result.bus_voltage_mag.tolist()):
+            self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+        for name, value in zip(names.line_names, power_flow_result.total_line_current_mag.tolist()):
+            self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+        for name, value in zip(names.transformer_names, power_flow_result.transformer_power.tolist()):
+            self.influx_connector.set_time_step_data_point(esdl_id, name, simulation_time, value)
+
+    def write_results_to_influx_bulk(self, esdl_id : EsdlId, simulation_time : datetime, power_flow_result : PowerFlowResult):
+        # All values of a step share the measurement, tags and timestamp, so they are written as the fields
+        # of a single point instead of one point per value.
+        fields = dict(self.take_static_outputs(esdl_id, simulation_time))
+        fields.update(power_flow_result.scenario_outputs)
+        if self.violation_summary is not None:
+            fields.update(self.summarize_outputs(power_flow_result))
+        elif self.deadband is not None:
+            fields.update(self.select_changed_outputs(power_flow_result))
+        else:
+            fields.update(zip(self.output_name_table.all_names(), power_flow_result.all_values().tolist()))
+        if len(fields) == 0:
+            return
+        if len(self.influx_connector.data_points) == 0:
+            # Written by the influx connector, or by another network that shares it
+            self.bulk_buffered_values = 0
+        self.influx_connector.data_points.append(self.influx_connector.add_measurement(esdl_id, simulation_time, fields))
+        self.bulk_buffered_values += len(fields)
+        if self.bulk_buffered_values >= self.bulk_write_max_values:
+            LOGGER.debug(f"Writing {len(self.influx_connector.data_points)} data points with {self.bulk_buffered_values} values to InfluxDB")
+            self.influx_connector.write_output()
+            self.influx_connector.data_points.clear()
+            self.bulk_buffered_values = 0
+
+    def take_static_outputs(self, esdl_id : EsdlId, simulation_time : datetime) -> List[tuple[str, float]]:
+        # The static outputs are written with the first step that is written for a network
+        if esdl_id in self.static_outputs_written:
+            return []
+        self.static_outputs_written.add(esdl_id)
+        self.write_topology(esdl_id, simulation_time)
+        return self.static_network_data.outputs()
+
+    def write_topology(self, esdl_id : EsdlId, simulation_time : datetime):
+        # The buses are text, so they are written as the fields of a measurement of their own instead of
+        # through the numeric data points of the outputs
+        connector = self.influx_connector
+        point = {
+            "measurement" : f"{connector.esdl_type}{TOPOLOGY_MEASUREMENT_SUFFIX}",
+            "tags" : {
+                "simulation_id" : connector.simulation_id,
+                "model_id" : connector.model_id,
+                "esdl_id" : esdl_id,
+            },
+            "time" : simulation_time,
+            "fields" : dict(self.static_network_data.topology_outputs()),
+        }
+        if len(point["fields"]) > 0:
+            connector.write([point])
+
+    def summarize_outputs(self, power_flow_result : PowerFlowResult) -> List[tuple[str, float]]:
+        return self.violation_summary.outputs(power_flow_result.bus_voltage_mag, power_flow_result.total_line_current_mag, power_flow_result.transformer_power)
+
+    def select_changed_outputs(self, power_flow_result : PowerFlowResult) -> List[tuple[str, float]]:
+        values = power_flow_result.all_values()
+        mask = self.deadband.select(values)
+        names = self.output_name_table.all_names()
+        return [(names[i], value) for i, value in zip(np.flatnonzero(mask).tolist(), values[mask].tolist())]
+
+    def close_solvers(self):
+        if self.decomposed_solver is not None:
+            self.decomposed_solver.close()
+            self.decomposed_solver = None
+        if self.scenario_evaluator is not None:
+            self.scenario_evaluator.close()
+            self.scenario_evaluator = None
+
+    def replay_load_profile_file(self, file_name : str, esdl_id : EsdlId) -> int:
+        from lvnetworkservice.replay import read_load_profiles
+        return self.replay_load_profiles(read_load_profiles(file_name), esdl_id)
+
+    def replay_load_profiles(self, load_profiles : 'LoadProfiles', esdl_id : EsdlId) -> int:
+        # Offline alternative to calling load_flow_current_step once per time step: the profiles are attached
+        # to the loads as yearly LoadShapes holding the actual kW/kvar values and OpenDSS steps through the
+        # horizon in yearly mode. The results of every step are written like the ones of a regular step;
+        # flushing the influx connector afterwards is left to the caller, like stop_simulation does.
+        start = time.perf_counter()
+        step_seconds = load_profiles.step_seconds()
+        steps_per_run = max(int(REPLAY_HOURS_PER_RUN * 3600 // step_seconds), 1)
+        load_profile_positions = self.map_loads_to_profiles(load_profiles)
+        # The replay writes from this thread, after the steps that are still queued
+        if self.result_writer is not None:
+            self.result_writer.drain()
+        solution = self.dss_engine.ActiveCircuit.Solution
+        try:
+            for run_start in range(0, len(load_profiles.times), steps_per_run):
+                run_steps = slice(run_start, min(run_start + steps_per_run, len(load_profiles.times)))
+                self.attach_load_shapes(load_profiles, load_profile_positions, run_steps, step_seconds)
+                self.dss_engine.Text.Command = f"Set mode=yearly stepsize={step_seconds}s number=1"
+                solution.Year = 0
+                solution.dblHour = 0.0
+                for simulation_time in load_profiles.times[run_steps]:
+                    self.do_load_flow()
+                    with self.instrumentation.phase("step.process_results"):
+                        results = self.process_results()
+                    with self.instrumentation.phase("step.write_results"):
+                        self.write_step_results(esdl_id, simulation_time, results)
+        finally:
+            self.dss_engine.Text.Command = "Set mode=snapshot"
+            self.previous_power_flow_result = None
+        end = time.perf_counter()
+        LOGGER.info(f"Replaying {len(load_profiles.times)} time steps took {end - start} seconds")
+        return len(load_profiles.times)
+
+    def map_loads_to_profiles(self, load_profiles : 'LoadProfiles') -> List[tuple[int, int]]:
+        # (EConnection row, phase) in the load profiles for every load, or None when the profiles do not
+        # contain it. Those loads keep their present kW and kvar during the replay.
+        profile_rows = {e_connection_id : row for row, e_connection_id in enumerate(load_profiles.e_connection_ids)}
+        e_connection_ids = list(self.ems_list)
+        amount_of_phases = load_profiles.active_power.shape[2]
+        positions = []
+        for row, phase in zip(self.load_injection_index.e_connection_rows.tolist(), self.load_injection_index.phase_columns.tolist()):
+            profile_row = profile_rows.get(e_connection_ids[row])
+            positions.append((profile_row, phase) if profile_row is not None and phase < amount_of_phases else None)
+        return positions
+
+    def attach_load_shapes(self, load_profiles : 'LoadProfiles', load_profile_positions : List[tuple[int, int]], steps : slice, step_seconds : float):
+        active_circuit = self.dss_engine.ActiveCircuit
+        load_shapes = active_circuit.LoadShapes
+        loads = active_circuit.Loads
+        existing_load_shapes = set(load_shapes.AllNames)
+        amount_of_steps = len(load_profiles.times[steps])
+        for i, (load_index, position) in enumerate(zip(self.load_injection_index.load_indices.tolist(), load_profile_positions)):
+            if position is None:
+                load_kw = np.full(amount_of_steps, self.load_kw[i])
+                load_kvar = np.full(amount_of_steps, self.load_kvar[i])
+            else:
+                load_kw = load_profiles.active_power[steps, position[0], position[1]] * 1e-3
+                load_kvar = load_profiles.reactive_power[steps, position[0], position[1]] * 1e-3
+            name = f"replay_{load_index}"
+            if name in existing_load_shapes:
+                load_shapes.Name = name
+            else:
+                load_shapes.New(name)
+            load_shapes.Npts = amount_of_steps
+            load_shapes.Sinterval = step_seconds
+            load_shapes.UseActual = True
+            load_shapes.Pmult = load_kw
+            load_shapes.Qmult = load_kvar
+            loads.idx = load_index
+            loads.Yearly = name
+
+class CalculationServiceLVNetwork(HelicsSimulationExecutor, LVNetwork):
+
+    def __init__(self):
+        HelicsSimulationExecutor.__init__(self)
+        LVNetwork.__init__(self, dss.DSS, self.influx_connector)
+
+        subscriptions_values = [
+            SubscriptionDescription(esdl_type="EConnection",
+                                    input_name="aggregated_active_power",
+                                    input_unit="W", 
+                                    input_type=h.HelicsDataType.VECTOR),
+            SubscriptionDescription(esdl_type="EConnection",
+                                    input_name="aggregated_reactive_power",
+                                    input_unit="VAr",
+                                    input_type=h.HelicsDataType.VECTOR)
+        ]
+
+        e_connection_period_in_seconds = 900
+
+        calculation_information = HelicsCalculationInformation(
+            time_period_in_seconds=e_connection_period_in_seconds,
+            offset=0, 
+            uninterruptible=False, 
+            wait_for_current_time_update=False, 
+            terminate_on_error=True, 
+            calculation_name="load_flow_current_step",
+            inputs=subscriptions_values,
+            outputs=[],
+            calculation_function=self.load_flow_current_step
+        )
+        self.add_calculation(calculation_information)
+        # The networks of the esdl_ids other than the first, which is the network of the service itself. Esdl_ids
+        # of the same area share a network.
+        self.hosted_networks : dict[EsdlId, LVNetwork] = {}
+        self.hosted_network_workers = os.cpu_count() or 1
+        self.hosted_network_executor : ThreadPoolExecutor = None
+        # The step that is being solved per network, when the service has hosted networks
+        self.network_steps : dict[LVNetwork, Future] = {}
+
+    def init_calculation_service(self, energy_system : esdl.EnergySystem):
+        with self.instrumentation.phase("init_calculation_service"):
+            esdl_ids = self.simulator_configuration.esdl_ids
+            top_area = energy_system.instance[0].area
+            areas = {area.id : area for area in energy_system.eAllContents() if isinstance(area, esdl.Area)}
+            areas[energy_system.id] = top_area
+            for esdl_id in esdl_ids:
+                if esdl_id not in areas:
+                    LOGGER.warning(f"esdl_id {esdl_id} is not the id of the energy system or one of its areas, "
+                                   f"it is served by the network of the whole energy system")
+            network_areas = {esdl_id : areas.get(esdl_id, top_area) for esdl_id in esdl_ids}
+            first_area = network_areas[esdl_ids[0]] if len(esdl_ids) > 0 else None
+            self.init_network(energy_system, first_area)
+            self.hosted_networks = {}
+            networks_per_area = {}
+            for esdl_id, area in network_areas.items():
+                if area is first_area:
+                    continue
+                if area.id in networks_per_area:
+                    self.hosted_networks[esdl_id] = networks_per_area[area.id]
+                else:
+                    networks_per_area[area.id] = self.host_network(esdl_id, energy_system, area)
+            if len(self.hosted_networks) > 0:
+                LOGGER.info(f"Serving {len(networks_per_area) + 1} networks for {len(esdl_ids)} esdl ids")
+
+    def host_network(self, esdl_id : EsdlId, energy_system : esdl.EnergySystem, area : esdl.Area = None) -> LVNetwork:
+        # Every hosted network gets its own OpenDSS context, so its circuit is independent of the circuit of this
+        # service and of the other hosted networks and can be solved concurrently with them.
+        network = LVNetwork(dss.DSS.NewContext(), self.influx_connector)
+        for setting in HOSTED_NETWORK_SETTINGS:
+            setattr(network, setting, getattr(self, setting))
+        # The counters of an instrumentation are not shared between the networks, which are solved concurrently
+        network.instrumentation = Instrumentation(self.instrumentation.enabled)
+        network.result_write_lock = self.result_write_lock
+        if self.background_write:
+            network.result_writer = self.get_result_writer()
+        network.init_network(energy_system, area)
+        self.hosted_networks[esdl_id] = network
+        return network
+
+    def load_flow_hosted_networks(self, params_per_esdl_id : dict[EsdlId, dict], simulation_time : datetime):
+        start = time.perf_counter()
+        for esdl_id, param_dict in params_per_esdl_id.items():
+            self.submit_network_step(self.hosted_networks.get(esdl_id, self), param_dict, simulation_time, esdl_id)
+        self.wait_for_network_steps()
+        end = time.perf_counter()
+        LOGGER.info(f"Load flow of {len(params_per_esdl_id)} hosted networks took {end - start} seconds")
+
+    def load_flow_current_step(self, param_dict : dict, simulation_time : datetime, time_step_number : TimeStepInformation, esdl_id : EsdlId, energy_system : EnergySystem):
+        if len(self.hosted_networks) == 0:
+            self.run_step(param_dict, simulation_time, esdl_id)
+        else:
+            # The federate calls this per esdl_id in turn; the networks are solved on the executor, so the
+            # step of a network overlaps with those of the networks after it. The step ends with the last
+            # esdl_id, for which the steps of all networks are finished, so a failed step is raised in its step.
+            self.submit_network_step(self.hosted_networks.get(esdl_id, self), param_dict, simulation_time, esdl_id)
+            if esdl_id == self.simulator_configuration.esdl_ids[-1]:
+                self.wait_for_network_steps()
+        return {}
+
+    def submit_network_step(self, network : LVNetwork, param_dict : dict, simulation_time : datetime, esdl_id : EsdlId):
+        # OpenDSS releases the GIL while solving, so the networks are solved in parallel. The steps of a network
+        # run in order: its previous step is finished first, which also raises a failure of that step here.
+        previous_step = self.network_steps.pop(network, None)
+        if previous_step is not None:
+            previous_step.result()
+        if self.hosted_network_executor is None:
+            self.hosted_network_executor = ThreadPoolExecutor(self.hosted_network_workers)
+        self.network_steps[network] = self.hosted_network_executor.submit(network.run_step, param_dict, simulation_time, esdl_id)
+
+    def wait_for_network_steps(self):
+        network_steps = list(self.network_steps.values())
+        self.network_steps = {}
+        wait(network_steps)
+        for network_step in network_steps:
+            network_step.result()
+
+    def networks(self) -> List[LVNetwork]:
+        networks = [self]
+        for network in self.hosted_networks.values():
+            if network not in networks:
+                networks.append(network)
+        return networks
+
+    def close_result_writer(self):
+        # Hosted networks share the writer of this service, so it is closed once, here
+        if self.result_writer is not None:
+            result_writer = self.result_writer
+            self.result_writer = None
+            for network in self.networks():
+                network.result_writer = None
+            result_writer.close()
+
+    def stop_simulation(self):
+        # start_simulation returns while the federates are still stepping in the executor, so their steps are
+        # finished before anything is torn down. The pending results are then written before the archives are
+        # closed and the influx connector is flushed. A failed write is raised after the rest of the simulation
+        # was stopped.
+        self.exe.shutdown(wait=True)
+        try:
+            self.wait_for_network_steps()
+            self.close_result_writer()
+        finally:
+            self.close_solvers()
+            for network in self.networks():
+                network.close_result_archives()
+            self.report_output_compression()
+            if self.instrumentation_export_path is not None:
+                self.merged_instrumentation().export(self.instrumentation_export_path)
+            super().stop_simulation()
+
+    def report_output_compression(self):
+        for network in self.networks():
+            if network.deadband is not None:
+                deadband = network.deadband
+                LOGGER.info(f"Output deadband wrote {deadband.written_values} of {deadband.total_values} values, compression ratio {deadband.compression_ratio():.2f}")
+                network.instrumentation.record_output_values(deadband.total_values, deadband.written_values)
+
+    def merged_instrumentation(self) -> Instrumentation:
+        # The instrumentation of the service and its hosted networks together, with the element counts of all networks
+        instrumentation = Instrumentation(self.instrumentation.enabled)
+        for network in self.networks():
+            instrumentation.merge(network.instrumentation)
+        return instrumentation
+
+    def close_solvers(self):
+        if self.hosted_network_executor is not None:
+            self.hosted_network_executor.shutdown()
+            self.hosted_network_executor = None
+        for network in self.networks()[1:]:
+            network.close_solvers()
+        LVNetwork.close_solvers(self)
 
 if __name__ == "__main__":
     helics_simulation_executor = CalculationServiceLVNetwork()
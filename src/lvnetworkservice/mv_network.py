@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+import heapq
+from typing import List
+import numpy as np
+from esdl import esdl
+from lvnetworkservice.line_codes import LineCode
+
+MV_SOURCE_BUS = "jointhighvoltagetrafo"
+NO_EDGE = -1
+
+def dss_bus_name(asset : esdl.Asset) -> str:
+    return asset.name.split('Bus')[0]
+
+def cable_end_points(cable : esdl.ElectricityCable) -> tuple[esdl.Asset, esdl.Asset]:
+    for port in cable.port:
+        if isinstance(port, esdl.InPort):
+            bus_from = port.connectedTo[0].energyasset
+        else:
+            bus_to = port.connectedTo[0].energyasset
+    return bus_from, bus_to
+
+@dataclass
+class MvNetworkGraph:
+    """Undirected MV cable graph in compressed sparse row form. Bus names are lower case, like OpenDSS
+    reports them. Every cable appears twice in the adjacency (once per direction); edge_ids maps both
+    entries back to the position of the cable in edge_names/edge_weights."""
+    bus_names : List[str]
+    bus_indices : dict[str, int]
+    edge_names : List[str]
+    edge_from : np.ndarray
+    edge_to : np.ndarray
+    edge_weights : np.ndarray
+    indptr : np.ndarray
+    indices : np.ndarray
+    edge_ids : np.ndarray
+
+    @staticmethod
+    def from_cables(cables : List[esdl.ElectricityCable], line_codes : dict[str, LineCode]) -> 'MvNetworkGraph':
+        cable_buses = []
+        for cable in cables:
+            bus_from, bus_to = cable_end_points(cable)
+            cable_buses.append((cable, dss_bus_name(bus_from), dss_bus_name(bus_to)))
+        return MvNetworkGraph.from_cable_buses(cable_buses, line_codes)
+
+    @staticmethod
+    def from_cable_buses(cable_buses : List[tuple[esdl.ElectricityCable, str, str]], line_codes : dict[str, LineCode]) -> 'MvNetworkGraph':
+        """Like from_cables, for cables of which the DSS bus names of both ends are already known."""
+        bus_indices : dict[str, int] = {}
+        edge_names, edge_from, edge_to, edge_weights = [], [], [], []
+        for cable, bus_from, bus_to in cable_buses:
+            for bus in (bus_from, bus_to):
+                bus_indices.setdefault(bus.lower(), len(bus_indices))
+            impedance = line_codes[cable.assetType.lower()].positive_sequence_impedance_per_meter() * cable.length
+            edge_names.append(cable.name)
+            edge_from.append(bus_indices[bus_from.lower()])
+            edge_to.append(bus_indices[bus_to.lower()])
+            edge_weights.append(abs(impedance))
+
+        edge_from = np.array(edge_from, dtype=np.int64)
+        edge_to = np.array(edge_to, dtype=np.int64)
+        amount_of_edges = len(edge_names)
+        sources = np.concatenate((edge_from, edge_to))
+        targets = np.concatenate((edge_to, edge_from))
+        edge_ids = np.concatenate((np.arange(amount_of_edges), np.arange(amount_of_edges)))
+        order = np.argsort(sources, kind="stable")
+        indptr = np.zeros(len(bus_indices) + 1, dtype=np.int64)
+        np.add.at(indptr, sources + 1, 1)
+        np.cumsum(indptr, out=indptr)
+
+        return MvNetworkGraph(
+            bus_names=list(bus_indices.keys()),
+            bus_indices=bus_indices,
+            edge_names=edge_names,
+            edge_from=edge_from,
+            edge_to=edge_to,
+            edge_weights=np.array(edge_weights, dtype=np.float64),
+            indptr=indptr,
+            indices=targets[order],
+            edge_ids=edge_ids[order]
+        )
+
+    def neighbours(self, bus_index : int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[bus_index], self.indptr[bus_index + 1]
+        return self.indices[start:end], self.edge_ids[start:end]
+
+    def shortest_path_lengths(self, source : int) -> np.ndarray:
+        """Impedance distance from the source bus to every bus (Dijkstra with a binary heap). Buses that
+        cannot be reached from the source get an infinite distance."""
+        return self.shortest_path_tree(source)[0]
+
+    def shortest_path_tree(self, source : int) -> tuple[np.ndarray, np.ndarray]:
+        """Impedance distance from the source bus to every bus and the cable through which every bus is
+        reached on its shortest path, NO_EDGE for the source and for buses that cannot be reached."""
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        edge_ids = self.edge_ids.tolist()
+        weights = self.edge_weights[self.edge_ids].tolist()
+        distances = [float("inf")] * len(self.bus_names)
+        distances[source] = 0.0
+        parent_edges = [NO_EDGE] * len(self.bus_names)
+        visited = [False] * len(self.bus_names)
+        heap = [(0.0, source)]
+        while heap:
+            distance, bus = heapq.heappop(heap)
+            if visited[bus]:
+                continue
+            visited[bus] = True
+            for position in range(indptr[bus], indptr[bus + 1]):
+                neighbour = indices[position]
+                neighbour_distance = distance + weights[position]
+                if neighbour_distance < distances[neighbour]:
+                    distances[neighbour] = neighbour_distance
+                    parent_edges[neighbour] = edge_ids[position]
+                    heapq.heappush(heap, (neighbour_distance, neighbour))
+        return np.array(distances, dtype=np.float64), np.array(parent_edges, dtype=np.int64)
+
+    def open_points(self, source : int) -> List[int]:
+        """Cables to open so the part of the network that is fed from the source becomes radial, one per
+        independent loop: every cable that is not on the shortest path tree from the source. Every bus then
+        stays fed along its lowest impedance path and each loop is opened where the impedance distances of
+        its two sides meet, which for a single ring is next to the bus farthest from the source. Cables of
+        buses that cannot be reached from the source are left as they are."""
+        distances, parent_edges = self.shortest_path_tree(source)
+        tree_edges = np.zeros(len(self.edge_names), dtype=bool)
+        tree_edges[parent_edges[parent_edges != NO_EDGE]] = True
+        reachable = np.isfinite(distances)
+        return np.flatnonzero(~tree_edges & reachable[self.edge_from] & reachable[self.edge_to]).tolist()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List
+from esdl import esdl
+from dots_infrastructure.Logger import LOGGER
+
+CACHE_FORMAT_VERSION = 1
+# The modules that translate an ESDL to a network, so a change to how networks are built invalidates the cache
+MODEL_BUILDER_FILE_NAMES = ["lvnetworkservice.py", "esdl_index.py", "mv_network.py", "line_codes.py", "network_reduction.py"]
+
+@dataclass
+class CachedNetwork:
+    dss_model : dict
+    ems_list : dict[str, List[str]]
+    all_node_names : List[str]
+    all_line_names : List[str]
+    all_transformer_names : List[str]
+
+@dataclass
+class CacheStatistics:
+    hits : int = 0
+    misses : int = 0
+    evictions : int = 0
+    lookups : List[tuple[str, bool]] = field(default_factory=list)
+
+class CompiledNetworkCache:
+    """On-disk cache of the network translated from an ESDL, keyed by a hash of its topology, of the
+    LineCode/XFMRCode definitions it refers to and of the code that builds the network. Entries are
+    evicted least recently used first once the cache grows beyond max_size_bytes."""
+
+    def __init__(self, directory : str, max_size_bytes : int):
+        self.directory = Path(directory)
+        self.max_size_bytes = max_size_bytes
+        self.statistics = CacheStatistics()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.builder_digest = self._hash_builder_code()
+
+    def compute_key(self, energy_system : esdl.EnergySystem, code_file_names : List[str], variant : str = None, area : esdl.Area = None) -> str:
+        # A variant distinguishes networks that are translated differently from the same ESDL, like a reduced network.
+        # The key covers the assets of the energy system, or of one of its areas when the network is that area.
+        digest = hashlib.sha256()
+        digest.update(f"version={CACHE_FORMAT_VERSION}\n".encode())
+        digest.update(f"builder={self.builder_digest}\n".encode())
+        if variant is not None:
+            digest.update(f"variant={variant}\n".encode())
+        digest.update(f"name={energy_system.name}\n".encode())
+        if area is None:
+            area = energy_system.instance[0].area
+        else:
+            digest.update(f"area={area.id}\n".encode())
+        for asset in area.asset:
+            self._hash_asset(digest, asset)
+        for file_name in code_file_names:
+            digest.update(f"file={file_name}\n".encode())
+            digest.update(Path(file_name).read_bytes())
+        return digest.hexdigest()
+
+    def _hash_builder_code(self) -> str:
+        digest = hashlib.sha256()
+        for file_name in MODEL_BUILDER_FILE_NAMES:
+            digest.update(f"file={file_name}\n".encode())
+            digest.update((Path(__file__).parent / file_name).read_bytes())
+        return digest.hexdigest()
+
+    def _hash_asset(self, digest, asset : esdl.Asset):
+        attributes = [type(asset).__name__, asset.id, asset.name]
+        for attribute_name in ("assetType", "length", "voltagePrimary", "voltageSecundary"):
+            if hasattr(asset, attribute_name):
+                attributes.append(getattr(asset, attribute_name))
+        for port in asset.port:
+            attributes.append(type(port).__name__)
+            attributes.extend(connected_port.id for connected_port in port.connectedTo)
+            attributes.append(port.id)
+        digest.update(repr(attributes).encode())
+        digest.update(b"\n")
+        if isinstance(asset, esdl.AbstractBuilding):
+            for building_asset in asset.asset:
+                self._hash_asset(digest, building_asset)
+
+    def _entry_path(self, key : str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def load(self, key : str) -> CachedNetwork:
+        entry_path = self._entry_path(key)
+        cached_network = None
+        if entry_path.exists():
+            try:
+                with open(entry_path, "r") as f:
+                    cached_network = CachedNetwork(**json.load(f))
+                os.utime(entry_path)
+            except (OSError, ValueError, TypeError) as e:
+                LOGGER.warning(f"Ignoring unreadable network cache entry {entry_path}: {e}")
+                cached_network = None
+
+        hit = cached_network is not None
+        if hit:
+            self.statistics.hits += 1
+        else:
+            self.statistics.misses += 1
+        self.statistics.lookups.append((key, hit))
+        LOGGER.info(f"Network cache {'hit' if hit else 'miss'} for key {key} ({self.statistics.hits} hits, {self.statistics.misses} misses)")
+        return cached_network
+
+    def store(self, key : str, cached_network : CachedNetwork):
+        entry_path = self._entry_path(key)
+        temporary_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w") as f:
+            json.dump(cached_network.__dict__, f)
+        os.replace(temporary_path, entry_path)
+        self.evict()
+
+    def evict(self):
+        entries = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+        total_size = 0
+        for entry in entries:
+            total_size += entry.stat().st_size
+            if total_size > self.max_size_bytes:
+                LOGGER.info(f"Evicting network cache entry {entry.name}")
+                entry.unlink(missing_ok=True)
+                self.statistics.evictions += 1
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from typing import List
+import numpy as np
+from esdl import esdl
+from lvnetworkservice.esdl_index import ConnectedAsset, EsdlIndex
+
+# Nodes of the buses of MV cables (three wire) and LV cables (four wire, the neutral included)
+MV_CONDUCTORS = 3
+LV_CONDUCTORS = 4
+
+@dataclass
+class ReducedBus:
+    """A bus that is not in the reduced network. Its node voltages are interpolated between the nodes of
+    bus_from and bus_to, fraction of the way from bus_from; a node of which an end bus has no node (the
+    grounded neutral at a transformer, or a bus left without connection) counts as zero."""
+    name : str
+    bus_from : str
+    bus_to : str
+    fraction : float
+    conductors : int
+
+@dataclass
+class ReducedCable:
+    """A cable that is not in the reduced network. It carries the current of line, or none when line is None."""
+    name : str
+    line : str = None
+
+@dataclass
+class NetworkReduction:
+    """What the reduction of the passive buses removed from the network. Names are lower case, like OpenDSS
+    reports them."""
+    reduced_buses : List[ReducedBus] = field(default_factory=list)
+    reduced_cables : List[ReducedCable] = field(default_factory=list)
+    merged_lines : List[str] = field(default_factory=list)
+
+    @staticmethod
+    def from_dict(reduction_dict : dict) -> 'NetworkReduction':
+        return NetworkReduction([ReducedBus(**bus) for bus in reduction_dict["reduced_buses"]],
+                                [ReducedCable(**cable) for cable in reduction_dict["reduced_cables"]],
+                                list(reduction_dict["merged_lines"]))
+
+class CableGraph:
+    """The cables of the network that are closed, per bus."""
+
+    def __init__(self, cables : List[ConnectedAsset]):
+        self.cables = cables
+        self.cables_at_bus : dict[str, set[int]] = defaultdict(set)
+        for i, cable in enumerate(cables):
+            self.cables_at_bus[cable.bus_from].add(i)
+            self.cables_at_bus[cable.bus_to].add(i)
+
+    def other_end(self, cable_id : int, bus : str) -> str:
+        cable = self.cables[cable_id]
+        return cable.bus_to if cable.bus_from == bus else cable.bus_from
+
+    def remove(self, cable_id : int):
+        cable = self.cables[cable_id]
+        self.cables_at_bus[cable.bus_from].discard(cable_id)
+        self.cables_at_bus[cable.bus_to].discard(cable_id)
+
+def reduce_network(esdl_index : EsdlIndex, open_cables : set[str]) -> tuple[EsdlIndex, NetworkReduction]:
+    """Removes the buses without a source, transformer or load that OpenDSS would otherwise solve as nodes of
+    their own. Passive dead ends are removed with the cables that lead to them; they carry no current apart
+    from the charging of those cables. A chain of cables of the same line code joined by passive buses that
+    connect only those cables is merged into one cable with their total length, which is the Kron reduction of
+    the buses in between when the cable capacitance is neglected. Passive buses that join three or more cables
+    are kept: eliminating them would add a cable between every two of their neighbours. Open cables do not
+    take part and stay in the returned index, so the MV cut is applied like before."""
+    kept_buses = {source.bus_to if source.bus_to is not None else source.bus_from for source in esdl_index.imports}
+    for transformer in esdl_index.transformers:
+        kept_buses.update((transformer.bus_from, transformer.bus_to))
+    kept_buses.update(building.e_connection_name for building in esdl_index.buildings if building.amount_of_demands > 0)
+    secondary_buses = {transformer.bus_to for transformer in esdl_index.transformers}
+
+    cables, conductors = [], []
+    for cable_conductors, index_cables in ((MV_CONDUCTORS, esdl_index.mv_cables), (LV_CONDUCTORS, esdl_index.lv_cables)):
+        for cable in index_cables:
+            if cable.asset.name not in open_cables:
+                cables.append(cable)
+                conductors.append(cable_conductors)
+    graph = CableGraph(cables)
+    reduction = NetworkReduction()
+    removed_cables : set[int] = set()
+
+    # Dead ends, in the order they were removed: the bus, the bus it hung from and its amount of conductors
+    dead_ends : List[tuple[str, str, int]] = []
+    candidates = [bus for bus in graph.cables_at_bus if bus not in kept_buses]
+    while len(candidates) > 0:
+        bus = candidates.pop()
+        if len(graph.cables_at_bus[bus]) != 1:
+            continue
+        cable_id = next(iter(graph.cables_at_bus[bus]))
+        neighbour = graph.other_end(cable_id, bus)
+        graph.remove(cable_id)
+        removed_cables.add(cable_id)
+        reduction.reduced_cables.append(ReducedCable(cables[cable_id].asset.name.lower()))
+        dead_ends.append((bus, neighbour, conductors[cable_id]))
+        if neighbour not in kept_buses:
+            candidates.append(neighbour)
+
+    def in_series(bus : str) -> bool:
+        cable_ids = graph.cables_at_bus[bus]
+        if bus in kept_buses or len(cable_ids) != 2:
+            return False
+        first, second = cable_ids
+        return cables[first].asset.assetType == cables[second].asset.assetType and conductors[first] == conductors[second]
+
+    merged_cables = {MV_CONDUCTORS : [], LV_CONDUCTORS : []}
+    visited : set[str] = set()
+    for bus in list(graph.cables_at_bus):
+        if bus in visited or not in_series(bus):
+            continue
+        chain = series_chain(graph, bus, in_series, secondary_buses)
+        if chain is None:
+            # A loop of passive buses without a bus to connect it to
+            continue
+        chain_buses, chain_cables = chain
+        visited.update(chain_buses[1:-1])
+        removed_cables.update(chain_cables)
+        lengths = np.array([cables[cable_id].asset.length for cable_id in chain_cables], dtype=np.float64)
+        cumulative_fractions = np.cumsum(lengths)[:-1] / lengths.sum()
+        bus_from, bus_to = chain_buses[0], chain_buses[-1]
+        cable_conductors = conductors[chain_cables[0]]
+        if bus_from == bus_to:
+            # The chain leaves and enters the same bus, so no current flows through it
+            merged_name = None
+            reduced_buses = [ReducedBus(chain_bus.lower(), bus_from.lower(), bus_from.lower(), 0.0, cable_conductors) for chain_bus in chain_buses[1:-1]]
+        else:
+            first_cable, last_cable = cables[chain_cables[0]].asset, cables[chain_cables[-1]].asset
+            merged_name = f"{first_cable.name}__{last_cable.name}"
+            merged_cable = esdl.ElectricityCable(name=merged_name, assetType=first_cable.assetType, length=float(lengths.sum()))
+            merged_cables[cable_conductors].append(ConnectedAsset(merged_cable, bus_from, bus_to))
+            reduction.merged_lines.append(merged_name.lower())
+            reduced_buses = [ReducedBus(chain_bus.lower(), bus_from.lower(), bus_to.lower(), float(fraction), cable_conductors)
+                             for chain_bus, fraction in zip(chain_buses[1:-1], cumulative_fractions.tolist())]
+        reduction.reduced_buses.extend(reduced_buses)
+        reduction.reduced_cables.extend(ReducedCable(cables[cable_id].asset.name.lower(), None if merged_name is None else merged_name.lower())
+                                        for cable_id in chain_cables)
+
+    # A dead end takes the voltages of the bus it hung from; that bus was removed later, or is still there
+    reduced_buses = {reduced_bus.name : reduced_bus for reduced_bus in reduction.reduced_buses}
+    for bus, neighbour, cable_conductors in reversed(dead_ends):
+        reference = reduced_buses.get(neighbour.lower())
+        if reference is None:
+            reduced_bus = ReducedBus(bus.lower(), neighbour.lower(), neighbour.lower(), 0.0, cable_conductors)
+        else:
+            reduced_bus = replace(reference, name=bus.lower(), conductors=cable_conductors)
+        reduced_buses[reduced_bus.name] = reduced_bus
+        reduction.reduced_buses.append(reduced_bus)
+
+    removed_names = {cables[cable_id].asset.name for cable_id in removed_cables}
+    reduced_index = replace(esdl_index,
+                            mv_cables=[c for c in esdl_index.mv_cables if c.asset.name not in removed_names] + merged_cables[MV_CONDUCTORS],
+                            lv_cables=[c for c in esdl_index.lv_cables if c.asset.name not in removed_names] + merged_cables[LV_CONDUCTORS])
+    return reduced_index, reduction
+
+def series_chain(graph : CableGraph, bus : str, in_series, start_buses : set[str]) -> tuple[List[str], List[int]]:
+    """The buses and cables of the chain through bus, from an end bus that is not in series to the other.
+    A chain with one end in start_buses starts there, so a chain that leaves a transformer still grounds its
+    neutral at the transformer; otherwise it is oriented like its first cable where possible. None for a
+    closed loop of buses that are all in series."""
+    halves = []
+    for start_cable in sorted(graph.cables_at_bus[bus]):
+        buses, cable_ids = [bus], [start_cable]
+        current_bus, cable_id = bus, start_cable
+        while True:
+            current_bus = graph.other_end(cable_id, current_bus)
+            buses.append(current_bus)
+            if current_bus == bus:
+                return None
+            if not in_series(current_bus):
+                break
+            cable_id = next(c for c in graph.cables_at_bus[current_bus] if c != cable_id)
+            cable_ids.append(cable_id)
+        halves.append((buses, cable_ids))
+    (first_buses, first_cables), (second_buses, second_cables) = halves
+    buses = first_buses[::-1] + second_buses[1:]
+    cable_ids = first_cables[::-1] + second_cables
+    if (buses[0] in start_buses) != (buses[-1] in start_buses):
+        reverse = buses[-1] in start_buses
+    else:
+        reverse = graph.cables[cable_ids[0]].bus_from != buses[0] and graph.cables[cable_ids[-1]].bus_from == buses[-1]
+    if reverse:
+        buses.reverse()
+        cable_ids.reverse()
+    return buses, cable_ids
+
+class ReducedResultExpansion:
+    """Expands the results of the reduced network to the buses and cables it does not have: the voltage of
+    every node of a reduced bus is interpolated between the same node of the two buses around it, and a
+    reduced cable carries the current of the merged line it is part of. The merged lines themselves are
+    left out, so the cables of the expanded results are those of the ESDL."""
+
+    def __init__(self, reduction : NetworkReduction, node_names : List[str], line_names : List[str]):
+        node_positions = {name : i for i, name in enumerate(node_names)}
+        # Nodes that are not in the network read the zero appended behind the node values
+        missing_node = len(node_names)
+        reduced_node_names, from_positions, to_positions, fractions = [], [], [], []
+        for reduced_bus in reduction.reduced_buses:
+            for conductor in range(1, reduced_bus.conductors + 1):
+                reduced_node_names.append(f"{reduced_bus.name}.{conductor}")
+                from_positions.append(node_positions.get(f"{reduced_bus.bus_from}.{conductor}", missing_node))
+                to_positions.append(node_positions.get(f"{reduced_bus.bus_to}.{conductor}", missing_node))
+                fractions.append(reduced_bus.fraction)
+        self.from_positions = np.array(from_positions, dtype=np.int64)
+        self.to_positions = np.array(to_positions, dtype=np.int64)
+        self.fractions = np.array(fractions, dtype=np.float64)
+
+        merged_lines = set(reduction.merged_lines)
+        line_positions = {name : i for i, name in enumerate(line_names)}
+        self.kept_line_positions = np.array([i for i, name in enumerate(line_names) if name not in merged_lines], dtype=np.int64)
+        # Cables without a line read the zero appended behind the line values
+        self.reduced_cable_positions = np.array([line_positions.get(cable.line, len(line_names)) for cable in reduction.reduced_cables], dtype=np.int64)
+
+        self.node_names = list(node_names) + reduced_node_names
+        self.line_names = [line_names[i] for i in self.kept_line_positions.tolist()] + [cable.name for cable in reduction.reduced_cables]
+
+    def expand(self, bus_voltage_mag : np.ndarray, total_line_current_mag : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        node_values = np.append(bus_voltage_mag, 0.0)
+        reduced_voltages = (1.0 - self.fractions) * node_values[self.from_positions] + self.fractions * node_values[self.to_positions]
+        line_values = np.append(total_line_current_mag, 0.0)
+        return (np.concatenate((bus_voltage_mag, reduced_voltages)),
+                np.concatenate((total_line_current_mag[self.kept_line_positions], line_values[self.reduced_cable_positions])))
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+class OutputDeadband:
+    """Change detection for the values written per step. A value is only written when it moved more than its
+    deadband, max(absolute threshold, relative threshold * |last written value|), away from the value written
+    last for the same output. Every full_write_interval steps all values are written, so a reader that
+    carries the last value forward never needs to look back further than that interval."""
+
+    def __init__(self, absolute_thresholds : np.ndarray, relative_thresholds : np.ndarray, full_write_interval : int):
+        self.absolute_thresholds = absolute_thresholds
+        self.relative_thresholds = relative_thresholds
+        self.full_write_interval = full_write_interval
+        self.last_written_values = np.full(len(absolute_thresholds), np.nan)
+        self.steps_since_full_write = 0
+        self.total_values = 0
+        self.written_values = 0
+
+    def select(self, values : np.ndarray) -> np.ndarray:
+        """Mask of the values to write this step; the written values become the new reference values."""
+        if self.steps_since_full_write == 0:
+            mask = np.ones(len(values), dtype=bool)
+        else:
+            deadband = np.maximum(self.absolute_thresholds, self.relative_thresholds * np.abs(self.last_written_values))
+            mask = (np.abs(values - self.last_written_values) > deadband) | (np.isnan(values) != np.isnan(self.last_written_values))
+        self.steps_since_full_write = (self.steps_since_full_write + 1) % self.full_write_interval
+        self.last_written_values[mask] = values[mask]
+        self.total_values += len(values)
+        self.written_values += int(np.count_nonzero(mask))
+        return mask
+
+    def compression_ratio(self) -> float:
+        return self.total_values / self.written_values if self.written_values > 0 else 1.0
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from datetime import datetime
+import csv
+from pathlib import Path
+from typing import List
+import numpy as np
+
+ACTIVE_POWER_COLUMN_PREFIX = "active_power"
+REACTIVE_POWER_COLUMN_PREFIX = "reactive_power"
+TIME_COLUMN = "time"
+
+@dataclass
+class LoadProfiles:
+    """Active and reactive power of a horizon of equidistant time steps, in W and VAr like the
+    aggregated_active_power/aggregated_reactive_power inputs. The power arrays have the shape
+    (time steps, EConnections, phases)."""
+    times : List[datetime]
+    e_connection_ids : List[str]
+    active_power : np.ndarray
+    reactive_power : np.ndarray
+
+    def step_seconds(self) -> float:
+        if len(self.times) < 2:
+            raise ValueError("A load profile needs at least two time steps")
+        steps = np.diff(np.array(self.times, dtype="datetime64[s]")).astype(np.int64)
+        if np.any(steps != steps[0]) or steps[0] <= 0:
+            raise ValueError("The time steps of a load profile must be equidistant and increasing")
+        return float(steps[0])
+
+def profile_column_name(prefix : str, e_connection_id : str, phase : int) -> str:
+    return f"{prefix}/{e_connection_id}/{phase + 1}"
+
+def read_load_profiles(file_name : str) -> LoadProfiles:
+    """Reads load profiles from a .csv, .npz or .parquet file.
+
+    CSV and Parquet files have a time column followed by one column per EConnection and phase, named
+    active_power/<EConnection id>/<phase> and reactive_power/<EConnection id>/<phase> (phases start at 1).
+    NPZ files contain the arrays times (datetime64), e_connection_ids, active_power and reactive_power."""
+    suffix = Path(file_name).suffix.lower()
+    if suffix == ".csv":
+        with open(file_name, "r", newline="") as f:
+            header = f.readline().strip().split(",")
+            rows = [row.split(",", 1) for row in f.read().splitlines() if row]
+        times = [datetime.fromisoformat(row[0]) for row in rows]
+        values = np.loadtxt((row[1] for row in rows), delimiter=",", ndmin=2).reshape(len(rows), len(header) - 1)
+        return profiles_from_columns(times, header[1:], values)
+    if suffix == ".npz":
+        with np.load(file_name, allow_pickle=False) as data:
+            return LoadProfiles(
+                times=data["times"].astype("datetime64[s]").astype(datetime).tolist(),
+                e_connection_ids=[str(e_connection_id) for e_connection_id in data["e_connection_ids"]],
+                active_power=np.asarray(data["active_power"], dtype=np.float64),
+                reactive_power=np.asarray(data["reactive_power"], dtype=np.float64)
+            )
+    if suffix == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading parquet load profiles requires pyarrow") from e
+        table = pq.read_table(file_name)
+        column_names = [name for name in table.column_names if name != TIME_COLUMN]
+        times = table.column(TIME_COLUMN).to_pylist()
+        values = np.column_stack([table.column(name).to_numpy() for name in column_names]) if column_names else np.zeros((len(times), 0))
+        return profiles_from_columns(times, column_names, values)
+    raise ValueError(f"Unsupported load profile file type '{suffix}'")
+
+def profiles_from_columns(times : List[datetime], column_names : List[str], values : np.ndarray) -> LoadProfiles:
+    e_connection_ids : dict[str, int] = {}
+    columns = []
+    for column, name in enumerate(column_names):
+        prefix, e_connection_id, phase = name.rsplit("/", 2)
+        if prefix not in (ACTIVE_POWER_COLUMN_PREFIX, REACTIVE_POWER_COLUMN_PREFIX):
+            raise ValueError(f"Unknown load profile column '{name}'")
+        row = e_connection_ids.setdefault(e_connection_id, len(e_connection_ids))
+        columns.append((column, prefix, row, int(phase) - 1))
+
+    amount_of_phases = max((phase for _, _, _, phase in columns), default=-1) + 1
+    active_power = np.zeros((len(times), len(e_connection_ids), amount_of_phases))
+    reactive_power = np.zeros((len(times), len(e_connection_ids), amount_of_phases))
+    for column, prefix, row, phase in columns:
+        target = active_power if prefix == ACTIVE_POWER_COLUMN_PREFIX else reactive_power
+        target[:, row, phase] = values[:, column]
+    return LoadProfiles(times, list(e_connection_ids.keys()), active_power, reactive_power)
+
+def write_load_profiles_csv(file_name : str, load_profiles : LoadProfiles):
+    column_names = [TIME_COLUMN]
+    amount_of_phases = load_profiles.active_power.shape[2]
+    for prefix in (ACTIVE_POWER_COLUMN_PREFIX, REACTIVE_POWER_COLUMN_PREFIX):
+        for e_connection_id in load_profiles.e_connection_ids:
+            column_names.extend(profile_column_name(prefix, e_connection_id, phase) for phase in range(amount_of_phases))
+    amount_of_steps = len(load_profiles.times)
+    values = np.concatenate((load_profiles.active_power.reshape(amount_of_steps, -1),
+                             load_profiles.reactive_power.reshape(amount_of_steps, -1)), axis=1)
+    with open(file_name, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(column_names)
+        for time, row in zip(load_profiles.times, values.tolist()):
+            writer.writerow([time.isoformat()] + row)
+
+def write_load_profiles_npz(file_name : str, load_profiles : LoadProfiles):
+    np.savez(file_name,
+             times=np.array(load_profiles.times, dtype="datetime64[s]"),
+             e_connection_ids=np.array(load_profiles.e_connection_ids, dtype=str),
+             active_power=load_profiles.active_power,
+             reactive_power=load_profiles.reactive_power)
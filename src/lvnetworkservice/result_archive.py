@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+import json
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+TIME_COLUMN = "time"
+STATIC_OUTPUTS_METADATA_KEY = b"static_outputs"
+ARROW_SUFFIX = ".arrow"
+PARQUET_SUFFIX = ".parquet"
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The result archive requires pyarrow") from e
+    return pyarrow
+
+class ResultArchiveWriter:
+    """Streams the results of every step to a columnar file on local disk: one float32 column per output name
+    and the time of the step as first column. Steps are collected in a buffer of flush_rows rows that is
+    written as one record batch (Arrow IPC) or row group (Parquet) when it is full, so the memory use does
+    not grow with the length of the simulation. The format follows the suffix of the file name."""
+
+    def __init__(self, file_name : str, column_names : List[str], flush_rows : int = 96, static_outputs : Optional[dict] = None):
+        self.pa = import_pyarrow()
+        self.file_name = file_name
+        self.column_names = list(column_names)
+        self.flush_rows = flush_rows
+        fields = [self.pa.field(TIME_COLUMN, self.pa.timestamp("s"))] + [self.pa.field(name, self.pa.float32()) for name in self.column_names]
+        metadata = {STATIC_OUTPUTS_METADATA_KEY : json.dumps(static_outputs or {}).encode()}
+        self.schema = self.pa.schema(fields, metadata=metadata)
+        # One row of the buffer per column, so every column of a batch is contiguous
+        self.buffer = np.empty((len(self.column_names), flush_rows), dtype=np.float32)
+        self.buffer_times : List[datetime] = []
+        self.rows_written = 0
+        suffix = Path(file_name).suffix.lower()
+        if suffix == ARROW_SUFFIX:
+            self.writer = self.pa.ipc.new_file(file_name, self.schema)
+        elif suffix == PARQUET_SUFFIX:
+            self.writer = self.pa.parquet.ParquetWriter(file_name, self.schema)
+        else:
+            raise ValueError(f"Unsupported result archive file type '{suffix}'")
+
+    def write(self, simulation_time : datetime, values : np.ndarray):
+        self.buffer[:, len(self.buffer_times)] = values
+        self.buffer_times.append(simulation_time)
+        if len(self.buffer_times) == self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        rows = len(self.buffer_times)
+        if rows == 0:
+            return
+        columns = [self.pa.array(self.buffer_times, type=self.pa.timestamp("s"))]
+        columns.extend(self.pa.array(self.buffer[i, :rows]) for i in range(len(self.column_names)))
+        batch = self.pa.RecordBatch.from_arrays(columns, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.rows_written += rows
+        self.buffer_times = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+class ResultArchive:
+    """Reads a result archive written by ResultArchiveWriter. Arrow IPC archives are memory-mapped, so reading
+    a few columns or a time range only touches those parts of the file. Parquet archives are read per row
+    group."""
+
+    def __init__(self, file_name : str):
+        self.pa = import_pyarrow()
+        self.file_name = file_name
+        self.is_parquet = Path(file_name).suffix.lower() == PARQUET_SUFFIX
+        if self.is_parquet:
+            self.parquet_file = self.pa.parquet.ParquetFile(file_name, memory_map=True)
+            self.schema = self.parquet_file.schema_arrow
+            batch_rows = [self.parquet_file.metadata.row_group(i).num_rows for i in range(self.parquet_file.num_row_groups)]
+        else:
+            self.reader = self.pa.ipc.open_file(self.pa.memory_map(file_name, "r"))
+            self.schema = self.reader.schema
+            batch_rows = [self.reader.get_batch(i).num_rows for i in range(self.reader.num_record_batches)]
+        self.batch_starts = np.concatenate(([0], np.cumsum(batch_rows, dtype=np.int64)))
+        self.column_names = [name for name in self.schema.names if name != TIME_COLUMN]
+        self.times = np.concatenate([self.read_batch(i, [TIME_COLUMN]).column(0).to_numpy() for i in range(len(batch_rows))]) \
+            if batch_rows else np.array([], dtype="datetime64[s]")
+
+    def static_outputs(self) -> dict:
+        metadata = self.schema.metadata or {}
+        return json.loads(metadata.get(STATIC_OUTPUTS_METADATA_KEY, b"{}"))
+
+    def read_batch(self, i : int, columns : List[str]):
+        if self.is_parquet:
+            return self.parquet_file.read_row_group(i, columns=columns)
+        batch = self.reader.get_batch(i)
+        return self.pa.Table.from_batches([batch]).select(columns)
+
+    def read(self, columns : Optional[List[str]] = None, start : Optional[datetime] = None, end : Optional[datetime] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Times and values (rows are steps, columns are the requested outputs) of the steps with start <= time < end."""
+        columns = self.column_names if columns is None else list(columns)
+        first = 0 if start is None else int(np.searchsorted(self.times, np.datetime64(start, "s"), side="left"))
+        last = len(self.times) if end is None else int(np.searchsorted(self.times, np.datetime64(end, "s"), side="left"))
+        values = np.empty((max(last - first, 0), len(columns)), dtype=np.float32)
+        if last <= first:
+            return self.times[first:first], values
+        first_batch = int(np.searchsorted(self.batch_starts, first, side="right")) - 1
+        last_batch = int(np.searchsorted(self.batch_starts, last, side="left"))
+        for i in range(first_batch, last_batch):
+            batch_start, batch_end = self.batch_starts[i], self.batch_starts[i + 1]
+            table = self.read_batch(i, columns)
+            rows = slice(max(first, batch_start) - batch_start, min(last, batch_end) - batch_start)
+            target = slice(max(first, batch_start) - first, min(last, batch_end) - first)
+            for j in range(len(columns)):
+                values[target, j] = table.column(j).to_numpy()[rows]
+        return self.times[first:last], values
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+import multiprocessing
+import traceback
+from typing import List
+import dss
+import numpy as np
+from dots_infrastructure.Logger import LOGGER
+from lvnetworkservice.violation_summary import PHASE_CONDUCTORS, inverse_limits
+
+@dataclass
+class ScenarioSettings:
+    """Perturbed load scenarios that are evaluated around the received loads every step. In every scenario a
+    fraction pv_uptake of the EConnections has PV that injects pv_kw and a fraction ev_uptake has an EV that
+    charges with ev_kw, both spread evenly over the phases of the EConnection. Which EConnections adopted PV or
+    an EV is drawn once per scenario; on top of that every load is multiplied with 1 + noise_relative * N(0, 1),
+    drawn per scenario every step. The injections are taken at their peak, which is the worst case a hosting
+    capacity study looks at."""
+    amount_of_scenarios : int = 100
+    pv_uptake : float = 0.0
+    pv_kw : float = 4.0
+    ev_uptake : float = 0.0
+    ev_kw : float = 11.0
+    noise_relative : float = 0.0
+    # Percentiles (0-100) of every output over the scenarios
+    percentiles : tuple[float, ...] = (5.0, 50.0, 95.0)
+    seed : int = 0
+
+    def __post_init__(self):
+        if self.amount_of_scenarios < 1:
+            raise ValueError("Scenario evaluation needs at least one scenario")
+        if not (0.0 <= self.pv_uptake <= 1.0 and 0.0 <= self.ev_uptake <= 1.0):
+            raise ValueError("PV and EV uptake are fractions between 0 and 1")
+        if any(not 0.0 <= percentile <= 100.0 for percentile in self.percentiles):
+            raise ValueError("Percentiles are between 0 and 100")
+
+class ScenarioLoads:
+    """Draws the kW and kvar of every load in every scenario, one row per scenario."""
+
+    def __init__(self, settings : ScenarioSettings, e_connection_rows : np.ndarray):
+        self.settings = settings
+        self.random = np.random.default_rng(settings.seed)
+        amount_of_e_connections = int(e_connection_rows.max()) + 1 if len(e_connection_rows) > 0 else 0
+        loads_per_e_connection = np.bincount(e_connection_rows, minlength=amount_of_e_connections)[e_connection_rows]
+        shape = (settings.amount_of_scenarios, amount_of_e_connections)
+        pv_adopters = (self.random.random(shape) < settings.pv_uptake)[:, e_connection_rows]
+        ev_adopters = (self.random.random(shape) < settings.ev_uptake)[:, e_connection_rows]
+        self.added_kw = (ev_adopters * settings.ev_kw - pv_adopters * settings.pv_kw) / loads_per_e_connection
+
+    def draw(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        factors = 1.0 + self.settings.noise_relative * self.random.standard_normal(self.added_kw.shape)
+        return load_kw * factors + self.added_kw, load_kvar * factors
+
+@dataclass
+class ScenarioNetwork:
+    """What a scenario solver needs of the compiled network of the service: the DSS script, the Loads index of
+    every load and the positions of the line and transformer values in the PDElements arrays (see
+    ResultExtractionIndex)."""
+    script : str
+    load_indices : np.ndarray
+    line_current_positions : np.ndarray
+    line_current_starts : np.ndarray
+    transformer_power_positions : np.ndarray
+    transformer_power_starts : np.ndarray
+
+def sum_segments(values : np.ndarray, positions : np.ndarray, starts : np.ndarray) -> np.ndarray:
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.float64)
+    return np.add.reduceat(values[positions], starts)
+
+class ScenarioSolver:
+    """Solves scenarios in a DSS context of its own, so the circuit of the service keeps its state."""
+
+    def __init__(self, network : ScenarioNetwork):
+        self.network = network
+        self.context = dss.DSS.NewContext()
+        self.context.Text.Commands(network.script)
+
+    def solve(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Values of every output (bus voltages, line currents, transformer powers) and convergence per scenario."""
+        network = self.network
+        active_circuit = self.context.ActiveCircuit
+        loads = active_circuit.Loads
+        load_indices = network.load_indices.tolist()
+        values = []
+        converged = []
+        for scenario_kw, scenario_kvar in zip(load_kw, load_kvar):
+            for load_index, kw, kvar in zip(load_indices, scenario_kw.tolist(), scenario_kvar.tolist()):
+                loads.idx = load_index
+                loads.kW = kw
+                loads.kvar = kvar
+            active_circuit.Solution.Solve()
+            currents_mag_ang = np.asarray(active_circuit.PDElements.AllCurrentsMagAng)
+            powers = np.asarray(active_circuit.PDElements.AllPowers)
+            transformer_power = np.hypot(sum_segments(powers, network.transformer_power_positions, network.transformer_power_starts),
+                                         sum_segments(powers, network.transformer_power_positions + 1, network.transformer_power_starts))
+            values.append(np.concatenate((np.asarray(active_circuit.AllBusVmag, dtype=np.float64),
+                                          sum_segments(currents_mag_ang, network.line_current_positions, network.line_current_starts),
+                                          transformer_power)))
+            converged.append(bool(active_circuit.Solution.Converged))
+        return np.array(values), np.array(converged)
+
+def scenario_worker(connection, network : ScenarioNetwork):
+    try:
+        solver = ScenarioSolver(network)
+        connection.send(("ready", None))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+    while True:
+        message = connection.recv()
+        if message[0] == "close":
+            break
+        try:
+            connection.send(("solved", solver.solve(*message[1:])))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+
+class ScenarioWorker:
+    """A process that keeps a compiled copy of the network for the lifetime of the evaluator."""
+
+    def __init__(self, network : ScenarioNetwork):
+        context = multiprocessing.get_context("spawn")
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=scenario_worker, args=(worker_connection, network), daemon=True)
+        self.process.start()
+
+    def receive(self):
+        try:
+            status, payload = self.connection.recv()
+        except EOFError as e:
+            raise RuntimeError(f"Scenario worker exited with code {self.process.exitcode}") from e
+        if status == "error":
+            raise RuntimeError(f"Scenario worker failed:\n{payload}")
+        return payload
+
+    def send_solve(self, load_kw : np.ndarray, load_kvar : np.ndarray):
+        self.connection.send(("solve", load_kw, load_kvar))
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(("close",))
+            self.process.join(timeout=10)
+        self.connection.close()
+
+class ScenarioReduction:
+    """Reduces the values of all scenarios to the given percentiles of every output and to the probability
+    that a phase node is outside the voltage band (pu of its voltage base) and that a line or transformer is
+    loaded above max_loading of its limit."""
+
+    def __init__(self, node_names : List[str], node_voltage_bases : np.ndarray, line_names : List[str], line_current_limits : np.ndarray,
+                 transformer_names : List[str], transformer_power_limits : np.ndarray, percentiles : tuple[float, ...],
+                 voltage_min_pu : float, voltage_max_pu : float, max_loading : float):
+        self.percentiles = list(percentiles)
+        self.voltage_min_pu = voltage_min_pu
+        self.voltage_max_pu = voltage_max_pu
+        self.max_loading = max_loading
+        self.amount_of_nodes = len(node_names)
+        self.amount_of_lines = len(line_names)
+        self.phase_nodes = np.array([i for i, name in enumerate(node_names)
+                                     if name.rsplit('.', 1)[-1] in PHASE_CONDUCTORS and node_voltage_bases[i] > 0], dtype=np.int64)
+        self.inverse_voltage_bases = 1.0 / node_voltage_bases[self.phase_nodes]
+        self.inverse_limits = np.concatenate((inverse_limits(line_current_limits), inverse_limits(transformer_power_limits)))
+        all_names = list(node_names) + list(line_names) + list(transformer_names)
+        self.percentile_names = [[f"{name}_p{percentile:g}" for name in all_names] for percentile in self.percentiles]
+        self.probability_names = [f"{node_names[i]}_violation_probability" for i in self.phase_nodes.tolist()]
+        self.probability_names.extend(f"{name}_overload_probability" for name in list(line_names) + list(transformer_names))
+
+    def outputs(self, values : np.ndarray) -> List[tuple[str, float]]:
+        outputs = []
+        for names, percentile_values in zip(self.percentile_names, np.percentile(values, self.percentiles, axis=0)):
+            outputs.extend(zip(names, percentile_values.tolist()))
+        voltage_pu = values[:, self.phase_nodes] * self.inverse_voltage_bases
+        voltage_violations = (voltage_pu < self.voltage_min_pu) | (voltage_pu > self.voltage_max_pu)
+        overloads = values[:, self.amount_of_nodes:] * self.inverse_limits > self.max_loading
+        probabilities = np.concatenate((voltage_violations.mean(axis=0), overloads.mean(axis=0)))
+        outputs.extend(zip(self.probability_names, probabilities.tolist()))
+        return outputs
+
+class ScenarioEvaluator:
+    """Solves the scenarios of a step and reduces them. With more than one worker the scenarios are divided in
+    batches over worker processes that each hold a compiled copy of the network and solve in parallel."""
+
+    def __init__(self, network : ScenarioNetwork, scenario_loads : ScenarioLoads, reduction : ScenarioReduction, amount_of_workers : int):
+        self.scenario_loads = scenario_loads
+        self.reduction = reduction
+        amount_of_scenarios = scenario_loads.settings.amount_of_scenarios
+        self.batches = np.array_split(np.arange(amount_of_scenarios), min(max(amount_of_workers, 1), amount_of_scenarios))
+        if len(self.batches) > 1:
+            self.workers = [ScenarioWorker(network) for _ in self.batches]
+            self.local_solver = None
+            for worker in self.workers:
+                worker.receive()
+        else:
+            self.workers = []
+            self.local_solver = ScenarioSolver(network)
+
+    def evaluate(self, load_kw : np.ndarray, load_kvar : np.ndarray) -> List[tuple[str, float]]:
+        scenario_kw, scenario_kvar = self.scenario_loads.draw(load_kw, load_kvar)
+        if self.local_solver is not None:
+            values, converged = self.local_solver.solve(scenario_kw, scenario_kvar)
+        else:
+            for worker, batch in zip(self.workers, self.batches):
+                worker.send_solve(scenario_kw[batch], scenario_kvar[batch])
+            solved = [worker.receive() for worker in self.workers]
+            values = np.concatenate([batch_values for batch_values, _ in solved])
+            converged = np.concatenate([batch_converged for _, batch_converged in solved])
+        if not np.all(converged):
+            LOGGER.warning(f"{int(np.count_nonzero(~converged))} of {len(converged)} load scenarios did not converge")
+        return self.reduction.outputs(values)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
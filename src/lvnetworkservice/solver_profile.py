@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from dss.enums import ControlModes, SolutionAlgorithms
+
+ALGORITHMS = {"normal" : SolutionAlgorithms.NormalSolve, "newton" : SolutionAlgorithms.NewtonSolve}
+CONTROL_MODES = {"static" : ControlModes.Static, "off" : ControlModes.Off}
+
+@dataclass
+class SolverProfile:
+    """Settings of the OpenDSS snapshot solution for a network of which only the load kW and kvar change
+    between steps. OpenDSS keeps the factorized system matrix as long as no element invalidates it, which
+    setting the power of a load does not do, so the matrix is built for the first step after compiling and
+    reused afterwards. The network has no regulators or capacitor controls, so the control iterations can be
+    switched off with control_mode "off"."""
+    algorithm : str = "normal"
+    # Largest change of a node voltage (pu) between two iterations for which the solution has converged
+    tolerance : float = 1e-4
+    max_iterations : int = 15
+    control_mode : str = "static"
+    max_control_iterations : int = 10
+
+    def __post_init__(self):
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown solver algorithm '{self.algorithm}', expected one of {sorted(ALGORITHMS)}")
+        if self.control_mode not in CONTROL_MODES:
+            raise ValueError(f"Unknown control mode '{self.control_mode}', expected one of {sorted(CONTROL_MODES)}")
+        if self.tolerance <= 0 or self.max_iterations < 1 or self.max_control_iterations < 1:
+            raise ValueError("A solver profile needs a positive tolerance and at least one (control) iteration")
+
+    def apply(self, solution):
+        solution.Algorithm = ALGORITHMS[self.algorithm]
+        solution.Tolerance = self.tolerance
+        solution.MaxIterations = self.max_iterations
+        solution.ControlMode = CONTROL_MODES[self.control_mode]
+        solution.MaxControlIterations = self.max_control_iterations
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import random
+import uuid
+import numpy as np
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.mv_network import MV_SOURCE_BUS
+
+# Codes from LineCode.dss and XFMRCode.dss, so generated networks compile against the shipped code libraries
+MV_LINE_CODE = "GPLK-Al-240"
+LV_LINE_CODE = "4x150Al_4x6Cu_50CuAs_V_VMvKhsas"
+HOUSE_LINE_CODE = "4x16Cu_as16__VG_YMVK_asmb"
+XFMR_CODE = "10000_400_V_250_kVA_Smit"
+MV_SOURCE_KV = "10.5"
+MV_CABLE_LENGTH_RANGE = (200.0, 500.0)
+LV_CABLE_LENGTH_RANGE = (20.0, 40.0)
+HOUSE_CABLE_LENGTH_RANGE = (10.0, 25.0)
+
+class SyntheticNetworkGenerator:
+    """Builds mv_rings MV rings fed from MV_SOURCE_BUS that divide the mv_joints joints between them. The
+    transformers are spread over the ring joints in turn and every transformer feeds a radial LV feeder with houses_per_feeder houses,
+    named like the assets in test.esdl. The feeder cable between two houses is made of lv_cable_segments cables
+    joined by joints without a house. Ids and cable lengths only depend on the seed, so a generated
+    network is the same every time."""
+
+    def __init__(self, mv_joints : int, transformers : int, houses_per_feeder : int, seed : int = 0, mv_rings : int = 1, lv_cable_segments : int = 1):
+        if mv_joints < 1 or transformers < 0 or houses_per_feeder < 0:
+            raise ValueError("A synthetic network needs at least one MV joint and no negative amount of transformers or houses")
+        if lv_cable_segments < 1:
+            raise ValueError("A synthetic network needs at least one cable between two houses")
+        if not 1 <= mv_rings <= mv_joints:
+            raise ValueError("A synthetic network needs at least one MV ring and at least one MV joint per ring")
+        self.mv_joints = mv_joints
+        self.mv_rings = mv_rings
+        self.transformers = transformers
+        self.houses_per_feeder = houses_per_feeder
+        self.lv_cable_segments = lv_cable_segments
+        self.random = random.Random(seed)
+
+    def new_id(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128)))
+
+    def new_length(self, length_range : tuple[float, float]) -> float:
+        return round(self.random.uniform(*length_range), 1)
+
+    def new_port(self, asset : esdl.Asset, port_type) -> esdl.Port:
+        port = port_type(id=self.new_id(), name=port_type.__name__)
+        asset.port.append(port)
+        return port
+
+    def new_joint(self, area : esdl.Area, name : str) -> esdl.Joint:
+        joint = esdl.Joint(id=self.new_id(), name=name)
+        self.new_port(joint, esdl.InPort)
+        self.new_port(joint, esdl.OutPort)
+        area.asset.append(joint)
+        return joint
+
+    def connect(self, area : esdl.Area, asset : esdl.Asset, from_port : esdl.Port, to_port : esdl.Port):
+        self.new_port(asset, esdl.InPort).connectedTo.append(from_port)
+        self.new_port(asset, esdl.OutPort).connectedTo.append(to_port)
+        area.asset.append(asset)
+
+    def new_cable(self, name : str, line_code : str, length_range : tuple[float, float]) -> esdl.ElectricityCable:
+        return esdl.ElectricityCable(id=self.new_id(), name=name, assetType=line_code, length=self.new_length(length_range))
+
+    def generate(self) -> esdl.EnergySystem:
+        name = f"synthetic_{self.mv_joints}_{self.transformers}_{self.houses_per_feeder}"
+        energy_system = esdl.EnergySystem(id=self.new_id(), name=name)
+        instance = esdl.Instance(id=self.new_id(), name=name)
+        energy_system.instance.append(instance)
+        area = esdl.Area(id=self.new_id(), name=name)
+        instance.area = area
+
+        source_joint = self.new_joint(area, MV_SOURCE_BUS)
+        source = esdl.Import(id=self.new_id(), name="Source1", assetType=MV_SOURCE_KV)
+        self.new_port(source, esdl.OutPort).connectedTo.append(source_joint.port[0])
+        area.asset.append(source)
+
+        mv_joints = [self.new_joint(area, f"mvjoint{j}") for j in range(self.mv_joints)]
+        cable_number = 0
+        for ring_joints in np.array_split(np.arange(self.mv_joints), self.mv_rings):
+            ring = [source_joint] + [mv_joints[j] for j in ring_joints.tolist()]
+            for i in range(len(ring)):
+                self.connect(area, self.new_cable(f"MV_cable{cable_number}", MV_LINE_CODE, MV_CABLE_LENGTH_RANGE), ring[i].port[1], ring[(i + 1) % len(ring)].port[0])
+                cable_number += 1
+
+        for t in range(self.transformers):
+            self.add_feeder(area, t, mv_joints[t % self.mv_joints])
+        return energy_system
+
+    def add_feeder(self, area : esdl.Area, t : int, mv_joint : esdl.Joint):
+        lv_joints = [self.new_joint(area, f"lvnode{t}_{h}") for h in range(self.houses_per_feeder + 1)]
+        transformer = esdl.Transformer(id=self.new_id(), name=f"Transformer{t}", assetType=XFMR_CODE, voltagePrimary=10.0, voltageSecundary=0.4)
+        self.connect(area, transformer, mv_joint.port[1], lv_joints[0].port[0])
+        for h in range(self.houses_per_feeder):
+            segment_joints = [lv_joints[h]] + [self.new_joint(area, f"lvjoint{t}_{h}_{s}") for s in range(1, self.lv_cable_segments)] + [lv_joints[h + 1]]
+            for s in range(self.lv_cable_segments):
+                name = f"Cable{t}_{h}" if s == 0 else f"Cable{t}_{h}_{s}"
+                self.connect(area, self.new_cable(name, LV_LINE_CODE, LV_CABLE_LENGTH_RANGE), segment_joints[s].port[1], segment_joints[s + 1].port[0])
+            building = esdl.Building(id=self.new_id(), name=f"Home{t}_{h}")
+            e_connection = esdl.EConnection(id=self.new_id(), name=f"ConnectionHome{t}_{h}")
+            e_connection_port = self.new_port(e_connection, esdl.InPort)
+            building.asset.append(e_connection)
+            building.asset.append(esdl.ElectricityDemand(id=self.new_id(), name=f"DemandHome{t}_{h}"))
+            area.asset.append(building)
+            self.connect(area, self.new_cable(f"CableHome{t}_{h}", HOUSE_LINE_CODE, HOUSE_CABLE_LENGTH_RANGE), lv_joints[h + 1].port[1], e_connection_port)
+
+def generate_energy_system(mv_joints : int, transformers : int, houses_per_feeder : int, seed : int = 0, mv_rings : int = 1,
+                           lv_cable_segments : int = 1) -> esdl.EnergySystem:
+    return SyntheticNetworkGenerator(mv_joints, transformers, houses_per_feeder, seed, mv_rings, lv_cable_segments).generate()
+
+def write_energy_system(file_name : str, mv_joints : int, transformers : int, houses_per_feeder : int, seed : int = 0, mv_rings : int = 1,
+                        lv_cable_segments : int = 1) -> esdl.EnergySystem:
+    energy_system = generate_energy_system(mv_joints, transformers, houses_per_feeder, seed, mv_rings, lv_cable_segments)
+    EnergySystemHandler(energy_system).save(file_name)
+    return energy_system
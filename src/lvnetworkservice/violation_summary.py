@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from dataclasses import dataclass
+from typing import List
+import numpy as np
+
+# Conductor 4 of the LV network is the neutral, which has no voltage band
+PHASE_CONDUCTORS = {"1", "2", "3"}
+NO_FEEDER = -1
+
+@dataclass
+class FeederGrouping:
+    """The LV network behind every secondary transformer, named after the transformer. node_feeders and
+    line_feeders hold the feeder of every node and line, NO_FEEDER for the ones that are not behind a
+    secondary transformer, like the MV network."""
+    feeder_names : List[str]
+    node_feeders : np.ndarray
+    line_feeders : np.ndarray
+
+def group_by_secondary_transformer(node_names : List[str], line_buses : List[tuple[str, str]], transformer_names : List[str],
+                                   transformer_buses : List[tuple[str, str]]) -> FeederGrouping:
+    parent : dict[str, str] = {}
+
+    def find(bus : str) -> str:
+        parent.setdefault(bus, bus)
+        while parent[bus] != bus:
+            parent[bus] = parent[parent[bus]]
+            bus = parent[bus]
+        return bus
+
+    # Transformers separate the LV networks from the MV network, so the buses connected by lines only
+    # form one group per LV network plus the MV network itself
+    for bus_from, bus_to in line_buses:
+        parent[find(bus_from.lower())] = find(bus_to.lower())
+
+    feeder_of_root : dict[str, int] = {}
+    for _, secondary in transformer_buses:
+        # A meshed LV network fed by several transformers is reported as the feeder of the first one
+        feeder_of_root.setdefault(find(secondary.lower()), len(feeder_of_root))
+    feeder_names = [None] * len(feeder_of_root)
+    for name, (_, secondary) in zip(transformer_names, transformer_buses):
+        feeder = feeder_of_root[find(secondary.lower())]
+        if feeder_names[feeder] is None:
+            feeder_names[feeder] = name
+
+    return FeederGrouping(
+        feeder_names=feeder_names,
+        node_feeders=np.array([feeder_of_root.get(find(name.split('.')[0].lower()), NO_FEEDER) for name in node_names], dtype=np.int64),
+        line_feeders=np.array([feeder_of_root.get(find(bus_from.lower()), NO_FEEDER) for bus_from, _ in line_buses], dtype=np.int64)
+    )
+
+def inverse_limits(limits : np.ndarray) -> np.ndarray:
+    # Elements without a limit never count as overloaded
+    return np.divide(1.0, limits, out=np.zeros(len(limits), dtype=np.float64), where=limits > 0)
+
+class ViolationSummary:
+    """Reduces the results of a step to what a planner looks at: per feeder the lowest and highest phase voltage
+    (pu of the node voltage base), the peak line loading (total line current / line limit) and the amount of
+    voltage band violations and overloaded lines, the loading of every transformer (power / kVA rating) and the
+    values of only the nodes, lines and transformers that violate their band or limit."""
+
+    def __init__(self, grouping : FeederGrouping, node_names : List[str], node_voltage_bases : np.ndarray, line_names : List[str],
+                 line_current_limits : np.ndarray, transformer_names : List[str], transformer_power_limits : np.ndarray,
+                 voltage_min_pu : float, voltage_max_pu : float, max_loading : float):
+        self.voltage_min_pu = voltage_min_pu
+        self.voltage_max_pu = voltage_max_pu
+        self.max_loading = max_loading
+        self.amount_of_feeders = len(grouping.feeder_names)
+        self.phase_nodes = np.array([i for i, name in enumerate(node_names)
+                                     if name.rsplit('.', 1)[-1] in PHASE_CONDUCTORS and node_voltage_bases[i] > 0], dtype=np.int64)
+        self.inverse_voltage_bases = 1.0 / node_voltage_bases[self.phase_nodes]
+        self.phase_node_names = np.array(node_names, dtype=object)[self.phase_nodes]
+        self.phase_node_feeders = grouping.node_feeders[self.phase_nodes]
+        self.inverse_line_limits = inverse_limits(line_current_limits)
+        self.line_names = np.array(line_names, dtype=object)
+        self.line_feeders = grouping.line_feeders
+        self.inverse_transformer_limits = inverse_limits(transformer_power_limits)
+        self.transformer_names = np.array(transformer_names, dtype=object)
+        self.transformer_loading_names = [f"{name}_loading" for name in transformer_names]
+        feeder_names = grouping.feeder_names
+        self.feeder_output_names = [[f"{name}_{output}" for name in feeder_names] for output in
+                                    ["min_voltage_pu", "max_voltage_pu", "peak_line_loading", "voltage_violations", "line_overloads"]]
+
+    def feeder_reduce(self, reduction : np.ufunc, initial : float, values : np.ndarray, feeders : np.ndarray) -> np.ndarray:
+        in_feeder = feeders != NO_FEEDER
+        reduced = np.full(self.amount_of_feeders, initial)
+        reduction.at(reduced, feeders[in_feeder], values[in_feeder])
+        # A feeder without phase nodes reports NaN instead of an infinite voltage
+        return np.where(np.isinf(reduced), np.nan, reduced)
+
+    def feeder_count(self, violations : np.ndarray, feeders : np.ndarray) -> np.ndarray:
+        violating_feeders = feeders[violations]
+        return np.bincount(violating_feeders[violating_feeders != NO_FEEDER], minlength=self.amount_of_feeders)
+
+    def outputs(self, bus_voltage_mag : np.ndarray, total_line_current_mag : np.ndarray, transformer_power : np.ndarray) -> List[tuple[str, float]]:
+        phase_voltages = bus_voltage_mag[self.phase_nodes]
+        voltage_pu = phase_voltages * self.inverse_voltage_bases
+        line_loading = total_line_current_mag * self.inverse_line_limits
+        transformer_loading = transformer_power * self.inverse_transformer_limits
+        voltage_violations = (voltage_pu < self.voltage_min_pu) | (voltage_pu > self.voltage_max_pu)
+        line_overloads = line_loading > self.max_loading
+        transformer_overloads = transformer_loading > self.max_loading
+
+        feeder_values = [
+            self.feeder_reduce(np.minimum, np.inf, voltage_pu, self.phase_node_feeders),
+            self.feeder_reduce(np.maximum, -np.inf, voltage_pu, self.phase_node_feeders),
+            self.feeder_reduce(np.maximum, 0.0, line_loading, self.line_feeders),
+            self.feeder_count(voltage_violations, self.phase_node_feeders),
+            self.feeder_count(line_overloads, self.line_feeders),
+        ]
+        outputs = []
+        for names, values in zip(self.feeder_output_names, feeder_values):
+            outputs.extend(zip(names, values.tolist()))
+        outputs.extend(zip(self.transformer_loading_names, transformer_loading.tolist()))
+        outputs.extend(zip(self.phase_node_names[voltage_violations].tolist(), phase_voltages[voltage_violations].tolist()))
+        outputs.extend(zip(self.line_names[line_overloads].tolist(), total_line_current_mag[line_overloads].tolist()))
+        outputs.extend(zip(self.transformer_names[transformer_overloads].tolist(), transformer_power[transformer_overloads].tolist()))
+        return outputs
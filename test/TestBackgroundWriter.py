@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from lvnetworkservice.background_writer import BackgroundResultWriter
+
+
+class TestBackgroundWriter(unittest.TestCase):
+
+    def test_writes_are_carried_out_in_order_and_drained_at_close(self):
+        # Arrange
+        writer = BackgroundResultWriter(max_pending=2)
+        written = []
+
+        # Execute
+        for step in range(10):
+            writer.submit(lambda step=step : written.append(step))
+        writer.close()
+
+        # Assert
+        self.assertEqual(written, list(range(10)))
+        self.assertFalse(writer.thread.is_alive())
+
+    def test_submit_blocks_when_the_queue_is_full(self):
+        # Arrange
+        writer = BackgroundResultWriter(max_pending=1)
+        release = threading.Event()
+        writer.submit(release.wait)
+        # The thread is busy with the first write, the second one fills the queue
+        writer.submit(lambda : None)
+        submitted = threading.Event()
+
+        # Execute
+        submitter = threading.Thread(target=lambda : (writer.submit(lambda : None), submitted.set()))
+        submitter.start()
+        blocked = not submitted.wait(0.2)
+        release.set()
+        submitter.join()
+        writer.close()
+
+        # Assert
+        self.assertTrue(blocked)
+        self.assertTrue(submitted.is_set())
+
+    def test_failed_write_is_raised_by_the_next_call_once(self):
+        # Arrange
+        writer = BackgroundResultWriter()
+        written = []
+
+        def failing_write():
+            raise IOError("influx unavailable")
+
+        # Execute
+        writer.submit(failing_write)
+        writer.submit(lambda : written.append(1))
+
+        # Assert
+        with self.assertRaises(IOError):
+            writer.drain()
+        writer.submit(lambda : written.append(2))
+        writer.close()
+        self.assertEqual(written, [1, 2])
+
+    def test_submit_after_close_is_rejected(self):
+        # Arrange
+        writer = BackgroundResultWriter()
+        writer.close()
+
+        # Execute & Assert
+        with self.assertRaises(RuntimeError):
+            writer.submit(lambda : None)
+
+
+if __name__ == '__main__':
+    unittest.main()
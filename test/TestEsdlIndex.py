@@ -0,0 +1,57 @@
+import unittest
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.esdl_index import EsdlIndex
+from lvnetworkservice.mv_network import MV_SOURCE_BUS
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+
+class TestEsdlIndex(unittest.TestCase):
+
+    def test_assets_are_bucketed_with_their_buses(self):
+        # Arrange
+        energy_system = generate_energy_system(3, 2, 4, seed=3)
+
+        # Execute
+        index = EsdlIndex.from_assets(energy_system.instance[0].area.asset)
+
+        # Assert
+        self.assertEqual([source.asset.name for source in index.imports], ["Source1"])
+        self.assertEqual(index.imports[0].bus_to, MV_SOURCE_BUS)
+        self.assertEqual([(t.asset.name, t.bus_from, t.bus_to) for t in index.transformers],
+                         [("Transformer0", "mvjoint0", "lvnode0_0"), ("Transformer1", "mvjoint1", "lvnode1_0")])
+        # The ring has a cable per joint, the source joint included
+        self.assertEqual(len(index.mv_cables), 4)
+        self.assertEqual(len(index.lv_cables), 2 * 4 * 2)
+        self.assertEqual((index.lv_cables[0].bus_from, index.lv_cables[0].bus_to), ("lvnode0_0", "lvnode0_1"))
+        self.assertEqual([(b.e_connection_name, b.amount_of_demands) for b in index.buildings[:2]],
+                         [("ConnectionHome0_0", 1), ("ConnectionHome0_1", 1)])
+
+    def test_index_matches_the_assets_of_the_test_network(self):
+        # Arrange
+        assets = EnergySystemHandler().load_file("test.esdl").instance[0].area.asset
+
+        # Execute
+        index = EsdlIndex.from_assets(assets)
+
+        # Assert
+        cables = [a for a in assets if isinstance(a, esdl.ElectricityCable)]
+        self.assertEqual(len(index.imports), len([a for a in assets if isinstance(a, esdl.Import)]))
+        self.assertEqual(len(index.transformers), len([a for a in assets if isinstance(a, esdl.Transformer)]))
+        self.assertEqual(len(index.mv_cables) + len(index.lv_cables), len(cables))
+        self.assertEqual([b.e_connection_id for b in index.buildings],
+                         [[c for c in a.asset if isinstance(c, esdl.EConnection)][0].id for a in assets if isinstance(a, esdl.Building)])
+
+    def test_building_without_e_connection_is_rejected(self):
+        # Arrange
+        building = esdl.Building(id="building", name="Home")
+        building.asset.append(esdl.ElectricityDemand(id="demand", name="Demand"))
+
+        # Execute & Assert
+        with self.assertRaises(ValueError):
+            EsdlIndex.from_assets([building])
+
+
+if __name__ == '__main__':
+    unittest.main()
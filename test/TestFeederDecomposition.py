@@ -0,0 +1,98 @@
+import unittest
+
+import numpy as np
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.feeder_decomposition import decompose_network
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestFeederDecomposition(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def init_service(self, feeder_decomposition : bool, workers : int = 1) -> CalculationServiceLVNetwork:
+        return init_service(feeder_decomposition=feeder_decomposition, feeder_decomposition_workers=workers)
+
+    def solve_steps(self, service : CalculationServiceLVNetwork) -> list[np.ndarray]:
+        results = []
+        for step in range(3):
+            params = e_connection_params(service.ems_list, lambda i : [3000 * (step + 1) + 500 * i, 1000, 2000 * step], [100, 200 * step, 300])
+            service.set_load_flow_parameters(params)
+            if service.decomposed_solver is not None:
+                results.append(service.do_decomposed_load_flow())
+            else:
+                service.do_load_flow()
+                results.append(service.process_results())
+        return results
+
+    def test_network_is_split_into_an_mv_circuit_and_one_feeder_per_transformer(self):
+        # Arrange
+        service = self.init_service(False)
+        load_names = [name.lower() for name in service.dss_engine.ActiveCircuit.Loads.AllNames]
+
+        # Execute
+        decomposition = decompose_network(service.dss_model, service.dss_engine.ActiveCircuit, load_names)
+
+        # Assert
+        self.assertEqual(len(decomposition.feeders), 1)
+        feeder = decomposition.feeders[0]
+        self.assertEqual(feeder.transformer_name, "transformer1")
+        self.assertEqual(feeder.primary_bus, "node10")
+        self.assertEqual(feeder.load_positions.tolist(), list(range(len(load_names))))
+        self.assertEqual(decomposition.mv_load_names, ["feeder_transformer1_ph1", "feeder_transformer1_ph2", "feeder_transformer1_ph3"])
+        for line in service.dss_model.lv_lines:
+            self.assertIn(line, feeder.script)
+
+    def test_decomposed_solve_matches_monolithic_solve(self):
+        # Arrange
+        monolithic_service = self.init_service(False)
+        expected_results = self.solve_steps(monolithic_service)
+
+        for workers in (1, 2):
+            with self.subTest(f"{workers} workers"):
+                service = self.init_service(True, workers)
+
+                # Execute
+                results = self.solve_steps(service)
+                service.decomposed_solver.close()
+
+                # Assert
+                self.assertTrue(service.last_step_report.converged)
+                for result, expected_result in zip(results, expected_results):
+                    # Both are solved to the default tolerance of OpenDSS, which the few volts on the neutrals can differ by relatively
+                    np.testing.assert_allclose(result.bus_voltage_mag, expected_result.bus_voltage_mag, rtol=1e-4, atol=1e-3)
+                    np.testing.assert_allclose(result.total_line_current_mag, expected_result.total_line_current_mag, rtol=1e-3)
+                    np.testing.assert_allclose(result.transformer_power, expected_result.transformer_power, rtol=1e-4)
+
+    def test_decomposed_solve_matches_monolithic_solve_of_unbalanced_loads(self):
+        # Arrange
+        energy_system = generate_energy_system(6, 4, 8)
+        monolithic_service = init_service(energy_system)
+        service = init_service(energy_system, feeder_decomposition=True, feeder_decomposition_workers=1)
+        # Solved far beyond the default tolerance of OpenDSS, so the remaining difference is that of the decomposition
+        solver = service.decomposed_solver
+        for context in [monolithic_service.dss_engine, solver.mv_engine] + solver.local_solver.contexts:
+            context.ActiveCircuit.Solution.Tolerance = 1e-10
+        # Every house draws its power from the first phase only
+        params = e_connection_params(service.ems_list, lambda i : [8000 + 300 * i, 0, 0], [2000, 0, 0])
+
+        # Execute
+        monolithic_service.set_load_flow_parameters(params)
+        monolithic_service.do_load_flow()
+        expected_result = monolithic_service.process_results()
+        service.set_load_flow_parameters(params)
+        result = service.do_decomposed_load_flow()
+        solver.close()
+
+        # Assert
+        self.assertTrue(service.last_step_report.converged)
+        np.testing.assert_allclose(result.bus_voltage_mag, expected_result.bus_voltage_mag, rtol=1e-6)
+        np.testing.assert_allclose(result.total_line_current_mag, expected_result.total_line_current_mag, rtol=1e-6, atol=1e-9)
+        np.testing.assert_allclose(result.transformer_power, expected_result.transformer_power, rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
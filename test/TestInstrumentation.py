@@ -0,0 +1,78 @@
+from datetime import datetime
+import json
+import os
+import tempfile
+import unittest
+
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork, SOLVE_MODE_FULL, SOLVE_MODE_INITIAL
+from lvnetworkservice.instrumentation import Instrumentation
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def run_steps(self, instrumentation : Instrumentation) -> CalculationServiceLVNetwork:
+        service = init_service(instrumentation=instrumentation)
+        for step in range(3):
+            params = e_connection_params(service.ems_list, [1000 * (step + 1), 1000, 500], [0, 100, 0])
+            service.load_flow_current_step(params, datetime(2024, 1, 1), TimeStepInformation(step + 1, 3), "test-id", None)
+        return service
+
+    def test_phases_solver_statistics_and_element_counts_are_recorded(self):
+        # Execute
+        service = self.run_steps(Instrumentation(enabled=True))
+        summary = service.instrumentation.summary()
+
+        # Assert
+        for phase in ["init_calculation_service", "init.build_dss_model", "init.compile", "init.build_indices"]:
+            self.assertEqual(summary["phase_seconds"][phase]["count"], 1)
+        for phase in ["load_flow_current_step", "step.gather_injections", "step.apply_injections", "step.solve", "step.process_results", "step.write_results"]:
+            self.assertEqual(summary["phase_seconds"][phase]["count"], 3)
+            self.assertGreaterEqual(summary["phase_seconds"][phase]["max"], summary["phase_seconds"][phase]["p95"])
+            self.assertGreaterEqual(summary["phase_seconds"][phase]["p95"], summary["phase_seconds"][phase]["p50"])
+        self.assertEqual(summary["solve_modes"], {SOLVE_MODE_INITIAL : 1, SOLVE_MODE_FULL : 2})
+        self.assertGreater(summary["solver_iterations"][SOLVE_MODE_INITIAL]["max"], 0)
+        self.assertEqual(summary["not_converged_steps"], 0)
+        self.assertEqual(summary["element_counts"]["nodes"], len(service.all_node_names))
+        self.assertEqual(summary["element_counts"]["e_connections"], len(service.ems_list))
+
+    def test_summary_is_exported_as_json_and_prometheus_text(self):
+        # Arrange
+        service = self.run_steps(Instrumentation(enabled=True))
+
+        with tempfile.TemporaryDirectory() as directory:
+            json_file_name = os.path.join(directory, "metrics.json")
+            prometheus_file_name = os.path.join(directory, "metrics.prom")
+
+            # Execute
+            service.instrumentation.export(json_file_name)
+            service.instrumentation.export(prometheus_file_name)
+
+            # Assert
+            with open(json_file_name) as f:
+                self.assertEqual(json.load(f)["phase_seconds"]["step.solve"]["count"], 3)
+            with open(prometheus_file_name) as f:
+                prometheus_text = f.read()
+        self.assertIn('lvnetwork_phase_seconds{phase="step.solve",quantile="0.95"}', prometheus_text)
+        self.assertIn('lvnetwork_phase_seconds_count{phase="step.solve"} 3', prometheus_text)
+        self.assertIn('lvnetwork_solves_total{mode="full"} 2', prometheus_text)
+        self.assertIn('lvnetwork_not_converged_steps_total 0', prometheus_text)
+
+    def test_disabled_instrumentation_records_nothing(self):
+        # Execute
+        service = self.run_steps(Instrumentation())
+
+        # Assert
+        self.assertEqual(service.instrumentation.phase_seconds, {})
+        self.assertEqual(service.instrumentation.solver_iterations, {})
+        self.assertEqual(service.instrumentation.element_counts, {})
+        self.assertEqual(service.instrumentation.summary()["opendss_solve_seconds"]["count"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
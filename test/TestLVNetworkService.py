@@ -1,10 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+import json
 import os
+import tempfile
+import time
 import unittest
 
 from esdl import EConnection, EnergySystem, ElectricityCable, Transformer
 from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
 from dots_infrastructure.DataClasses import SimulatorConfiguration, TimeStepInformation
+from dots_infrastructure.influxdb_connector import InfluxDBConnector
 from dots_infrastructure.test_infra.InfluxDBMock import InfluxDBMock
 import helics as h
 from esdl.esdl_handler import EnergySystemHandler
@@ -24,21 +30,42 @@ def simulator_environment_e_connection():
                                   START_DATE_TIME, "test-host", "test-port", "test-username", "test-password",
                                   "test-database-name", h.HelicsLogLevel.DEBUG, ["PVInstallation", "EConnection"])
 
+def patch_simulator_configuration(test_case : unittest.TestCase):
+    # Services read their configuration from the environment; the original function is restored after the test
+    original_function = CalculationServiceHelperFunctions.get_simulator_configuration_from_environment
+    CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_environment_e_connection
+    test_case.addCleanup(setattr, CalculationServiceHelperFunctions, "get_simulator_configuration_from_environment", original_function)
+
+def create_service(**settings) -> CalculationServiceLVNetwork:
+    service = CalculationServiceLVNetwork()
+    service.influx_connector = InfluxDBMock()
+    for name, value in settings.items():
+        setattr(service, name, value)
+    return service
+
+def init_service(energy_system : EnergySystem = None, **settings) -> CalculationServiceLVNetwork:
+    # Initialised on test.esdl unless another energy system is given
+    service = create_service(**settings)
+    service.init_calculation_service(EnergySystemHandler().load_file("test.esdl") if energy_system is None else energy_system)
+    return service
+
+def e_connection_params(e_connection_ids, active_power, reactive_power) -> dict:
+    # The powers per phase of every EConnection, or a function of the position of the EConnection that returns them
+    params = {}
+    for i, e_connection_id in enumerate(e_connection_ids):
+        params[f"EConnection/aggregated_active_power/{e_connection_id}"] = active_power(i) if callable(active_power) else active_power
+        params[f"EConnection/aggregated_reactive_power/{e_connection_id}"] = reactive_power(i) if callable(reactive_power) else reactive_power
+    return params
+
 
 class Test(unittest.TestCase):
 
     def setUp(self):
-        CalculationServiceHelperFunctions.get_simulator_configuration_from_environment = simulator_environment_e_connection
+        patch_simulator_configuration(self)
 
     def int_service_and_get_energy_system(self, test_file : str) -> tuple[CalculationServiceLVNetwork, EnergySystem]:
-        esh = EnergySystemHandler()
-        esh.load_file(test_file)
-        service = CalculationServiceLVNetwork()
-        service.influx_connector = InfluxDBMock()
-        service.dss_file_name = "main.dss"
-        energy_system = esh.get_energy_system()
-        service.init_calculation_service(esh.get_energy_system())
-        return service, energy_system
+        energy_system = EnergySystemHandler().load_file(test_file)
+        return init_service(energy_system), energy_system
     
     def get_total_active_and_reactive_power(self, service: CalculationServiceLVNetwork, swing_node_trafo_name : str) -> tuple[float, float, float, float]:
         active_circuit = service.dss_engine.ActiveCircuit
@@ -51,7 +78,8 @@ class Test(unittest.TestCase):
         return total_active_power_transformer, total_reactive_power_transformer, active_power_losses, reactive_power_losses
     
     def tearDown(self):
-        os.remove(Path("main.dss"))
+        if os.path.exists("main.dss"):
+            os.remove(Path("main.dss"))
 
     def test_power_flow_input_power_equals_output_power(self):
         pathlist = Path("").glob('**/*.esdl')
@@ -92,8 +120,9 @@ class Test(unittest.TestCase):
             path_in_str = str(path) 
             with self.subTest(f"Test esdl file {path_in_str}"):
                 service, energy_system = self.int_service_and_get_energy_system(path_in_str)
+                service.export_dss_model("main.dss")
                 dss_content = []
-                with open(service.dss_file_name, "r") as f:
+                with open("main.dss", "r") as f:
                     dss_content = f.readlines()
 
                 lines_section_start = dss_content.index(service.lines_section_start_marker) + 1
@@ -139,6 +168,266 @@ class Test(unittest.TestCase):
                 self.assertAlmostEqual(data_point.value, data_points_expected_values[data_point.output_name], delta=1e-1)
 
 
+    def test_load_injection_index_only_updates_received_phases(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+
+        params = {}
+        econnections = [asset for asset in energy_system.eAllContents() if isinstance(asset, EConnection)]
+        for econnection in econnections:
+            params[f"EConnection/aggregated_active_power/{econnection.id}"] = [2000, 3000]
+            params[f"EConnection/aggregated_reactive_power/{econnection.id}"] = [100, 200]
+
+        # Execute
+        service.set_load_flow_parameters(params)
+
+        # Assert
+        loads = service.dss_engine.ActiveCircuit.Loads
+        for econnection in econnections:
+            loads.Name = f"{econnection.name}_Ph1"
+            self.assertAlmostEqual(loads.kW, 2.0)
+            self.assertAlmostEqual(loads.kvar, 0.1)
+            loads.Name = f"{econnection.name}_Ph2"
+            self.assertAlmostEqual(loads.kW, 3.0)
+            self.assertAlmostEqual(loads.kvar, 0.2)
+            loads.Name = f"{econnection.name}_Ph3"
+            self.assertAlmostEqual(loads.kW, 1.0)
+            self.assertAlmostEqual(loads.kvar, 0.0)
+
+    def test_load_injection_index_keeps_phases_without_reactive_power(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+
+        params = {}
+        econnections = [asset for asset in energy_system.eAllContents() if isinstance(asset, EConnection)]
+        for econnection in econnections:
+            params[f"EConnection/aggregated_active_power/{econnection.id}"] = [2000, 3000, 4000]
+            params[f"EConnection/aggregated_reactive_power/{econnection.id}"] = [100]
+
+        # Execute
+        service.set_load_flow_parameters(params)
+
+        # Assert
+        loads = service.dss_engine.ActiveCircuit.Loads
+        for econnection in econnections:
+            loads.Name = f"{econnection.name}_Ph1"
+            self.assertAlmostEqual(loads.kW, 2.0)
+            self.assertAlmostEqual(loads.kvar, 0.1)
+            for phase, kw in ((2, 3.0), (3, 4.0)):
+                loads.Name = f"{econnection.name}_Ph{phase}"
+                self.assertAlmostEqual(loads.kW, kw)
+                self.assertAlmostEqual(loads.kvar, 0.0)
+
+    def test_process_results_matches_per_element_values(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+
+        params = {}
+        econnections = [asset for asset in energy_system.eAllContents() if isinstance(asset, EConnection)]
+        for i, econnection in enumerate(econnections):
+            params[f"EConnection/aggregated_active_power/{econnection.id}"] = [1000 * (i + 1), 500, 0]
+            params[f"EConnection/aggregated_reactive_power/{econnection.id}"] = [100, 0, 200 * (i + 1)]
+        service.set_load_flow_parameters(params)
+        service.do_load_flow()
+
+        # Execute
+        results = service.process_results()
+
+        # Assert
+        active_circuit = service.dss_engine.ActiveCircuit
+        self.assertEqual(len(results.bus_voltage_mag), len(service.all_node_names))
+        for i, name in enumerate(service.all_line_names):
+            active_circuit.SetActiveElement(f"Line.{name}")
+            currents_mag_ang = active_circuit.ActiveCktElement.CurrentsMagAng
+            self.assertAlmostEqual(results.total_line_current_mag[i], sum(currents_mag_ang[0:6:2]), delta=1e-6)
+            self.assertAlmostEqual(service.static_network_data.line_current_limits[i], active_circuit.ActiveCktElement.NormalAmps)
+        for i, name in enumerate(service.all_transformer_names):
+            active_circuit.SetActiveElement(f"Transformer.{name}")
+            total_powers = active_circuit.ActiveCktElement.TotalPowers
+            self.assertAlmostEqual(results.transformer_power[i], (total_powers[0] ** 2 + total_powers[1] ** 2) ** 0.5, delta=1e-6)
+
+    def test_bulk_write_produces_the_same_points(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+        service.influx_connector.init_profile_output_data("test-simulation", "test-model", "EnergySystem", {"test-id" : energy_system})
+        # The mock does not build measurements, which the bulk write adds itself
+        service.influx_connector.add_measurement = partial(InfluxDBConnector.add_measurement, service.influx_connector)
+
+        params = {}
+        econnections = [asset for asset in energy_system.eAllContents() if isinstance(asset, EConnection)]
+        for econnection in econnections:
+            params[f"EConnection/aggregated_active_power/{econnection.id}"] = [1000, 1000, 1000]
+            params[f"EConnection/aggregated_reactive_power/{econnection.id}"] = [0, 0, 0]
+        simulation_time = datetime(2024, 1, 1)
+
+        service.set_load_flow_parameters(params)
+        service.do_load_flow()
+        results = service.process_results()
+        service.write_results_to_influx("test-id", simulation_time, results)
+        dynamic_names = set(service.output_name_table.all_names())
+        expected_points = {data_point.output_name : data_point.value for data_point in service.influx_connector.data_points if data_point.output_name in dynamic_names}
+        service.influx_connector.data_points.clear()
+
+        # Execute
+        service.bulk_write_results = True
+        service.write_results_to_influx("test-id", simulation_time, results)
+
+        # Assert
+        self.assertEqual(len(service.influx_connector.data_points), 1)
+        measurement = service.influx_connector.data_points[0]
+        self.assertEqual(measurement["time"], simulation_time)
+        self.assertEqual(measurement["tags"]["esdl_id"], "test-id")
+        self.assertEqual(measurement["tags"]["esdl_name"], energy_system.name)
+        # The static outputs were written with the first step and are not repeated
+        self.assertDictEqual(measurement["fields"], expected_points)
+
+    def test_bulk_write_writes_once_the_buffered_values_reach_the_maximum(self):
+        # Arrange
+        energy_system = EnergySystemHandler().load_file("test.esdl")
+        service = init_service(energy_system, bulk_write_results=True)
+        service.influx_connector.init_profile_output_data("test-simulation", "test-model", "EnergySystem", {"test-id" : energy_system})
+        service.influx_connector.add_measurement = partial(InfluxDBConnector.add_measurement, service.influx_connector)
+        written_points = []
+        service.influx_connector.write_output = lambda : written_points.append(list(service.influx_connector.data_points))
+        values_per_step = len(service.output_name_table.all_names())
+        service.bulk_write_max_values = 2 * values_per_step
+        params = e_connection_params(service.ems_list, lambda i : [1000 + 100 * i, 1000, 1000], [0, 0, 0])
+
+        # Execute
+        for step in range(5):
+            service.load_flow_current_step(params, datetime(2024, 1, 1, step), TimeStepInformation(step + 1, 5), "test-id", energy_system)
+
+        # Assert
+        # The points are written during the run, each time the values they hold reach the maximum
+        self.assertGreaterEqual(len(written_points), 2)
+        self.assertTrue(all(sum(len(point["fields"]) for point in points) >= service.bulk_write_max_values for points in written_points))
+        buffered_values = sum(len(point["fields"]) for point in service.influx_connector.data_points)
+        self.assertLess(buffered_values, service.bulk_write_max_values)
+        self.assertEqual(service.bulk_buffered_values, buffered_values)
+        self.assertEqual(sum(len(points) for points in written_points) + len(service.influx_connector.data_points), 5)
+
+    def test_static_outputs_are_written_once(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+        service.influx_connector.init_profile_output_data("test-simulation", "test-model", "EConnection", {"test-id" : energy_system})
+        written_points = []
+        service.influx_connector.write = written_points.extend
+
+        params = e_connection_params(service.ems_list, [1000, 1000, 1000], [0, 0, 0])
+
+        # Execute
+        for step in range(2):
+            service.load_flow_current_step(params, datetime(2024, 1, 1, 0, 15 * step), TimeStepInformation(step + 1, 2), "test-id", energy_system)
+
+        # Assert
+        written_values = {}
+        for data_point in service.influx_connector.data_points:
+            written_values.setdefault(data_point.output_name, []).append(data_point.value)
+        self.assertEqual(written_values["cable1_limit"], [239.0])
+        self.assertEqual(written_values["transformer1_limit"], [250.0])
+        # The secondary side of Transformer1 is 0.38 kV
+        self.assertAlmostEqual(written_values["connectionhome2.1_voltage_base"][0], 380 / 3 ** 0.5, delta=1e-6)
+        self.assertEqual(len(written_values["cable1"]), 2)
+        static_names = {name for name, _ in service.static_network_data.outputs()}
+        self.assertTrue(all(len(values) == 1 for name, values in written_values.items() if name in static_names))
+        # The buses are text and are written once as a measurement of their own
+        self.assertTrue(all(isinstance(data_point.value, float) for data_point in service.influx_connector.data_points))
+        self.assertEqual(len(written_points), 1)
+        self.assertEqual(written_points[0]["measurement"], "EConnection_topology")
+        self.assertEqual(written_points[0]["tags"]["esdl_id"], "test-id")
+        self.assertEqual(written_points[0]["fields"]["cable1_bus_to"], "node9")
+        self.assertEqual(written_points[0]["fields"]["transformer1_bus_from"], "node10")
+
+    def test_background_write_produces_the_same_points(self):
+        # Arrange
+        def run_steps(background_write : bool) -> CalculationServiceLVNetwork:
+            # Services share the OpenDSS engine, so they run one after the other
+            service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+            service.background_write = background_write
+            service.background_write_max_pending = 1
+            params = e_connection_params(service.ems_list, [1000, 1000, 1000], [0, 0, 0])
+            for step in range(3):
+                service.load_flow_current_step(params, datetime(2024, 1, 1, 0, 15 * step), TimeStepInformation(step + 1, 3), "test-id", energy_system)
+            service.close_result_writer()
+            return service
+
+        # Execute
+        service = run_steps(False)
+        background_service = run_steps(True)
+
+        # Assert
+        expected_points = [(p.output_name, p.datapoint_time, p.value) for p in service.influx_connector.data_points]
+        points = [(p.output_name, p.datapoint_time, p.value) for p in background_service.influx_connector.data_points]
+        self.assertEqual(points, expected_points)
+        self.assertIsNone(background_service.result_writer)
+
+    def test_stop_simulation_finishes_the_steps_of_the_federates_first(self):
+        # Arrange
+        energy_system = EnergySystemHandler().load_file("test.esdl")
+        service = init_service(energy_system, background_write=True, output_deadband=True)
+        service.instrumentation.enabled = True
+        steps = 4
+
+        def federate_loop():
+            for step in range(steps):
+                params = e_connection_params(service.ems_list, [1000 + 500 * step, 1000, 1000], [0, 0, 0])
+                time.sleep(0.05)
+                service.load_flow_current_step(params, datetime(2024, 1, 1, 0, 15 * step), TimeStepInformation(step + 1, steps), "test-id", energy_system)
+
+        # The federates run in the executor of the service, start_simulation returns while they are stepping
+        service.exe = ThreadPoolExecutor(1)
+        service.exe.submit(federate_loop)
+        with tempfile.TemporaryDirectory() as directory:
+            service.instrumentation_export_path = os.path.join(directory, "instrumentation.json")
+
+            # Execute
+            service.stop_simulation()
+
+            # Assert
+            with open(service.instrumentation_export_path) as f:
+                summary = json.load(f)
+        dynamic_names = set(service.output_name_table.all_names())
+        written_times = {p.datapoint_time for p in service.influx_connector.data_points if p.output_name in dynamic_names}
+        self.assertEqual(len(written_times), steps)
+        self.assertIsNone(service.result_writer)
+        self.assertEqual(summary["phase_seconds"]["step.write_results"]["count"], steps)
+        self.assertEqual(summary["output_values"]["total"], steps * len(dynamic_names))
+        self.assertEqual(summary["output_values"]["written"], service.deadband.written_values)
+
+    def test_init_does_not_write_dss_file_unless_exported(self):
+        # Execute
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+
+        # Assert
+        self.assertFalse(os.path.exists("main.dss"))
+        self.assertEqual(service.dss_engine.ActiveCircuit.Lines.Count, len(service.dss_model.lv_lines) + len(service.dss_model.mv_lines) - len(service.dss_model.mv_cut_cables))
+        self.assertEqual(service.dss_engine.ActiveCircuit.Loads.Count, len(service.dss_model.loads))
+
+    def test_incremental_solve_skips_unchanged_steps_and_solves_changed_steps(self):
+        # Arrange
+        service, energy_system = self.int_service_and_get_energy_system("test.esdl")
+        service.incremental_solve = True
+        service.incremental_solve_tolerance = 0.01
+
+        def params_with_active_power(active_power):
+            return e_connection_params(service.ems_list, [active_power] * 3, [0, 0, 0])
+
+        # Execute
+        reports = []
+        for active_power in [1000, 1000, 1005, 2000]:
+            service.load_flow_current_step(params_with_active_power(active_power), datetime(2024, 1, 1), TimeStepInformation(1, 2), "test-id", energy_system)
+            reports.append(service.last_step_report)
+
+        # Assert
+        self.assertEqual([report.mode for report in reports], ["initial", "skipped", "skipped", "full"])
+        self.assertEqual(reports[1].iterations, 0)
+        self.assertGreater(reports[3].iterations, 0)
+        self.assertTrue(all(report.converged for report in reports))
+        written_values = [data_point.value for data_point in service.influx_connector.data_points if data_point.output_name == "cable1"]
+        self.assertEqual(written_values[0], written_values[1])
+        self.assertEqual(written_values[0], written_values[2])
+        self.assertGreater(written_values[3], written_values[0])
+
 
 if __name__ == '__main__':
     unittest.main()
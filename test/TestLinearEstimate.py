@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork, SOLVE_MODE_ESTIMATED
+from lvnetworkservice.linear_estimate import EstimateLimits
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+def step_params(service : CalculationServiceLVNetwork, step : int) -> dict:
+    return e_connection_params(service.ems_list, lambda i : [500 * (step + 1) + 100 * (i % 5), 800, 300 * step], [100, 50 * step, 150])
+
+class TestLinearEstimate(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def init_service(self, energy_system, linear_estimate : bool) -> CalculationServiceLVNetwork:
+        # Wide enough that every step of these tests is estimated
+        return init_service(energy_system, linear_estimate=linear_estimate, linear_estimate_voltage_band_pu=(0.5, 1.5), linear_estimate_max_loading=10.0)
+
+    def energy_systems(self) -> dict:
+        esh = EnergySystemHandler()
+        esh.load_file("test.esdl")
+        return {"test.esdl" : esh.get_energy_system(), "synthetic" : generate_energy_system(3, 4, 5, seed=2)}
+
+    def test_estimate_is_close_to_exact_solve(self):
+        for name, energy_system in self.energy_systems().items():
+            with self.subTest(name):
+                # Arrange
+                # Services share the OpenDSS engine, so the exact steps are solved before the next service compiles
+                exact_service = self.init_service(energy_system, False)
+                expected_results = [exact_service.solve_current_step(step_params(exact_service, step)) for step in range(3)]
+                service = self.init_service(energy_system, True)
+
+                for step, expected_result in enumerate(expected_results):
+                    # Execute
+                    result = service.solve_current_step(step_params(service, step))
+
+                    # Assert
+                    self.assertEqual(service.last_step_report.mode, SOLVE_MODE_ESTIMATED)
+                    np.testing.assert_allclose(result.bus_voltage_mag, expected_result.bus_voltage_mag, atol=0.05)
+                    np.testing.assert_allclose(result.total_line_current_mag, expected_result.total_line_current_mag, atol=0.5)
+                    np.testing.assert_allclose(result.transformer_power, expected_result.transformer_power, atol=0.1)
+
+    def test_step_near_limit_is_solved_exactly_with_pending_loads(self):
+        # Arrange
+        energy_system = self.energy_systems()["synthetic"]
+        exact_service = self.init_service(energy_system, False)
+        exact_service.solve_current_step(step_params(exact_service, 0))
+        expected_result = exact_service.solve_current_step(step_params(exact_service, 1))
+        service = self.init_service(energy_system, True)
+        static_data = service.static_network_data
+        service.solve_current_step(step_params(service, 0))
+        self.assertEqual(service.last_step_report.mode, SOLVE_MODE_ESTIMATED)
+        service.linear_estimate_limits = EstimateLimits(service.all_node_names, static_data.node_voltage_bases, static_data.line_current_limits,
+                                                        static_data.transformer_power_limits, 0.5, 1.5, 0.0)
+
+        # Execute
+        result = service.solve_current_step(step_params(service, 1))
+
+        # Assert
+        self.assertNotEqual(service.last_step_report.mode, SOLVE_MODE_ESTIMATED)
+        np.testing.assert_array_equal(service.dss_load_kw, service.load_kw)
+        np.testing.assert_allclose(result.bus_voltage_mag, expected_result.bus_voltage_mag, rtol=1e-4)
+        np.testing.assert_allclose(result.total_line_current_mag, expected_result.total_line_current_mag, rtol=1e-3)
+        np.testing.assert_allclose(result.transformer_power, expected_result.transformer_power, rtol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
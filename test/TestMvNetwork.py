@@ -0,0 +1,182 @@
+import random
+import subprocess
+import sys
+import unittest
+import uuid
+
+from esdl import esdl
+from lvnetworkservice.line_codes import load_line_codes, parse_line_codes
+from lvnetworkservice.mv_network import MV_SOURCE_BUS, MvNetworkGraph
+from lvnetworkservice.esdl_index import EsdlIndex
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.synthetic_network import generate_energy_system
+
+from TestLVNetworkService import patch_simulator_configuration
+
+
+def new_joint(area : esdl.Area, name : str) -> esdl.Joint:
+    joint = esdl.Joint(id=str(uuid.uuid4()), name=name)
+    joint.port.append(esdl.InPort(id=str(uuid.uuid4()), name="In"))
+    joint.port.append(esdl.OutPort(id=str(uuid.uuid4()), name="Out"))
+    area.asset.append(joint)
+    return joint
+
+def new_cable(area : esdl.Area, name : str, bus_from : esdl.Joint, bus_to : esdl.Joint, line_code : str, length : float) -> esdl.ElectricityCable:
+    cable = esdl.ElectricityCable(id=str(uuid.uuid4()), name=name, assetType=line_code, length=length)
+    in_port = esdl.InPort(id=str(uuid.uuid4()), name="In")
+    out_port = esdl.OutPort(id=str(uuid.uuid4()), name="Out")
+    cable.port.append(in_port)
+    cable.port.append(out_port)
+    in_port.connectedTo.append(bus_from.port[1])
+    out_port.connectedTo.append(bus_to.port[0])
+    area.asset.append(cable)
+    return cable
+
+def mv_ring(lengths : list[float]) -> esdl.Area:
+    area = esdl.Area(id=str(uuid.uuid4()), name="mv ring")
+    joints = [new_joint(area, MV_SOURCE_BUS)] + [new_joint(area, f"mvjoint{i}") for i in range(len(lengths) - 1)]
+    for i, length in enumerate(lengths):
+        new_cable(area, f"MV_cable{i}", joints[i], joints[(i + 1) % len(joints)], "GPLK-Al-240", length)
+    return area
+
+
+class TestMvNetwork(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def test_line_codes_are_parsed_with_sequence_and_matrix_impedances(self):
+        # Execute
+        line_codes = load_line_codes("LineCode.dss")
+
+        # Assert
+        mv_line_code = line_codes["gplk-al-240"]
+        self.assertEqual(mv_line_code.phases, 3)
+        self.assertAlmostEqual(mv_line_code.positive_sequence_impedance_per_meter(), complex(0.139, 0.075) / 1000)
+        lv_line_code = line_codes["4x150al_4x6cu_50cuas_v_vmvkhsas"]
+        self.assertEqual(lv_line_code.phases, 4)
+        self.assertEqual(lv_line_code.normal_amps, 239.0)
+        self.assertAlmostEqual(lv_line_code.rmatrix[0, 0], 0.25547001)
+        self.assertAlmostEqual(lv_line_code.xmatrix[2, 1], 0.74563998)
+        self.assertAlmostEqual(lv_line_code.positive_sequence_impedance_per_meter().real, (0.25547001 - 0.04947) / 1000)
+
+    def test_continuation_lines_extend_the_previous_definition(self):
+        # Execute
+        line_codes = parse_line_codes("New LineCode.a nphases=2 Units=m\n~ Rmatrix = [1 |0.5 2]\n~ Xmatrix=[3 | 1 4] ! comment\nNew Line.x Bus1=a\n~ R1=5")
+
+        # Assert
+        self.assertEqual(list(line_codes.keys()), ["a"])
+        self.assertEqual(line_codes["a"].rmatrix.tolist(), [[1.0, 0.5], [0.5, 2.0]])
+        self.assertIsNone(line_codes["a"].r1)
+
+    def test_mv_graph_is_built_from_esdl_cables(self):
+        # Arrange
+        area = mv_ring([100.0, 200.0, 300.0, 400.0])
+        cables = [asset for asset in area.asset if isinstance(asset, esdl.ElectricityCable)]
+
+        # Execute
+        graph = MvNetworkGraph.from_cables(cables, load_line_codes("LineCode.dss"))
+
+        # Assert
+        self.assertEqual(graph.bus_names, [MV_SOURCE_BUS, "mvjoint0", "mvjoint1", "mvjoint2"])
+        self.assertEqual(graph.edge_names, ["MV_cable0", "MV_cable1", "MV_cable2", "MV_cable3"])
+        self.assertAlmostEqual(graph.edge_weights[1], abs(complex(0.139, 0.075)) * 0.2)
+        neighbours, edge_ids = graph.neighbours(graph.bus_indices[MV_SOURCE_BUS])
+        self.assertEqual(sorted(neighbours.tolist()), [1, 3])
+        self.assertEqual(sorted(edge_ids.tolist()), [0, 3])
+
+    def test_cable_next_to_the_bus_with_the_highest_impedance_is_cut(self):
+        # Arrange
+        area = mv_ring([100.0, 200.0, 300.0, 400.0])
+        service = CalculationServiceLVNetwork()
+
+        # Execute
+        cut_cables = service.cut_cables_in_mv_network(EsdlIndex.from_assets(area.asset))
+
+        # Assert
+        # mvjoint2 is the farthest bus (400 m from the source), its farthest neighbour is mvjoint1 (300 m).
+        self.assertEqual(cut_cables, {"MV_cable2"})
+
+    def test_one_cable_per_loop_is_opened_in_multi_ring_networks(self):
+        # Arrange
+        rng = random.Random(11)
+        area = esdl.Area(id=str(uuid.uuid4()), name="mv rings")
+        source = new_joint(area, MV_SOURCE_BUS)
+        joints = []
+        for ring in range(20):
+            ring_joints = [new_joint(area, f"mvjoint{ring}_{j}") for j in range(15)]
+            for j, (bus_from, bus_to) in enumerate(zip([source] + ring_joints, ring_joints + [source])):
+                new_cable(area, f"MV_cable{ring}_{j}", bus_from, bus_to, "GPLK-Al-240", rng.uniform(100.0, 500.0))
+            joints.extend(ring_joints)
+        # Ties between the rings add loops that span several rings
+        for i in range(30):
+            new_cable(area, f"MV_cable_tie{i}", rng.choice(joints), rng.choice(joints), "GPLK-Al-240", rng.uniform(100.0, 2000.0))
+        cables = [asset for asset in area.asset if isinstance(asset, esdl.ElectricityCable)]
+        line_codes = load_line_codes("LineCode.dss")
+        graph = MvNetworkGraph.from_cables(cables, line_codes)
+
+        # Execute
+        open_points = set(graph.open_points(graph.bus_indices[MV_SOURCE_BUS]))
+
+        # Assert
+        self.assertEqual(len(open_points), len(graph.edge_names) - len(graph.bus_names) + 1)
+        radial_graph = MvNetworkGraph.from_cables([cable for i, cable in enumerate(cables) if i not in open_points], line_codes)
+        distances = dict(zip(graph.bus_names, graph.shortest_path_lengths(graph.bus_indices[MV_SOURCE_BUS]).tolist()))
+        radial_distances = dict(zip(radial_graph.bus_names, radial_graph.shortest_path_lengths(radial_graph.bus_indices[MV_SOURCE_BUS]).tolist()))
+        # Every bus is still fed, along its lowest impedance path of the meshed network
+        self.assertEqual(radial_distances.keys(), distances.keys())
+        for bus, distance in distances.items():
+            self.assertAlmostEqual(radial_distances[bus], distance)
+
+    def test_service_opens_every_ring_of_a_generated_network(self):
+        # Arrange
+        energy_system = generate_energy_system(300, 3, 2, seed=4, mv_rings=12)
+        service = CalculationServiceLVNetwork()
+
+        # Execute
+        cut_cables = service.cut_cables_in_mv_network(EsdlIndex.from_assets(energy_system.instance[0].area.asset))
+
+        # Assert
+        self.assertEqual(len(cut_cables), 12)
+        self.assertTrue(all(name.startswith("MV_cable") for name in cut_cables))
+
+    def test_shortest_path_lengths_match_networkx(self):
+        # Arrange
+        rng = random.Random(3)
+        area = mv_ring([rng.uniform(100.0, 500.0) for _ in range(30)])
+        joints = [asset for asset in area.asset if isinstance(asset, esdl.Joint)]
+        for i in range(10):
+            new_cable(area, f"MV_cable_chord{i}", rng.choice(joints), rng.choice(joints), "GPLK-Al-240", rng.uniform(100.0, 2000.0))
+        isolated_joints = [new_joint(area, "isolated0"), new_joint(area, "isolated1")]
+        new_cable(area, "MV_cable_isolated", isolated_joints[0], isolated_joints[1], "GPLK-Al-240", 100.0)
+        graph = MvNetworkGraph.from_cables([asset for asset in area.asset if isinstance(asset, esdl.ElectricityCable)], load_line_codes("LineCode.dss"))
+
+        # Execute
+        distances = graph.shortest_path_lengths(graph.bus_indices[MV_SOURCE_BUS])
+
+        # Assert
+        self.assertTrue(all(distances[graph.bus_indices[joint.name]] == float("inf") for joint in isolated_joints))
+        try:
+            import networkx as nx
+        except ImportError:
+            self.skipTest("networkx is not installed")
+        weighted_graph = nx.MultiGraph()
+        weighted_graph.add_weighted_edges_from(zip(graph.edge_from.tolist(), graph.edge_to.tolist(), graph.edge_weights.tolist()))
+        expected_distances = nx.single_source_dijkstra_path_length(weighted_graph, graph.bus_indices[MV_SOURCE_BUS], weight="weight")
+        self.assertEqual(len(expected_distances), len(graph.bus_names) - len(isolated_joints))
+        for bus, expected_distance in expected_distances.items():
+            self.assertAlmostEqual(distances[bus], expected_distance)
+
+    def test_service_module_does_not_import_modules_of_optional_paths(self):
+        # Execute
+        imported = subprocess.run([sys.executable, "-c", "import sys, lvnetworkservice.lvnetworkservice; print(' '.join(sys.modules))"],
+                                  check=True, capture_output=True, text=True).stdout.split()
+
+        # Assert
+        for module in ["networkx", "lvnetworkservice.feeder_decomposition", "lvnetworkservice.replay", "lvnetworkservice.network_cache",
+                       "lvnetworkservice.violation_summary", "lvnetworkservice.linear_estimate", "lvnetworkservice.network_reduction"]:
+            self.assertNotIn(module, imported)
+
+
+if __name__ == '__main__':
+    unittest.main()
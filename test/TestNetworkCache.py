@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.network_cache import CachedNetwork, CompiledNetworkCache
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestNetworkCache(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+        self.cache_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_directory.cleanup()
+
+    def init_service(self) -> CalculationServiceLVNetwork:
+        return init_service(network_cache_directory=self.cache_directory.name)
+
+    def solve_with_unit_loads(self, service : CalculationServiceLVNetwork):
+        params = e_connection_params(service.ems_list, [1000, 1000, 1000], [0, 0, 0])
+        service.set_load_flow_parameters(params)
+        service.do_load_flow()
+        return service.process_results()
+
+    def test_second_initialisation_is_served_from_cache_with_identical_results(self):
+        # Arrange
+        first_service = self.init_service()
+        first_results = self.solve_with_unit_loads(first_service)
+
+        # Execute
+        second_service = self.init_service()
+        second_results = self.solve_with_unit_loads(second_service)
+
+        # Assert
+        self.assertEqual(first_service.network_cache.statistics.misses, 1)
+        self.assertEqual(second_service.network_cache.statistics.hits, 1)
+        self.assertEqual(first_service.ems_list, second_service.ems_list)
+        self.assertEqual(first_service.dss_model.to_lines(), second_service.dss_model.to_lines())
+        self.assertEqual(list(first_service.all_node_names), list(second_service.all_node_names))
+        np.testing.assert_allclose(first_results.bus_voltage_mag, second_results.bus_voltage_mag)
+        np.testing.assert_allclose(first_results.total_line_current_mag, second_results.total_line_current_mag)
+
+    def test_changed_topology_results_in_cache_miss(self):
+        # Arrange
+        esh = EnergySystemHandler()
+        energy_system = esh.load_file("test.esdl")
+        cache = CompiledNetworkCache(self.cache_directory.name, 1024 * 1024)
+        key = cache.compute_key(energy_system, ["LineCode.dss", "XFMRCode.dss"])
+
+        # Execute
+        cable = next(asset for asset in energy_system.instance[0].area.asset if asset.name == "Cable2")
+        cable.length = cable.length + 1.0
+        changed_key = cache.compute_key(energy_system, ["LineCode.dss", "XFMRCode.dss"])
+
+        # Assert
+        self.assertNotEqual(key, changed_key)
+
+    def test_changed_model_builder_code_results_in_cache_miss(self):
+        # Arrange
+        energy_system = EnergySystemHandler().load_file("test.esdl")
+        cache = CompiledNetworkCache(self.cache_directory.name, 1024 * 1024)
+        key = cache.compute_key(energy_system, ["LineCode.dss", "XFMRCode.dss"])
+
+        # Execute
+        cache.builder_digest = "changed"
+        changed_key = cache.compute_key(energy_system, ["LineCode.dss", "XFMRCode.dss"])
+
+        # Assert
+        self.assertNotEqual(key, changed_key)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # Arrange
+        cache = CompiledNetworkCache(self.cache_directory.name, 2500)
+        entry = CachedNetwork({"header" : ["x" * 1000]}, {}, [], [], [])
+
+        # Execute
+        cache.store("first", entry)
+        os.utime(os.path.join(self.cache_directory.name, "first.json"), (0, 0))
+        cache.store("second", entry)
+        cache.store("third", entry)
+
+        # Assert
+        self.assertIsNone(cache.load("first"))
+        self.assertIsNotNone(cache.load("third"))
+        self.assertEqual(cache.statistics.evictions, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
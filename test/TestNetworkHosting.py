@@ -0,0 +1,184 @@
+from datetime import datetime
+import unittest
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.lvnetworkservice import LVNetwork
+from dots_infrastructure.DataClasses import TimeStepInformation
+from dots_infrastructure.HelicsFederateHelpers import HelicsSimulationExecutor
+from dots_infrastructure.Logger import LOGGER
+
+from TestLVNetworkService import create_service, e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestNetworkHosting(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def load_energy_system(self, cable_length : float = None):
+        esh = EnergySystemHandler()
+        energy_system = esh.load_file("test.esdl")
+        if cable_length is not None:
+            cable = next(asset for asset in energy_system.instance[0].area.asset if asset.name == "Cable4")
+            cable.length = cable_length
+        return energy_system
+
+    def load_energy_system_with_areas(self) -> esdl.EnergySystem:
+        # Two areas with a network each, the second with a longer Cable4
+        energy_system = self.load_energy_system()
+        top_area = energy_system.instance[0].area
+        for area_id, network_energy_system in (("network-a", energy_system), ("network-b", self.load_energy_system(1000.0))):
+            area = esdl.Area(id=area_id, name=area_id)
+            area.asset.extend(list(network_energy_system.instance[0].area.asset))
+            top_area.area.append(area)
+        return energy_system
+
+    def params(self, service : LVNetwork, active_power : float) -> dict:
+        return e_connection_params(service.ems_list, [active_power, 1000, 500], [0, 100, 0])
+
+    def standalone_results(self, energy_system, active_power : float) -> dict:
+        service = init_service(energy_system)
+        service.load_flow_current_step(self.params(service, active_power), datetime(2024, 1, 1), TimeStepInformation(1, 2), "standalone", energy_system)
+        return {data_point.output_name : data_point.value for data_point in service.influx_connector.data_points}
+
+    def test_hosted_networks_are_solved_concurrently_in_isolated_contexts(self):
+        # Arrange
+        service = create_service(hosted_network_workers=2)
+        energy_systems = {"network-a" : self.load_energy_system(), "network-b" : self.load_energy_system(1000.0)}
+        for esdl_id, energy_system in energy_systems.items():
+            service.host_network(esdl_id, energy_system)
+        active_powers = {"network-a" : 2000, "network-b" : 4000}
+
+        # Execute
+        service.load_flow_hosted_networks({esdl_id : self.params(service.hosted_networks[esdl_id], active_powers[esdl_id]) for esdl_id in energy_systems},
+                                          datetime(2024, 1, 1))
+        service.close_solvers()
+
+        # Assert
+        self.assertIsNot(service.hosted_networks["network-a"].dss_engine, service.hosted_networks["network-b"].dss_engine)
+        for esdl_id, energy_system in energy_systems.items():
+            written_values = {data_point.output_name : data_point.value for data_point in service.influx_connector.data_points if data_point.esdl_id == esdl_id}
+            expected_values = self.standalone_results(energy_system, active_powers[esdl_id])
+            self.assertEqual(written_values.keys(), expected_values.keys())
+            for name, value in expected_values.items():
+                self.assertAlmostEqual(written_values[name], value, delta=1e-6)
+
+    def test_init_creates_a_network_per_configured_esdl_id(self):
+        # Arrange
+        service = create_service()
+        service.simulator_configuration.esdl_ids = ["network-a", "network-b", "network-b"]
+        energy_system = self.load_energy_system_with_areas()
+
+        # Execute
+        service.init_calculation_service(energy_system)
+
+        # Assert
+        self.assertEqual(list(service.hosted_networks), ["network-b"])
+        network = service.hosted_networks["network-b"]
+        self.assertNotIsInstance(network, HelicsSimulationExecutor)
+        self.assertIs(network.influx_connector, service.influx_connector)
+        self.assertIsNot(network.dss_engine, service.dss_engine)
+        self.assertEqual(service.network_name, f"{energy_system.name}_network-a".replace(" ", "_"))
+        self.assertEqual(len(network.all_line_names), len(service.all_line_names))
+        service.close_solvers()
+
+    def test_steps_of_the_configured_networks_are_solved_on_the_executor(self):
+        # Arrange
+        service = create_service()
+        service.simulator_configuration.esdl_ids = ["network-a", "network-b"]
+        service.init_calculation_service(self.load_energy_system_with_areas())
+        networks = {"network-a" : service, "network-b" : service.hosted_networks["network-b"]}
+        active_powers = {"network-a" : 2000, "network-b" : 4000}
+
+        # Execute
+        for esdl_id, network in networks.items():
+            service.load_flow_current_step(self.params(network, active_powers[esdl_id]), datetime(2024, 1, 1), TimeStepInformation(1, 2), esdl_id, None)
+        service.wait_for_network_steps()
+        service.close_solvers()
+
+        # Assert
+        for esdl_id, cable_length in (("network-a", None), ("network-b", 1000.0)):
+            written_values = {data_point.output_name : data_point.value for data_point in service.influx_connector.data_points if data_point.esdl_id == esdl_id}
+            expected_values = self.standalone_results(self.load_energy_system(cable_length), active_powers[esdl_id])
+            self.assertEqual(written_values.keys(), expected_values.keys())
+            for name, value in expected_values.items():
+                self.assertAlmostEqual(written_values[name], value, delta=1e-6)
+
+    def test_esdl_id_that_is_not_an_area_is_reported(self):
+        # Arrange
+        service = create_service()
+        service.simulator_configuration.esdl_ids = ["unknown-id"]
+        energy_system = self.load_energy_system()
+
+        # Execute
+        with self.assertLogs(LOGGER, "WARNING") as logs:
+            service.init_calculation_service(energy_system)
+        service.close_solvers()
+
+        # Assert
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("unknown-id", logs.output[0])
+        self.assertEqual(service.network_name, energy_system.name.replace(" ", "_"))
+
+    def test_failed_step_of_a_network_is_raised_within_the_step(self):
+        # Arrange
+        service = create_service()
+        service.simulator_configuration.esdl_ids = ["network-a", "network-b"]
+        service.init_calculation_service(self.load_energy_system_with_areas())
+        network = service.hosted_networks["network-b"]
+
+        # Execute
+        # The parameters of network-a lack the powers of its EConnections
+        service.load_flow_current_step({}, datetime(2024, 1, 1), TimeStepInformation(1, 2), "network-a", None)
+        with self.assertRaises(KeyError):
+            service.load_flow_current_step(self.params(network, 2000), datetime(2024, 1, 1), TimeStepInformation(1, 2), "network-b", None)
+        service.close_solvers()
+
+        # Assert
+        self.assertEqual(service.network_steps, {})
+        self.assertIsNotNone(network.last_step_report)
+
+    def test_hosted_networks_record_into_their_own_instrumentation(self):
+        # Arrange
+        service = create_service()
+        service.instrumentation.enabled = True
+        service.simulator_configuration.esdl_ids = ["network-a", "network-b"]
+        service.init_calculation_service(self.load_energy_system_with_areas())
+        network = service.hosted_networks["network-b"]
+
+        # Execute
+        for step in range(2):
+            for esdl_id, stepped_network in (("network-a", service), ("network-b", network)):
+                service.load_flow_current_step(self.params(stepped_network, 2000 + 1000 * step), datetime(2024, 1, 1, step), TimeStepInformation(step + 1, 2), esdl_id, None)
+        service.wait_for_network_steps()
+        service.close_solvers()
+        summary = service.merged_instrumentation().summary()
+
+        # Assert
+        self.assertIsNot(network.instrumentation, service.instrumentation)
+        self.assertTrue(network.instrumentation.enabled)
+        self.assertEqual(sum(network.instrumentation.solve_modes.values()), 2)
+        self.assertEqual(sum(service.instrumentation.solve_modes.values()), 2)
+        self.assertEqual(sum(summary["solve_modes"].values()), 4)
+        self.assertEqual(summary["element_counts"]["lines"], len(service.all_line_names) + len(network.all_line_names))
+        self.assertEqual(summary["phase_seconds"]["load_flow_current_step"]["count"], 4)
+
+    def test_load_flow_current_step_is_routed_to_the_hosted_network(self):
+        # Arrange
+        service = create_service()
+        energy_system = self.load_energy_system(1000.0)
+        network = service.host_network("network-b", energy_system)
+
+        # Execute
+        service.load_flow_current_step(self.params(network, 3000), datetime(2024, 1, 1), TimeStepInformation(1, 2), "network-b", energy_system)
+        service.wait_for_network_steps()
+
+        # Assert
+        self.assertIsNotNone(network.last_step_report)
+        self.assertTrue(all(data_point.esdl_id == "network-b" for data_point in service.influx_connector.data_points))
+        self.assertAlmostEqual(service.influx_connector.data_points[0].value, self.standalone_results(energy_system, 3000)[service.influx_connector.data_points[0].output_name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+from datetime import datetime
+import tempfile
+import unittest
+
+import numpy as np
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.esdl_index import EsdlIndex
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork, OutputNameTable, PowerFlowResult
+from lvnetworkservice.network_reduction import reduce_network
+from lvnetworkservice.synthetic_network import generate_energy_system
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestNetworkReduction(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def solve(self, energy_system, network_reduction : bool, network_cache_directory : str = None) -> tuple[CalculationServiceLVNetwork, OutputNameTable, PowerFlowResult]:
+        service = init_service(energy_system, network_reduction=network_reduction, network_cache_directory=network_cache_directory)
+        params = e_connection_params(service.ems_list, [3000, 1000, 2000], [300, 100, 200])
+        service.set_load_flow_parameters(params)
+        service.do_load_flow()
+        # The services share the OpenDSS engine, so the results are taken before the next service compiles
+        return (service,) + service.expand_reduced_results(service.process_results())
+
+    def assert_expanded_results_match(self, unreduced_names : OutputNameTable, unreduced_results : PowerFlowResult, names : OutputNameTable, results : PowerFlowResult):
+        self.assertCountEqual(names.node_names, unreduced_names.node_names)
+        self.assertCountEqual(names.line_names, unreduced_names.line_names)
+        unreduced_voltages = dict(zip(unreduced_names.node_names, unreduced_results.bus_voltage_mag.tolist()))
+        unreduced_currents = dict(zip(unreduced_names.line_names, unreduced_results.total_line_current_mag.tolist()))
+        np.testing.assert_allclose(results.bus_voltage_mag, [unreduced_voltages[name] for name in names.node_names], atol=1e-2)
+        np.testing.assert_allclose(results.total_line_current_mag, [unreduced_currents[name] for name in names.line_names], atol=1e-2)
+
+    def test_cables_in_series_are_merged_and_dead_ends_removed(self):
+        # Arrange
+        energy_system = generate_energy_system(2, 1, 2, seed=5, lv_cable_segments=3)
+        esdl_index = EsdlIndex.from_assets(energy_system.instance[0].area.asset)
+
+        # Execute
+        reduced_index, reduction = reduce_network(esdl_index, {"MV_cable2"})
+
+        # Assert
+        # Both feeder cables are merged; the MV joint without a transformer is a dead end once the ring is open
+        self.assertEqual(reduction.merged_lines, ["cable0_0__cable0_0_2", "cable0_1__cable0_1_2"])
+        merged_cable = reduced_index.lv_cables[-2]
+        self.assertEqual((merged_cable.bus_from, merged_cable.bus_to), ("lvnode0_0", "lvnode0_1"))
+        self.assertAlmostEqual(merged_cable.asset.length, sum(c.asset.length for c in esdl_index.lv_cables if c.asset.name.startswith("Cable0_0")))
+        self.assertEqual(sorted(bus.name for bus in reduction.reduced_buses), ["lvjoint0_0_1", "lvjoint0_0_2", "lvjoint0_1_1", "lvjoint0_1_2", "mvjoint1"])
+        self.assertEqual([c.asset.name for c in reduced_index.mv_cables], ["MV_cable0", "MV_cable2"])
+        self.assertEqual(len(reduced_index.lv_cables), len(esdl_index.lv_cables) - 6 + 2)
+        dead_end = next(bus for bus in reduction.reduced_buses if bus.name == "mvjoint1")
+        self.assertEqual((dead_end.bus_from, dead_end.bus_to, dead_end.conductors), ("mvjoint0", "mvjoint0", 3))
+
+    def test_reduced_network_matches_unreduced_network(self):
+        for energy_system in [EnergySystemHandler().load_file("test.esdl"), generate_energy_system(4, 3, 4, seed=2, lv_cable_segments=3)]:
+            with self.subTest(network=energy_system.name):
+                # Execute
+                unreduced_service, *unreduced_results = self.solve(energy_system, False)
+                reduced_service, *reduced_results = self.solve(energy_system, True)
+
+                # Assert
+                self.assertLess(len(reduced_service.all_node_names), len(unreduced_service.all_node_names))
+                self.assertTrue(reduced_service.last_step_report.converged)
+                self.assert_expanded_results_match(*unreduced_results, *reduced_results)
+
+    def test_outputs_follow_the_reduced_network(self):
+        # Arrange
+        service = init_service(generate_energy_system(2, 1, 2, seed=5, lv_cable_segments=3), network_reduction=True, output_deadband=True)
+        params = e_connection_params(service.ems_list, [3000, 1000, 2000], [300, 100, 200])
+
+        # Execute
+        service.load_flow_current_step(params, datetime(2024, 1, 1), TimeStepInformation(1, 1), "test-id", None)
+
+        # Assert
+        names = service.output_name_table.all_names()
+        reduced_cables = {cable.name for cable in service.dss_model.reduction.reduced_cables}
+        written_names = {data_point.output_name for data_point in service.influx_connector.data_points}
+        self.assertTrue(set(names) <= written_names)
+        self.assertTrue(set(service.dss_model.reduction.merged_lines) <= written_names)
+        self.assertFalse(reduced_cables & written_names)
+        self.assertEqual(service.deadband.written_values, len(names))
+
+    def test_reduced_network_is_cached_apart_from_unreduced_network(self):
+        # Arrange
+        energy_system = generate_energy_system(3, 2, 3, seed=8, lv_cable_segments=2)
+        with tempfile.TemporaryDirectory() as directory:
+            _, *unreduced_results = self.solve(energy_system, False, directory)
+            first_reduced_service, *_ = self.solve(energy_system, True, directory)
+
+            # Execute
+            reduced_service, *reduced_results = self.solve(energy_system, True, directory)
+
+        # Assert
+        self.assertEqual(first_reduced_service.network_cache.statistics.misses, 1)
+        self.assertEqual(reduced_service.network_cache.statistics.hits, 1)
+        self.assertEqual(reduced_service.dss_model.reduction, first_reduced_service.dss_model.reduction)
+        self.assert_expanded_results_match(*unreduced_results, *reduced_results)
+
+
+if __name__ == '__main__':
+    unittest.main()
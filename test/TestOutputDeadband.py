@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from functools import partial
+import unittest
+
+import numpy as np
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.output_deadband import OutputDeadband
+from dots_infrastructure.DataClasses import TimeStepInformation
+from dots_infrastructure.influxdb_connector import InfluxDBConnector
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestOutputDeadband(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def run_steps(self, output_deadband : bool, bulk_write_results : bool = False) -> CalculationServiceLVNetwork:
+        energy_system = EnergySystemHandler().load_file("test.esdl")
+        service = init_service(energy_system, output_deadband=output_deadband, output_deadband_full_write_interval=4, bulk_write_results=bulk_write_results)
+        service.influx_connector.init_profile_output_data("test-simulation", "test-model", "EnergySystem", {"test-id" : energy_system})
+        # The mock does not build measurements, which the bulk write adds itself
+        service.influx_connector.add_measurement = partial(InfluxDBConnector.add_measurement, service.influx_connector)
+        for step in range(6):
+            # Only the first EConnection changes its demand
+            params = e_connection_params(service.ems_list, lambda i : [1000 + 500 * step if i == 0 else 1000, 1000, 500], [0, 100, 0])
+            service.load_flow_current_step(params, datetime(2024, 1, 1) + timedelta(minutes=15 * step), TimeStepInformation(step + 1, 6), "test-id", None)
+        return service
+
+    def test_values_are_written_when_they_leave_the_deadband(self):
+        # Arrange
+        deadband = OutputDeadband(np.array([1.0, 1.0, 0.0]), np.array([0.0, 0.0, 0.1]), 3)
+
+        # Execute
+        masks = [deadband.select(np.array(values)).tolist() for values in
+                 [[10.0, 10.0, 100.0], [10.5, 11.5, 105.0], [11.5, 11.6, 111.0], [11.6, 11.6, 111.0]]]
+
+        # Assert
+        self.assertEqual(masks, [[True, True, True], [False, True, False], [True, False, True], [True, True, True]])
+        self.assertEqual(deadband.last_written_values.tolist(), [11.6, 11.6, 111.0])
+        self.assertAlmostEqual(deadband.compression_ratio(), 12 / 9)
+
+    def test_only_changed_values_are_written_between_full_writes(self):
+        # Execute
+        full_service = self.run_steps(False)
+        service = self.run_steps(True)
+
+        # Assert
+        full_values = {(data_point.output_name, data_point.datapoint_time) : data_point.value for data_point in full_service.influx_connector.data_points}
+        written_values = {(data_point.output_name, data_point.datapoint_time) : data_point.value for data_point in service.influx_connector.data_points}
+        self.assertLess(len(written_values), len(full_values))
+        times = sorted({time for _, time in full_values})
+        names = service.output_name_table.all_names()
+        for step in (0, 4):
+            self.assertEqual(sum(1 for name, time in written_values if time == times[step] and name in names), len(names))
+        # Carrying the last written value forward reproduces every value within its deadband
+        last_values = {}
+        for time in times:
+            for name in names:
+                if (name, time) in written_values:
+                    last_values[name] = written_values[(name, time)]
+                self.assertAlmostEqual(last_values[name], full_values[(name, time)], delta=0.1 + 1e-9)
+        self.assertEqual(service.deadband.written_values, len(written_values) - len(service.static_network_data.outputs()))
+        self.assertGreater(service.deadband.compression_ratio(), 1.0)
+
+    def test_bulk_writes_contain_only_changed_values(self):
+        # Execute
+        service = self.run_steps(True, bulk_write_results=True)
+
+        # Assert
+        field_counts = [len(data_point["fields"]) for data_point in service.influx_connector.data_points]
+        field_counts[0] -= len(service.static_network_data.outputs())
+        self.assertEqual(field_counts[0], len(service.output_name_table.all_names()))
+        self.assertLess(min(field_counts), field_counts[0])
+        self.assertEqual(sum(field_counts), service.deadband.written_values)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from lvnetworkservice.replay import LoadProfiles, read_load_profiles, write_load_profiles_csv, write_load_profiles_npz
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+        self.profile_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.profile_directory.cleanup()
+
+    def random_profiles(self, e_connection_ids : list[str], amount_of_steps : int) -> LoadProfiles:
+        rng = np.random.default_rng(1)
+        times = [datetime(2024, 1, 1) + timedelta(seconds=900 * (step + 1)) for step in range(amount_of_steps)]
+        return LoadProfiles(times, e_connection_ids,
+                            rng.uniform(0, 3000, (amount_of_steps, len(e_connection_ids), 3)),
+                            rng.uniform(0, 300, (amount_of_steps, len(e_connection_ids), 3)))
+
+    def test_profiles_are_read_back_from_csv_and_npz(self):
+        # Arrange
+        load_profiles = self.random_profiles(["a", "b"], 4)
+        csv_file_name = os.path.join(self.profile_directory.name, "profiles.csv")
+        npz_file_name = os.path.join(self.profile_directory.name, "profiles.npz")
+
+        # Execute
+        write_load_profiles_csv(csv_file_name, load_profiles)
+        write_load_profiles_npz(npz_file_name, load_profiles)
+
+        # Assert
+        for file_name in (csv_file_name, npz_file_name):
+            read_profiles = read_load_profiles(file_name)
+            self.assertEqual(read_profiles.times, load_profiles.times)
+            self.assertEqual(read_profiles.e_connection_ids, load_profiles.e_connection_ids)
+            np.testing.assert_allclose(read_profiles.active_power, load_profiles.active_power)
+            np.testing.assert_allclose(read_profiles.reactive_power, load_profiles.reactive_power)
+        self.assertEqual(read_profiles.step_seconds(), 900.0)
+
+    def test_replay_matches_stepping_through_load_flow_current_step(self):
+        # Arrange
+        service = init_service()
+        load_profiles = self.random_profiles(list(service.ems_list), 6)
+        file_name = os.path.join(self.profile_directory.name, "profiles.csv")
+        write_load_profiles_csv(file_name, load_profiles)
+
+        stepped_service = init_service()
+        for step, simulation_time in enumerate(load_profiles.times):
+            params = e_connection_params(load_profiles.e_connection_ids, lambda row : load_profiles.active_power[step, row].tolist(),
+                                         lambda row : load_profiles.reactive_power[step, row].tolist())
+            stepped_service.load_flow_current_step(params, simulation_time, TimeStepInformation(step + 1, len(load_profiles.times)), "test-id", None)
+
+        # Execute
+        amount_of_steps = service.replay_load_profile_file(file_name, "test-id")
+
+        # Assert
+        self.assertEqual(amount_of_steps, len(load_profiles.times))
+        replayed_values = {(data_point.output_name, data_point.datapoint_time) : data_point.value for data_point in service.influx_connector.data_points}
+        self.assertEqual(len(replayed_values), len(stepped_service.influx_connector.data_points))
+        for data_point in stepped_service.influx_connector.data_points:
+            self.assertAlmostEqual(replayed_values[(data_point.output_name, data_point.datapoint_time)], data_point.value, delta=1e-2)
+
+    def test_loads_without_profile_keep_their_power_and_snapshot_mode_is_restored(self):
+        # Arrange
+        service = init_service()
+        e_connection_ids = list(service.ems_list)
+        load_profiles = self.random_profiles(e_connection_ids[:1], 3)
+
+        # Execute
+        service.replay_load_profiles(load_profiles, "test-id")
+
+        # Assert
+        active_circuit = service.dss_engine.ActiveCircuit
+        self.assertEqual(active_circuit.Solution.Mode, 0)
+        active_circuit.Loads.idx = int(service.load_injection_index.load_indices[-1])
+        self.assertEqual(active_circuit.Loads.kW, 1.0)
+        active_circuit.SetActiveElement(f"Load.{active_circuit.Loads.Name}")
+        self.assertAlmostEqual(active_circuit.ActiveCktElement.TotalPowers[0], 1.0, delta=1e-2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import os
+import tempfile
+from time import sleep
+import unittest
+
+import numpy as np
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+try:
+    import pyarrow
+    from lvnetworkservice.result_archive import ResultArchive, ResultArchiveWriter
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipUnless(pyarrow is not None, "pyarrow is not installed")
+class TestResultArchive(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_archive_round_trip_with_column_and_time_selection(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        names = [f"output{i}" for i in range(5)]
+        times = [datetime(2024, 1, 1) + timedelta(minutes=15 * step) for step in range(10)]
+        values = rng.uniform(0.0, 400.0, (len(times), len(names)))
+        for suffix in [".arrow", ".parquet"]:
+            with self.subTest(suffix):
+                file_name = os.path.join(self.directory.name, f"results{suffix}")
+
+                # Execute
+                writer = ResultArchiveWriter(file_name, names, flush_rows=4, static_outputs={"output0_limit" : 239.0})
+                for time, step_values in zip(times, values):
+                    writer.write(time, step_values)
+                writer.close()
+                archive = ResultArchive(file_name)
+                all_times, all_values = archive.read()
+                selected_times, selected_values = archive.read(["output3", "output1"], times[3], times[9])
+
+                # Assert
+                self.assertEqual(len(archive.batch_starts) - 1, 3)
+                self.assertEqual(archive.column_names, names)
+                self.assertEqual(all_values.dtype, np.float32)
+                np.testing.assert_allclose(all_values, values, rtol=1e-6)
+                self.assertEqual(all_times.tolist(), times)
+                self.assertEqual(selected_times.tolist(), times[3:9])
+                np.testing.assert_allclose(selected_values, values[3:9][:, [3, 1]], rtol=1e-6)
+                self.assertEqual(archive.static_outputs(), {"output0_limit" : 239.0})
+
+    def test_service_writes_results_to_archive_instead_of_influx(self):
+        # Arrange
+        service = init_service(influx_output=False, result_archive_directory=self.directory.name, result_archive_flush_steps=2)
+        params = e_connection_params(service.ems_list, [1000, 1000, 500], [0, 100, 0])
+
+        # Execute
+        for step in range(3):
+            service.load_flow_current_step(params, datetime(2024, 1, 1) + timedelta(minutes=15 * step), TimeStepInformation(step + 1, 3), "test-id", None)
+        service.close_result_archives()
+        archive = ResultArchive(os.path.join(self.directory.name, "test-id.arrow"))
+        _, values = archive.read()
+
+        # Assert
+        self.assertEqual(len(service.influx_connector.data_points), 0)
+        self.assertEqual(archive.column_names, service.output_name_table.all_names())
+        self.assertEqual(values.shape, (3, len(archive.column_names)))
+        np.testing.assert_allclose(values[-1], service.previous_power_flow_result.all_values(), rtol=1e-6, atol=1e-6)
+        static_data = service.static_network_data
+        self.assertEqual(archive.static_outputs(), dict(static_data.outputs() + static_data.topology_outputs()))
+
+    def test_archive_holds_every_step_of_the_federates_after_stop_simulation(self):
+        # Arrange
+        service = init_service(influx_output=False, background_write=True, result_archive_directory=self.directory.name, result_archive_flush_steps=2)
+        params = e_connection_params(service.ems_list, [1000, 1000, 500], [0, 100, 0])
+
+        def federate_loop():
+            for step in range(5):
+                sleep(0.05)
+                service.load_flow_current_step(params, datetime(2024, 1, 1) + timedelta(minutes=15 * step), TimeStepInformation(step + 1, 5), "test-id", None)
+
+        # The federates run in the executor of the service, start_simulation returns while they are stepping
+        service.exe = ThreadPoolExecutor(1)
+        service.exe.submit(federate_loop)
+
+        # Execute
+        service.stop_simulation()
+        archive = ResultArchive(os.path.join(self.directory.name, "test-id.arrow"))
+        times, values = archive.read()
+
+        # Assert
+        self.assertEqual(service.result_archives, {})
+        self.assertEqual(times.tolist(), [datetime(2024, 1, 1) + timedelta(minutes=15 * step) for step in range(5)])
+        self.assertEqual(values.shape, (5, len(service.output_name_table.all_names())))
+
+
+if __name__ == '__main__':
+    unittest.main()
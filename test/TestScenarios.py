@@ -0,0 +1,92 @@
+from datetime import datetime
+import unittest
+
+import numpy as np
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.scenarios import ScenarioLoads, ScenarioSettings
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestScenarios(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def init_service(self, scenario_settings : ScenarioSettings, workers : int = 1) -> CalculationServiceLVNetwork:
+        return init_service(scenario_settings=scenario_settings, scenario_workers=workers)
+
+    def params(self, service : CalculationServiceLVNetwork) -> dict:
+        return e_connection_params(service.ems_list, lambda i : [3000 + 500 * i, 1000, 2000], [100, 200, 300])
+
+    def test_adopters_change_the_loads_of_their_e_connection(self):
+        # Arrange
+        e_connection_rows = np.array([0, 0, 0, 1, 1, 1])
+        load_kw = np.full(6, 1.0)
+        load_kvar = np.full(6, 0.5)
+
+        # Execute
+        pv_kw, pv_kvar = ScenarioLoads(ScenarioSettings(amount_of_scenarios=2, pv_uptake=1.0, pv_kw=3.0), e_connection_rows).draw(load_kw, load_kvar)
+        ev_kw, _ = ScenarioLoads(ScenarioSettings(amount_of_scenarios=2, ev_uptake=1.0, ev_kw=6.0), e_connection_rows).draw(load_kw, load_kvar)
+        noisy_kw, _ = ScenarioLoads(ScenarioSettings(amount_of_scenarios=2, noise_relative=0.1), e_connection_rows).draw(load_kw, load_kvar)
+
+        # Assert
+        np.testing.assert_allclose(pv_kw, np.zeros((2, 6)))
+        np.testing.assert_allclose(pv_kvar, np.full((2, 6), 0.5))
+        np.testing.assert_allclose(ev_kw, np.full((2, 6), 3.0))
+        self.assertFalse(np.allclose(noisy_kw[0], noisy_kw[1]))
+
+    def test_unperturbed_scenarios_reproduce_the_step(self):
+        # Arrange
+        service = self.init_service(ScenarioSettings(amount_of_scenarios=4))
+
+        # Execute
+        results = service.solve_current_step(self.params(service))
+        service.close_solvers()
+
+        # Assert
+        outputs = dict(results.scenario_outputs)
+        for name, value in zip(service.output_name_table.all_names(), results.all_values().tolist()):
+            for percentile in ["p5", "p50", "p95"]:
+                # Every scenario starts from the solution of the previous one, so they agree within the solver tolerance
+                self.assertAlmostEqual(outputs[f"{name}_{percentile}"], value, delta=1e-3 * max(abs(value), 1.0))
+        probabilities = [value for name, value in outputs.items() if name.endswith("_probability")]
+        self.assertGreater(len(probabilities), 0)
+        self.assertTrue(all(value in (0.0, 1.0) for value in probabilities))
+
+    def test_workers_give_the_same_outputs_as_a_local_solver(self):
+        # Arrange
+        settings = ScenarioSettings(amount_of_scenarios=6, pv_uptake=0.5, ev_uptake=0.3, noise_relative=0.2, seed=5)
+        local_service = self.init_service(settings)
+        local_outputs = local_service.solve_current_step(self.params(local_service)).scenario_outputs
+        local_service.close_solvers()
+
+        # Execute
+        service = self.init_service(settings, workers=2)
+        try:
+            outputs = service.solve_current_step(self.params(service)).scenario_outputs
+        finally:
+            service.close_solvers()
+
+        # Assert
+        self.assertEqual([name for name, _ in outputs], [name for name, _ in local_outputs])
+        np.testing.assert_allclose([value for _, value in outputs], [value for _, value in local_outputs], rtol=1e-3, atol=1e-3)
+
+    def test_scenario_outputs_are_written_with_the_step(self):
+        # Arrange
+        service = self.init_service(ScenarioSettings(amount_of_scenarios=3, noise_relative=0.1))
+
+        # Execute
+        service.load_flow_current_step(self.params(service), datetime(2024, 1, 1), TimeStepInformation(1, 1), "test-id", None)
+        service.close_solvers()
+
+        # Assert
+        written = {data_point.output_name for data_point in service.influx_connector.data_points}
+        self.assertIn("cable1_p95", written)
+        self.assertIn("cable1_overload_probability", written)
+        self.assertIn("cable1", written)
+
+
+if __name__ == '__main__':
+    unittest.main()
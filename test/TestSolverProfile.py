@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork
+from lvnetworkservice.solver_profile import SolverProfile
+from dss.enums import ControlModes, SolutionAlgorithms
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestSolverProfile(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def solve_steps(self, solver_profile : SolverProfile) -> tuple[CalculationServiceLVNetwork, list]:
+        service = init_service(solver_profile=solver_profile)
+        results = []
+        for step in range(3):
+            params = e_connection_params(service.ems_list, [1000 * (step + 1), 1000, 500], [0, 100, 0])
+            results.append((service.solve_current_step(params), service.last_step_report))
+        return service, results
+
+    def test_profile_is_applied_to_the_compiled_circuit(self):
+        # Execute
+        service, _ = self.solve_steps(SolverProfile(algorithm="newton", tolerance=1e-6, max_iterations=30, control_mode="off", max_control_iterations=5))
+
+        # Assert
+        solution = service.dss_engine.ActiveCircuit.Solution
+        self.assertEqual(solution.Algorithm, SolutionAlgorithms.NewtonSolve)
+        self.assertAlmostEqual(solution.Tolerance, 1e-6)
+        self.assertEqual(solution.MaxIterations, 30)
+        self.assertEqual(solution.ControlMode, ControlModes.Off)
+        self.assertEqual(solution.MaxControlIterations, 5)
+
+    def test_system_matrix_is_only_built_for_the_first_step(self):
+        # Execute
+        _, default_results = self.solve_steps(None)
+        _, results = self.solve_steps(SolverProfile(control_mode="off"))
+
+        # Assert
+        self.assertEqual([report.system_matrix_rebuilt for _, report in results], [True, False, False])
+        for (default_result, _), (result, report) in zip(default_results, results):
+            self.assertTrue(report.converged)
+            self.assertGreater(report.iterations, 0)
+            np.testing.assert_allclose(result.bus_voltage_mag, default_result.bus_voltage_mag, rtol=1e-6)
+
+    def test_tighter_tolerance_gives_the_same_voltages(self):
+        # Execute
+        _, default_results = self.solve_steps(SolverProfile())
+        _, tight_results = self.solve_steps(SolverProfile(tolerance=1e-9, max_iterations=100))
+
+        # Assert
+        for (default_result, default_report), (tight_result, tight_report) in zip(default_results, tight_results):
+            self.assertGreaterEqual(tight_report.iterations, default_report.iterations)
+            # The default tolerance of 1e-4 pu is 0.023 V of a 230 V phase voltage
+            np.testing.assert_allclose(tight_result.bus_voltage_mag, default_result.bus_voltage_mag, atol=0.05)
+
+    def test_unknown_settings_are_rejected(self):
+        # Execute & Assert
+        with self.assertRaises(ValueError):
+            SolverProfile(algorithm="gauss")
+        with self.assertRaises(ValueError):
+            SolverProfile(control_mode="time")
+        with self.assertRaises(ValueError):
+            SolverProfile(max_iterations=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
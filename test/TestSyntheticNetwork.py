@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from esdl import esdl
+from esdl.esdl_handler import EnergySystemHandler
+from lvnetworkservice.synthetic_network import generate_energy_system, write_energy_system
+
+from TestLVNetworkService import init_service, patch_simulator_configuration
+
+
+class TestSyntheticNetwork(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def test_generated_network_is_written_and_solved(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "synthetic.esdl")
+
+            # Execute
+            write_energy_system(file_name, 3, 4, 5, seed=7)
+            energy_system = EnergySystemHandler().load_file(file_name)
+
+        service = init_service(energy_system)
+        service.set_load_flow_parameters({key : [1000, 2000, 3000] for key in service.load_injection_index.active_power_keys + service.load_injection_index.reactive_power_keys})
+        service.do_load_flow()
+
+        # Assert
+        assets = energy_system.instance[0].area.asset
+        self.assertEqual(len([a for a in assets if isinstance(a, esdl.Transformer)]), 4)
+        self.assertEqual(len(service.ems_list), 4 * 5)
+        self.assertEqual(len(service.all_transformer_names), 4)
+        # The MV ring is cut once, so the MV network is radial
+        self.assertEqual(len(service.dss_model.mv_cut_cables), 1)
+        self.assertTrue(service.last_step_report.converged)
+
+    def test_multi_ring_network_is_made_radial_and_solved(self):
+        # Arrange
+        energy_system = generate_energy_system(40, 8, 3, seed=2, mv_rings=5)
+
+        # Execute
+        service = init_service(energy_system)
+        service.set_load_flow_parameters({key : [1000, 2000, 3000] for key in service.load_injection_index.active_power_keys + service.load_injection_index.reactive_power_keys})
+        service.do_load_flow()
+
+        # Assert
+        self.assertEqual(len(service.dss_model.mv_cut_cables), 5)
+        self.assertEqual(len(service.dss_model.mv_lines) - len(service.dss_model.mv_cut_cables), 40)
+        self.assertTrue(service.last_step_report.converged)
+
+    def test_same_seed_generates_the_same_network(self):
+        # Execute
+        first = generate_energy_system(2, 2, 3, seed=1)
+        second = generate_energy_system(2, 2, 3, seed=1)
+        other = generate_energy_system(2, 2, 3, seed=2)
+
+        # Assert
+        describe = lambda energy_system : [(a.id, a.name, getattr(a, "length", None)) for a in energy_system.instance[0].area.asset]
+        self.assertEqual(describe(first), describe(second))
+        self.assertNotEqual(describe(first), describe(other))
+
+
+if __name__ == '__main__':
+    unittest.main()
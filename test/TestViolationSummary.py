@@ -0,0 +1,76 @@
+from datetime import datetime
+import re
+import unittest
+
+from lvnetworkservice.lvnetworkservice import CalculationServiceLVNetwork, OUTPUT_MODE_SUMMARY
+from lvnetworkservice.synthetic_network import generate_energy_system
+from lvnetworkservice.violation_summary import NO_FEEDER, group_by_secondary_transformer
+from dots_infrastructure.DataClasses import TimeStepInformation
+
+from TestLVNetworkService import e_connection_params, init_service, patch_simulator_configuration
+
+
+class TestViolationSummary(unittest.TestCase):
+
+    def setUp(self):
+        patch_simulator_configuration(self)
+
+    def run_step(self, output_mode : str) -> tuple[CalculationServiceLVNetwork, dict]:
+        # Narrow enough that some, but not all, phase voltages leave the band
+        service = init_service(output_mode=output_mode, summary_voltage_band_pu=(1.0, 1.045), summary_max_loading=0.05)
+        params = e_connection_params(service.ems_list, lambda i : [5000 * (i + 1), 1000, 500], [0, 100, 0])
+        service.load_flow_current_step(params, datetime(2024, 1, 1), TimeStepInformation(1, 1), "test-id", None)
+        written_values = {data_point.output_name : data_point.value for data_point in service.influx_connector.data_points}
+        return service, written_values
+
+    def test_summary_contains_feeder_extremes_and_violating_elements(self):
+        # Execute
+        full_service, full_values = self.run_step("full")
+        _, written_values = self.run_step(OUTPUT_MODE_SUMMARY)
+
+        # Assert
+        static_data = full_service.static_network_data
+        lv_phase_nodes = [name for name in full_service.all_node_names if name.split('.')[1] != "4" and not name.startswith("node10.")]
+        voltage_pu = {name : full_values[name] / base for name, base in zip(full_service.all_node_names, static_data.node_voltage_bases)}
+        self.assertAlmostEqual(written_values["transformer1_min_voltage_pu"], min(voltage_pu[name] for name in lv_phase_nodes))
+        self.assertAlmostEqual(written_values["transformer1_max_voltage_pu"], max(voltage_pu[name] for name in lv_phase_nodes))
+        line_loading = [full_values[name] / limit for name, limit in zip(static_data.line_names, static_data.line_current_limits)]
+        self.assertAlmostEqual(written_values["transformer1_peak_line_loading"], max(line_loading))
+        self.assertAlmostEqual(written_values["transformer1_loading"], full_values["transformer1"] / static_data.transformer_power_limits[0])
+
+        violating_nodes = {name for name in full_service.all_node_names if name.split('.')[1] != "4" and not 1.0 <= voltage_pu[name] <= 1.045}
+        overloaded_lines = {name for name, loading in zip(static_data.line_names, line_loading) if loading > 0.05}
+        overloaded_transformers = {"transformer1"} if written_values["transformer1_loading"] > 0.05 else set()
+        self.assertGreater(len(violating_nodes), 0)
+        self.assertLess(len(violating_nodes), len(lv_phase_nodes))
+        self.assertGreater(len(overloaded_lines), 0)
+        self.assertEqual(written_values["transformer1_voltage_violations"], len(violating_nodes - {"node10.1", "node10.2", "node10.3"}))
+        self.assertEqual(written_values["transformer1_line_overloads"], len(overloaded_lines))
+        element_names = set(full_service.output_name_table.all_names())
+        self.assertEqual({name for name in written_values if name in element_names}, violating_nodes | overloaded_lines | overloaded_transformers)
+        for name in violating_nodes | overloaded_lines | overloaded_transformers:
+            self.assertAlmostEqual(written_values[name], full_values[name])
+        self.assertLess(len(written_values), len(full_values))
+
+    def test_feeders_are_grouped_by_secondary_transformer(self):
+        # Arrange
+        service = init_service(generate_energy_system(3, 4, 5, seed=3))
+        static_data = service.static_network_data
+
+        # Execute
+        grouping = group_by_secondary_transformer(service.all_node_names, static_data.line_buses, static_data.transformer_names, static_data.transformer_buses)
+
+        # Assert
+        self.assertEqual(sorted(grouping.feeder_names), [f"transformer{t}" for t in range(4)])
+        lv_element = re.compile(r"(?:lvnode|connectionhome|cablehome|cable)(\d+)_")
+        for names, feeders in ((service.all_node_names, grouping.node_feeders), (static_data.line_names, grouping.line_feeders)):
+            for name, feeder in zip(names, feeders.tolist()):
+                match = lv_element.match(name)
+                if match is None:
+                    self.assertEqual(feeder, NO_FEEDER, name)
+                else:
+                    self.assertEqual(grouping.feeder_names[feeder], f"transformer{match.group(1)}", name)
+
+
+if __name__ == '__main__':
+    unittest.main()